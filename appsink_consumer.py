@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# Batched appsink consumer
+#
+# Instead of a new-sample signal (one Python dispatch per buffer), a worker thread
+# pulls samples with try-pull-sample, groups them into batches and hands each
+# batch to a callback as NumPy views of the mapped buffer memory plus timestamps.
+# The views are only valid inside the callback; the buffers are unmapped after it
+# returns. appsink's max-buffers / drop keep memory bounded if the callback falls
+# behind, so a slow analysis never stalls the other branches of a tee.
+#
+# Call start() once the pipeline is PAUSED or PLAYING: before that
+# try-pull-sample returns nothing at once and appsink's eos property reads TRUE.
+# The thread only stops at an EOS event actually seen on the sink pad (or stop()).
+# Run this file directly to check that every buffer of a short stream is delivered.
+import logging
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import ExitStack
+
+import gi
+import numpy as np
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+from buffers import MapError, map_array
+
+logger = logging.getLogger(__name__)
+
+Frame = namedtuple("Frame", ["pts", "duration", "data", "caps"])
+
+
+class AppSinkConsumer:
+    def __init__(
+        self,
+        appsink,
+        on_batch,
+        dtype=np.uint8,
+        batch_size=8,
+        max_buffers=32,
+        drop=True,
+        timeout=50 * Gst.MSECOND,
+    ):
+        self.appsink = appsink
+        self.on_batch = on_batch
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.samples = 0  # delivered to on_batch
+        self.map_failures = 0  # pulled but not delivered
+        self.batches = 0
+        self.callback_time = 0.0
+        self._stopping = threading.Event()
+        self._eos = threading.Event()  # EOS seen on the sink pad, cleared by flushes
+        self._thread = None
+
+        # Pull mode: no new-sample signal, bounded internal queue
+        appsink.set_property("emit-signals", False)
+        appsink.set_property("max-buffers", max_buffers)
+        appsink.set_property("drop", drop)
+        self._pad = appsink.get_static_pad("sink")
+        self._probe_id = self._pad.add_probe(
+            Gst.PadProbeType.EVENT_DOWNSTREAM | Gst.PadProbeType.EVENT_FLUSH, self._on_event
+        )
+
+    def _on_event(self, pad, info):
+        event_type = info.get_event().type
+        if event_type == Gst.EventType.EOS:
+            self._eos.set()
+        elif event_type == Gst.EventType.FLUSH_STOP:
+            self._eos.clear()
+        return Gst.PadProbeReturn.OK
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="appsink-consumer", daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        # Waits for the thread to stop by itself (EOS); returns False on timeout
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def _run(self):
+        batch = []
+        while not self._stopping.is_set():
+            sample = self.appsink.emit("try-pull-sample", self.timeout)
+            if sample is None:
+                # Timeout or EOS: hand over what we have rather than wait for a full batch
+                if batch:
+                    self._deliver(batch)
+                    batch = []
+                if self._eos.is_set():
+                    # The last buffers may have been queued between the timed out
+                    # pull and the EOS; take whatever is left without waiting
+                    rest = self._drain()
+                    for index in range(0, len(rest), self.batch_size):
+                        self._deliver(rest[index : index + self.batch_size])
+                    logger.debug("appsink reached EOS, consumer stopping")
+                    break
+                if self.appsink.get_state(0)[1] < Gst.State.PAUSED:
+                    # Not started yet (or shut down): the pull did not wait
+                    self._stopping.wait(self.timeout / Gst.SECOND)
+                continue
+            batch.append(sample)
+            if len(batch) >= self.batch_size:
+                self._deliver(batch)
+                batch = []
+
+    def _drain(self):
+        samples = []
+        while True:
+            sample = self.appsink.emit("try-pull-sample", 0)
+            if sample is None:
+                return samples
+            samples.append(sample)
+
+    def _deliver(self, samples):
+        with ExitStack() as stack:
+            frames = []
+            for sample in samples:
+                buffer = sample.get_buffer()
+                try:
+                    data = stack.enter_context(map_array(buffer, self.dtype, Gst.MapFlags.READ))
+                except (MapError, ValueError) as err:
+                    # ValueError: size not a multiple of the dtype
+                    logger.error(f"Could not map sample: {err}")
+                    self.map_failures += 1
+                    continue
+                frames.append(Frame(buffer.pts, buffer.duration, data, sample.get_caps()))
+            start = time.perf_counter()
+            self.on_batch(frames)
+            self.callback_time += time.perf_counter() - start
+        self.samples += len(frames)
+        self.batches += 1
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._probe_id:
+            self._pad.remove_probe(self._probe_id)
+            self._probe_id = 0
+
+    def stats(self):
+        return {
+            "eos": self._eos.is_set(),
+            "samples": self.samples,
+            "map_failures": self.map_failures,
+            "batches": self.batches,
+            "mean_batch": self.samples / self.batches if self.batches else 0.0,
+            "callback_seconds": self.callback_time,
+        }
+
+
+def check_delivery(num_buffers=200, batch_size=8):
+    # Plays num_buffers through an appsink with a consumer started once PLAYING
+    # and returns (samples delivered, whether the thread stopped by itself at EOS)
+    pipeline = Gst.parse_launch(
+        f"audiotestsrc num-buffers={num_buffers} ! audio/x-raw,format=S16LE ! appsink name=sink sync=false"
+    )
+    delivered = []
+    consumer = AppSinkConsumer(
+        pipeline.get_by_name("sink"), lambda frames: delivered.append(len(frames)), np.int16, batch_size, drop=False
+    )
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_state(Gst.CLOCK_TIME_NONE)
+    consumer.start()
+    pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    stopped_at_eos = consumer.wait(10)
+    consumer.stop()
+    pipeline.set_state(Gst.State.NULL)
+    return sum(delivered), stopped_at_eos
+
+
+def main():
+    Gst.init(None)
+    num_buffers = 200
+    delivered, stopped_at_eos = check_delivery(num_buffers)
+    ok = delivered == num_buffers and stopped_at_eos
+    print(f"delivered {delivered}/{num_buffers} samples, stopped at EOS: {stopped_at_eos}  {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,91 +9,60 @@ gi.require_version("GObject", "2.0")
 gi.require_version("Gst", "1.0")
 from gi.repository import GLib, GObject, Gst
 
+from decode_dispatcher import DecodeDispatcher, Route
+from pipeline_builder import PipelineBuildError, build
+
 logging.basicConfig(
     level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
 
-class CustomData:
-    def __init__(self):
-        # Create Elements
-        # uridecodebin -> Decodes data from a URI into raw media (instantiates source, demuxer, decoder internally)
-        self.source = Gst.ElementFactory.make("uridecodebin", "source")
-        # audioconvert -> Convert audio to different formats. Ensures platform interoperability
-        self.convert = Gst.ElementFactory.make("audioconvert", "convert")
-        # audioresample -> Useful for converting between different audio sample rates. Again ensures platform interoperability
-        self.resample = Gst.ElementFactory.make("audioresample", "resample")
-        # autoaudiosink -> render the audio stream to the audio card
-        self.sink = Gst.ElementFactory.make("autoaudiosink", "sink")
-        # Create Empty pipeline
-        self.pipeline = Gst.Pipeline.new("test-pipeline")
-
-
-# callback function
-# src is the GstElement which triggered the signal.
-# new_pad is the GstPad that has just been added to the src element
-# This is the pad to which we want to link.
-
-
-def pad_added_handler(src, new_pad, data):
-    sink_pad = data.convert.get_static_pad("sink")
-    print(f"Received new pad {new_pad.get_name()} from {src.get_name()}")
-
-    if sink_pad.is_linked():
-        print("Already linked")
-        return
-
-    new_pad_caps = new_pad.get_current_caps()
-    new_pad_struct = new_pad_caps.get_structure(0)
-    new_pad_type = new_pad_struct.get_name()
+# uridecodebin -> Decodes data from a URI into raw media (instantiates source, demuxer, decoder internally)
+# audioconvert -> Convert audio to different formats. Ensures platform interoperability
+# audioresample -> Useful for converting between different audio sample rates. Again ensures platform interoperability
+# autoaudiosink -> render the audio stream to the audio card
+# The source is not linked here: it only gets its pads once it knows the stream (see DecodeDispatcher)
+GRAPH = {
+    "nodes": {
+        "source": (
+            "uridecodebin",
+            {"uri": "https://www.freedesktop.org/software/gstreamer-sdk/data/media/sintel_trailer-480p.webm"},
+        ),
+        "convert": "audioconvert",
+        "resample": "audioresample",
+        "sink": "autoaudiosink",
+    },
+    "links": ["convert ! resample ! sink"],
+}
 
-    if not new_pad_type.startswith("audio/x-raw"):
-        print("Type not audio.")
-        return
 
-    # Linking
-    ret = new_pad.link(sink_pad)
-    if ret == Gst.PadLinkReturn.OK:
-        print("Link success")
-    else:
-        print("Link failure")
-
-    return
+class CustomData:
+    def __init__(self):
+        # Create, add and link the elements; the source's uri is set from GRAPH
+        self.pipeline, elements = build(GRAPH)
+        self.source = elements["source"]
+        self.convert = elements["convert"]
+        self.resample = elements["resample"]
+        self.sink = elements["sink"]
 
 
 def main():
     # Initialize GStreamer library
     Gst.init(None)
     signal.signal(signal.SIGINT, signal.SIG_DFL)  # signal.signal(signalnum, handler)
-    data = CustomData()
-    if (
-        not data.pipeline
-        or not data.source
-        or not data.convert
-        or not data.resample
-        or not data.sink
-    ):
-        logger.error("Not all elements could be created")
-        sys.exit(1)
-
-    # Add elements to pipeline, the elements are not linked yet!
-    data.pipeline.add(data.source, data.convert, data.resample, data.sink)
-
-    # Link all elements excluding source (which contains demux, hence dynamic)
-    ret = data.convert.link(data.resample)
-    ret = ret and data.resample.link(data.sink)
-    if not ret:
-        logger.error("Elements could not be linked")
+    try:
+        data = CustomData()
+    except PipelineBuildError as err:
+        logger.error(f"Pipeline could not be built: {err}")
         sys.exit(1)
 
-    # Set URI to play
-    data.source.props.uri = "https://www.freedesktop.org/software/gstreamer-sdk/data/media/sintel_trailer-480p.webm"
-
     # The uridecodebin element comes with several element signals including `pad-added`
-    # When uridecodebin(source) creates a source pad, and emits `pad-added` signal, the callback is invoked
+    # When uridecodebin(source) creates a source pad, and emits `pad-added` signal, the dispatcher
+    # links it to the route for its caps. Only the audio has a route: the video track is never decoded
+    # (autoplug-select exposes it encoded) and its pad goes to a fakesink
     # Non-blocking
-    data.source.connect("pad-added", pad_added_handler, data)
+    dispatcher = DecodeDispatcher(data.pipeline, data.source, [Route("audio/x-raw", data.convert)])
 
     ret = data.pipeline.set_state(Gst.State.PLAYING)
     if ret == Gst.StateChangeReturn.FAILURE:
@@ -132,6 +101,9 @@ def main():
                 logger.error("Unexpected message")
                 break
 
+    logger.info(f"Streams: {dispatcher.stats()}")
+    data.pipeline.set_state(Gst.State.NULL)
+
 
 # Main section
 if __name__ == "__main__":
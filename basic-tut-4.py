@@ -8,6 +8,9 @@ gi.require_version("GObject", "2.0")
 gi.require_version("Gst", "1.0")
 from gi.repository import GLib, GObject, Gst
 
+from monitor import DurationCache, PositionMonitor
+from seek_scheduler import SeekScheduler
+
 logging.basicConfig(
     level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s"
 )
@@ -27,7 +30,13 @@ class CustomData:
         # Have we performed the seek already?
         self.seek_done = False
         # How long does this media last, in nanoseconds?
-        self.duration = Gst.CLOCK_TIME_NONE
+        # Queried once on first use and kept until DURATION_CHANGED
+        self.duration = DurationCache(self.playbin)
+        # Bus watch and position timer, see monitor.py
+        self.monitor = None
+        # Coalesces seek requests and records seek latency, see seek_scheduler.py
+        self.seeker = None
+        self.main_loop = None
 
 
 def handle_message(msg, data):
@@ -41,7 +50,7 @@ def handle_message(msg, data):
         data.terminate = True
     elif msg.type == Gst.MessageType.DURATION_CHANGED:
         # The duration has changed, mark the current one as invalid
-        data.duration = Gst.CLOCK_TIME_NONE
+        data.duration.invalidate()
 
     elif msg.type == Gst.MessageType.STATE_CHANGED:
         if msg.src == data.playbin:
@@ -73,6 +82,38 @@ def handle_message(msg, data):
     return
 
 
+def on_message(msg, data):
+    handle_message(msg, data)
+    if data.terminate:
+        data.main_loop.quit()
+
+
+def on_position(current, duration, data):
+    # Print current position and total duration
+    print(
+        f"Current Position: {current} Total Duration: {duration}",
+        end="\r",
+        flush=True,
+    )
+
+    if data.seek_enabled and not data.seek_done and current > 10 * Gst.SECOND:
+        print("\nReached 10s, performing seek ...\n")
+        # The scheduler issues a FLUSH | KEY_UNIT seek ("key-unit" policy) and
+        # measures how long it takes until the first frame after it is shown
+        data.seeker.request(30 * Gst.SECOND)
+        # Gst.SeekFlags.FLUSH - This discards all data currently in the pipeline before doing the seek.
+        # Might pause a bit while the pipeline is refilled and the new data starts to show up,
+        # but greatly increases the “responsiveness” of the application. If this flag is not provided,
+        # “stale” data might be shown for a while until the new position appears at the end of the pipeline
+        # Gst.SeekFlags.KEY_UNIT - With most encoded video streams, seeking to arbitrary positions is
+        # not possible but only to certain frames called Key Frames. When this flag is used,
+        # the seek will actually move to the closest key frame and start producing data straight away.
+        # If this flag is not used, the pipeline will move internally to the closest key frame (it has no other alternative)
+        # but data will not be shown until it reaches the requested position.
+        # This last alternative is more accurate, but might take longer.
+        data.seek_done = True
+
+
 def main():
     # Initialize GStreamer
     # Setup internal path lists, plugins, GstRegistry
@@ -94,58 +135,29 @@ def main():
     # Why is a bus required?
     # Bus takes care of forwarding messages from pipeline (running in a separate thread) to the application
     # Applications can avoid worrying about communicating with streaming threads / the pipeline directly.
-    data.bus = data.playbin.get_bus()
-    while True:
-        msg = data.bus.timed_pop_filtered(
-            100 * Gst.MSECOND,
-            Gst.MessageType.STATE_CHANGED
-            | Gst.MessageType.ERROR
-            | Gst.MessageType.EOS
-            | Gst.MessageType.DURATION_CHANGED,
-        )
-        if msg:
-            handle_message(msg, data)
-        else:
-            if data.playing:
-                ret, current = data.playbin.query_position(Gst.Format.TIME)
-                if not ret:
-                    logger.error("Could not query current position")
-                if data.duration != Gst.CLOCK_TIME_NONE:
-                    ret, data.duration = data.playbin.query_duration(Gst.Format.TIME)
-                    if not ret:
-                        logger.error("Could not query duration")
-                # Print current position and total duration
-                print(
-                    f"Current Position: {current} Total Duration: {data.duration}",
-                    end="\r",
-                    flush=True,
-                )
-
-                if (
-                    data.seek_enabled
-                    and not data.seek_done
-                    and current > 10 * Gst.SECOND
-                ):
-                    print("\nReached 10s, performing seek ...\n")
-                    data.playbin.seek_simple(
-                        Gst.Format.TIME,
-                        Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT,
-                        30 * Gst.SECOND,
-                    )
-                    # Gst.SeekFlags.FLUSH - This discards all data currently in the pipeline before doing the seek.
-                    # Might pause a bit while the pipeline is refilled and the new data starts to show up,
-                    # but greatly increases the “responsiveness” of the application. If this flag is not provided,
-                    # “stale” data might be shown for a while until the new position appears at the end of the pipeline
-                    # Gst.SeekFlags.KEY_UNIT - With most encoded video streams, seeking to arbitrary positions is
-                    # not possible but only to certain frames called Key Frames. When this flag is used,
-                    # the seek will actually move to the closest key frame and start producing data straight away.
-                    # If this flag is not used, the pipeline will move internally to the closest key frame (it has no other alternative)
-                    # but data will not be shown until it reaches the requested position.
-                    # This last alternative is more accurate, but might take longer.
-                    data.seek_done = True
-        if data.terminate:
-            data.playbin.set_state(Gst.State.NULL)
-            break
+    # The monitor watches the bus from a GLib main loop and only wakes up every
+    # 100 ms for position updates while the pipeline is PLAYING
+    data.main_loop = GLib.MainLoop(None)
+    data.seeker = SeekScheduler(data.playbin, policy="key-unit")
+    data.monitor = PositionMonitor(data.playbin, interval_ms=100, duration_cache=data.duration)
+    data.monitor.subscribe_messages(
+        lambda msg: on_message(msg, data),
+        Gst.MessageType.STATE_CHANGED
+        | Gst.MessageType.ERROR
+        | Gst.MessageType.EOS
+        | Gst.MessageType.DURATION_CHANGED,
+    )
+    data.monitor.subscribe_messages(
+        data.seeker.on_message,
+        Gst.MessageType.ASYNC_DONE | Gst.MessageType.DURATION_CHANGED,
+    )
+    data.monitor.subscribe(lambda current, duration: on_position(current, duration, data))
+    data.main_loop.run()
+
+    data.monitor.stop()
+    logger.info(f"Duration cache: {data.duration.stats()}")
+    logger.info(f"Seeks: {data.seeker.stats()}")
+    data.playbin.set_state(Gst.State.NULL)
 
 
 if __name__ == "__main__":
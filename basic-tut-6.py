@@ -9,6 +9,10 @@ gi.require_version("GObject", "2.0")
 gi.require_version("Gst", "1.0")
 from gi.repository import GLib, GObject, Gst
 
+from caps_index import CapsIndex
+from introspection import FactoryCache
+from negotiation import NegotiationTracker
+
 logging.basicConfig(
     level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s"
 )
@@ -34,36 +38,30 @@ def print_caps(caps, prefix):
         structure.foreach(print_field, prefix)
 
 
-def print_pad_templates_info(factory):
-    print(f"Pad templates for {factory}")  # pending: gst_element_factory_get_longname
-    if not Gst.ElementFactory.get_num_pad_templates(factory):
+def print_pad_templates_info(factory, cache):
+    # Answered from the on-disk factory cache instead of walking the GI objects
+    info = cache.factory(factory.get_name())
+    print(f"Pad templates for {info['longname']}")
+    if not info["pad_templates"]:
         logger.info("None\n")
         return
-    pads = Gst.ElementFactory.get_static_pad_templates(
-        factory
-    )  # pads is a list of padtemplates
-    for pad in pads:
-        padtemplate = pad.get()
-        if padtemplate.direction == Gst.PadDirection.SRC:
-            print(f"SRC template {padtemplate.name_template}\n")
-        elif padtemplate.direction == Gst.PadDirection.SINK:
-            print(f"SINK template {padtemplate.name_template}\n")
-        else:
-            print(f"UNKNOWN template {padtemplate.name_template}\n")
+    for padtemplate in info["pad_templates"]:
+        print(f"{padtemplate['direction'].upper()} template {padtemplate['name']}\n")
 
-        if padtemplate.presence == Gst.PadPresence.ALWAYS:
+        if padtemplate["presence"] == "always":
             print("      Availability: Always\n")
-        elif padtemplate.presence == Gst.PadPresence.SOMETIMES:
+        elif padtemplate["presence"] == "sometimes":
             print("       Availability: Sometimes\n")
-        elif padtemplate.presence == Gst.PadPresence.REQUEST:
+        elif padtemplate["presence"] == "request":
             print("       Availability: On Request\n")
         else:
             print("       Availability: Unknown\n")
 
-        if padtemplate.get_caps():
+        if padtemplate["caps"]:
             print("    Capabilities:\n")
-            caps = padtemplate.get_caps()
-            print_caps(caps, "         ")
+            # One caps structure per line
+            for structure in padtemplate["caps"].split("; "):
+                print(f"          {structure}")
             print(" ")
 
 
@@ -74,9 +72,12 @@ def print_pad_capabilities(element, pad_name):
         logger.error("Could not retrieve pad %s" % pad_name)
         return
 
+    # Only the caps already negotiated: a caps query would travel all the way
+    # upstream, the negotiation tracker reports the history instead
     caps = Gst.Pad.get_current_caps(pad)
     if not caps:
-        caps = pad.query_caps(None)
+        print("Caps for the %s pad: not negotiated yet\n" % pad_name)
+        return
 
     print("Caps for the %s pad:\n" % pad_name)
     print_caps(caps, "      ")
@@ -91,8 +92,15 @@ def main():
         logger.error("Not all element factories could be created")
         sys.exit(1)
     # Print information about pad templates of these factories
-    print_pad_templates_info(sourcefactory)
-    print_pad_templates_info(sinkfactory)
+    # The cache is built on the first run and reused until the registry changes
+    cache = FactoryCache()
+    print_pad_templates_info(sourcefactory, cache)
+    print_pad_templates_info(sinkfactory, cache)
+
+    # The same cached templates tell us which elements could follow the source
+    index = CapsIndex(cache.factories())
+    candidates = index.downstream(("audio/x-raw", None), klass="Sink/Audio")
+    print(f"Audio sinks accepting audio/x-raw, best rank first: {', '.join(candidates)}\n")
 
     # Instantiate actual elements using the factories
     source = sourcefactory.create("source")
@@ -118,6 +126,9 @@ def main():
     print("In NULL state: \n")
     print_pad_capabilities(sink, "sink")
 
+    # Record every CAPS event on every link from now on
+    tracker = NegotiationTracker(pipeline)
+
     # Start playing
     ret = pipeline.set_state(Gst.State.PLAYING)
     if not ret:
@@ -134,6 +145,7 @@ def main():
         if msg:
             if msg.type == Gst.MessageType.EOS:
                 logger.info("End of stream reached\n")
+                tracker.log_report()
                 terminate = True
                 break
             elif msg.type == Gst.MessageType.ERROR:
@@ -154,6 +166,8 @@ def main():
                     )
                     # Print the current Capabilities of the sink element
                     print_pad_capabilities(sink, "sink")
+                    if new_state == Gst.State.PLAYING:
+                        tracker.log_report()
             else:
                 # Ideally should not reach here
                 logger.error("Unknown message")
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
+import argparse
 import sys
 import logging
 import gi
 import signal
-import struct
+
+import numpy as np
 
 gi.require_version("GLib", "2.0")
 gi.require_version("GObject", "2.0")
@@ -12,103 +14,136 @@ gi.require_version("GstBase", "1.0")
 gi.require_version("GstAudio", "1.0")
 from gi.repository import GLib, GObject, Gst, GstAudio
 
+from appsink_consumer import AppSinkConsumer
+from buffers import MapError, fill_buffer
+from feeders import FEED_MODES, ChunkSizer, LoopLatencyProbe, make_feeder
+from pipeline_builder import PipelineBuildError, build
+from pools import ProducerPool
+from tee_branches import BranchManager, TeeBranches
+from timestamps import StreamClock
+from tracer import PipelineTracer
+from waveforms import WaveformGenerator
+
 logging.basicConfig(
     level=logging.DEBUG, format="[%(name)s] [%(levelname)8s] - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
 
+# The pipeline: appsrc -> tee -> audio, visualization and app branches
+# Node names double as element names and CustomData attribute names
+GRAPH = {
+    "nodes": {
+        "app_source": ("appsrc", {"format": Gst.Format.TIME}),
+        "tee": "tee",
+        "audio_queue": "queue",
+        "audio_convert1": "audioconvert",
+        "audio_resample": "audioresample",
+        "audio_sink": "autoaudiosink",
+        "video_queue": "queue",
+        "audio_convert2": "audioconvert",
+        "visual": ("wavescope", {"shader": 0, "style": 0}),
+        "video_convert": "videoconvert",
+        "video_sink": "autovideosink",
+        "app_queue": "queue",
+        "app_sink": "appsink",
+    },
+    "links": [
+        "app_source ! tee",
+        "tee.src_%u ! audio_queue ! audio_convert1 ! audio_resample ! audio_sink",
+        "tee.src_%u ! video_queue ! audio_convert2 ! visual ! video_convert ! video_sink",
+        "tee.src_%u ! app_queue ! app_sink",
+    ],
+}
+
+
 class CustomData:
     def __init__(self):
-        self.app_source = Gst.ElementFactory.make("appsrc", "audio_source")
-        self.tee = Gst.ElementFactory.make("tee", "tee")
-        self.audio_queue = Gst.ElementFactory.make("queue", "audio_queue")
-        self.audio_convert1 = Gst.ElementFactory.make("audioconvert", "audio_convert1")
-        self.audio_resample = Gst.ElementFactory.make("audioresample", "audio_resample")
-        self.audio_sink = Gst.ElementFactory.make("autoaudiosink", "audio_sink")
-        self.video_queue = Gst.ElementFactory.make("queue", "video_queue")
-        self.audio_convert2 = Gst.ElementFactory.make("audioconvert", "audio_convert2")
-        self.visual = Gst.ElementFactory.make("wavescope", "visual")
-        self.video_convert = Gst.ElementFactory.make("videoconvert", "video_convert")
-        self.video_sink = Gst.ElementFactory.make("autovideosink", "video_sink")
-        self.app_queue = Gst.ElementFactory.make("queue", "app_queue")
-        self.app_sink = Gst.ElementFactory.make("appsink", "app_sink")
-        self.pipeline = Gst.Pipeline.new("test-pipeline")
-        self.a, self.b, self.c, self.d = (
-            0,
-            0,
-            0,
-            0,
-        )  # for waveform generation
-        self.sourceid = 0  # to control GSource
-        self.num_samples = (
-            0  # number of samples generated so far (for time stamp generation)
-        )
+        # Creates, configures, adds and links every element of GRAPH
+        self.pipeline, self.elements = build(GRAPH)
+        for name, element in self.elements.items():
+            setattr(self, name, element)
+        self.generator = None  # for waveform generation
+        self.audio_caps = None
+        self.chunk_sizer = None  # picks the number of bytes per buffer
+        self.pool = ProducerPool()  # recycles buffers instead of allocating one per push
+        self.pool_warm = False  # True once the queues have filled up for the first time
+        self.feed_mode = "idle"  # "idle": GLib.idle_add, "thread": producer thread
+        self.feeder = None  # pushes buffers when appsrc emits need-data
+        self.latency_probe = None
+        self.consumer = None  # pulls samples from the appsink for analysis
+        self.level = None  # latest analysis result of the app branch
+        self.tracer = None  # per-element latency / throughput, see tracer.py
+        self.branches = None  # queue policies and levels of the tee branches
+        self.hot_branches = None  # attaches / detaches extra branches while playing
+        self.clock = None  # counts samples generated so far (for time stamp generation)
         self.main_loop = None
 
 
-def push_data(data):
-    chunk_size = 1024
-    sample_rate = 41000  # 88200 bytes
-    num_samples = chunk_size // 2  # because each sample is 16 bits
-    # Create a new empty buffer
-    buffer = Gst.Buffer.new_allocate(None, chunk_size, None)
-    buffer.pts = Gst.util_uint64_scale(data.num_samples, Gst.SECOND, sample_rate)
-    buffer.duration = Gst.util_uint64_scale(num_samples, Gst.SECOND, sample_rate)
+def make_buffer(data):
+    # The chunk size adapts to the need-data / enough-data cycles
+    chunk_size = data.chunk_sizer.next_chunk()
+    # Take a recycled buffer from the pool; its buffers hold max_chunk bytes, so a
+    # new chunk size only shrinks this one (the pool restores the full size on release)
+    buffer = data.pool.acquire()
+    buffer.set_size(chunk_size)
+    # PTS and duration come from the exact count of samples produced so far and
+    # the negotiated rate, so the stream never drifts
+    data.clock.stamp(buffer)
     # Generate some psychedelic waveforms aka make buffer data
-    # TO-DO: Triagnle wave instead of sine
-    ret, map_info = buffer.map(Gst.MapFlags.WRITE)
-    raw = map_info.data
-    raw = list(raw)
-    # data.c += data.d
-    # data.d -= (data.c // 1000)
-    # freq = 1100 + 1000 * data.d
-    # for i in range(num_samples):
-    #    data.a += data.b
-    #    data.b -= (data.a // freq)
-    #    raw[i] = 500 * data.a
-    amplitude = 1000
-    #for direction in (1, -1):
-    for i in range(chunk_size):
-        raw[i] = bytearray(
-            struct.pack("f", i * (amplitude / num_samples))
-        )
-    for i in range(chunk_size):
-        raw[i] = bytearray(struct.pack("f", amplitude - (i * (amplitude / num_samples)) * -1))
-
-    data.num_samples += num_samples
-
-    # Push the buffer into the appsrc
-    ret = data.app_source.emit(
-        "push-buffer", buffer
-    )  # push-buffer is an app_source signal
-    if ret != Gst.FlowReturn.OK:
-        return False
-
+    # The whole chunk is computed in one vectorized call and written straight
+    # into the mapped buffer memory, which is unmapped again afterwards
+    try:
+        fill_buffer(buffer, data.generator.fill, np.int16)
+    except MapError as err:
+        logger.error(f"Could not fill buffer: {err}")
+        return None
+
+    # The feeder pushes the buffer into the appsrc
+    return buffer
+
+
+def report_stats(data):
+    # The queues have filled up by the first report, so from now on the pool
+    # should recycle buffers instead of allocating them
+    if not data.pool_warm:
+        data.pool.mark()
+        data.pool_warm = True
+    logger.debug(f"Feeder ({data.feed_mode}): {data.feeder.stats()}")
+    logger.debug(f"Main loop latency: {data.latency_probe.stats()}")
+    logger.debug(f"Buffer pool: {data.pool.stats()}")
+    logger.debug(f"Chunk sizing: {data.chunk_sizer.stats()}")
+    logger.debug(f"App branch: {data.consumer.stats()} level {data.level}")
+    logger.debug("Tee branches:")
+    data.branches.log_report()
+    if data.hot_branches:
+        logger.debug(f"Hot branches: {data.hot_branches.stats()}")
+    if data.tracer:
+        logger.debug("Slowest elements:")
+        data.tracer.log_snapshot()
     return True
 
 
-def start_feed(object, arg0, data):
-    if data.sourceid == 0:
-        print("Start feeding\n")
-        # data.sourceid =
-        data.sourceid = GLib.idle_add(push_data, data)
-
-
-def stop_feed(object, data):
-    if data.sourceid != 0:
-        print("Stop feeding\n")
-        GLib.source_remove(data.sourceid)
-        data.sourceid = 0
-
+def toggle_hot_branch(data):
+    # Alternately attaches and detaches an extra analyzer branch on the tee
+    # while the other branches keep playing
+    if "analyzer" in data.hot_branches.active:
+        data.hot_branches.detach("analyzer")
+    elif "analyzer" not in data.hot_branches.detaching:
+        data.hot_branches.attach("analyzer", "audioconvert ! level ! fakesink sync=true", policy="realtime")
+    return True
 
-def new_sample(sink, data):
-    sample = sink.emit("pull-sample")  #
-    if sample:
-        print("*")
-        return Gst.FlowReturn.OK
 
-    return Gst.FlowReturn.ERROR
+def analyze_batch(frames, data):
+    # Runs on the consumer thread with views of the mapped appsink buffers
+    if not frames:
+        return
+    samples = np.concatenate([frame.data for frame in frames]).astype(np.float64)
+    data.level = {
+        "pts": frames[-1].pts,
+        "peak": int(np.abs(samples).max()),
+        "rms": float(np.sqrt(np.mean(samples**2))),
+    }
 
 
 def error_cb(bus, msg, data):
@@ -119,32 +154,52 @@ def error_cb(bus, msg, data):
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--feed-mode",
+        choices=FEED_MODES,
+        default="idle",
+        help="feed appsrc from GLib.idle_add (idle) or a producer thread (thread)",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=50,
+        help="upper bound for the audio held in one buffer, in milliseconds",
+    )
+    parser.add_argument(
+        "--trace",
+        type=int,
+        default=0,
+        metavar="N",
+        help="trace per-element latency and throughput, timing every Nth buffer (0: off)",
+    )
+    parser.add_argument(
+        "--hot-branch",
+        type=int,
+        default=0,
+        metavar="SECONDS",
+        help="attach / detach an extra tee branch every SECONDS while playing (0: off)",
+    )
+    args = parser.parse_args()
+
     Gst.init(None)
-    data = CustomData()
-    data.b = 1
-    data.d = 1
-    if (
-        not data.pipeline
-        or not data.app_source
-        or not data.tee
-        or not data.audio_queue
-        or not data.audio_convert1
-        or not data.audio_resample
-        or not data.audio_sink
-        or not data.video_queue
-        or not data.audio_convert2
-        or not data.visual
-        or not data.video_convert
-        or not data.video_sink
-        or not data.app_queue
-        or not data.app_sink
-    ):
-        logger.error("Not all elements could be created")
+    try:
+        data = CustomData()
+    except PipelineBuildError as err:
+        logger.error(f"Pipeline could not be built: {err}")
         sys.exit(1)
-
-    # Configure wavescope
-    data.visual.set_property("shader", 0)
-    data.visual.set_property("style", 0)
+    data.feed_mode = args.feed_mode
+    # Audio is the primary branch; the visualization may drop old data and the
+    # analysis only wants fresh data, so neither can hold back the tee
+    data.branches = TeeBranches(
+        {data.audio_queue: "primary", data.video_queue: "lossy", data.app_queue: "realtime"}
+    )
+    if args.hot_branch:
+        data.hot_branches = BranchManager(data.pipeline, data.tee, data.branches)
+        GLib.timeout_add_seconds(args.hot_branch, toggle_hot_branch, data)
+    if args.trace:
+        data.tracer = PipelineTracer(data.pipeline, sample_every=args.trace)
 
     # Configure appsrc
     sample_rate = 44100  # = 88200 bytes
@@ -153,72 +208,31 @@ def main():
         GstAudio.AudioFormat.S16, sample_rate, 1, None
     )  # Signed16LittleEndian
     audio_caps = info.to_caps()
+    # Other waveforms: "sine", "triangle"
+    data.generator = WaveformGenerator("psychedelic", sample_rate)
+    data.audio_caps = audio_caps
+    data.clock = StreamClock.from_audio_info(info)
     data.app_source.set_property("caps", audio_caps)
-    data.app_source.set_property("format", Gst.Format.TIME)
-    data.app_source.connect("need-data", start_feed, data)
-    data.app_source.connect("enough-data", stop_feed, data)
+    # Large chunks for throughput, but never more than --target-latency of audio
+    data.chunk_sizer = ChunkSizer(
+        data.app_source,
+        info.rate * info.bpf,
+        align=info.bpf,
+        target_latency=args.target_latency / 1000,
+    )
+    # One pool for the whole run, whatever chunk sizes the sizer picks
+    data.pool.set_caps(audio_caps, size=data.chunk_sizer.max_chunk)
+    # The feeder connects to need-data / enough-data and pushes buffers
+    data.feeder = make_feeder(data.feed_mode, data.app_source, lambda: make_buffer(data))
 
     # configure appsink
-    data.app_sink.set_property("emit-signals", True)
     data.app_sink.set_property(
         "caps", audio_caps
     )  # try removing this and see what happenss
-    data.app_sink.connect("new-sample", new_sample, data)
-
-    # add elements to pipeline
-    data.pipeline.add(
-        data.app_source,
-        data.tee,
-        data.audio_queue,
-        data.audio_convert1,
-        data.audio_resample,
-        data.audio_sink,
-        data.video_queue,
-        data.audio_convert2,
-        data.visual,
-        data.video_convert,
-        data.video_sink,
-        data.app_queue,
-        data.app_sink,
-    )
-    # Link elements with "Always" pads
-    ret1 = data.app_source.link(data.tee)
-    ret2 = (
-        data.audio_queue.link(data.audio_convert1)
-        and data.audio_convert1.link(data.audio_resample)
-        and data.audio_resample.link(data.audio_sink)
+    # Pulled in batches on a worker thread instead of a new-sample signal per buffer
+    data.consumer = AppSinkConsumer(
+        data.app_sink, lambda frames: analyze_batch(frames, data), dtype=np.int16
     )
-    ret3 = (
-        data.video_queue.link(data.audio_convert2)
-        and data.audio_convert2.link(data.visual)
-        and data.visual.link(data.video_convert)
-        and data.video_convert.link(data.video_sink)
-    )
-    ret4 = data.app_queue.link(data.app_sink)
-
-    if not ret1 or not ret2 or not ret3 or not ret4:
-        logger.error("Elements could not be linked")
-        sys.exit(1)
-
-    # Manually link tee, which has request pads
-    tee_audio_pad = data.tee.get_request_pad("src_%u")
-    logger.info("Obtained request pad for audio branch")  # To do: add gst_pad_get_name
-    queue_audio_pad = data.audio_queue.get_static_pad("sink")
-
-    tee_video_pad = data.tee.get_request_pad("src_%u")
-    logger.info("Obtained request pad for video branch")  # To do: add gst_pad_get_name
-    queue_video_pad = data.video_queue.get_static_pad("sink")
-
-    tee_app_pad = data.tee.get_request_pad("src_%u")
-    logger.info("Obtained request pad for app branch")
-    queue_app_pad = data.app_queue.get_static_pad("sink")
-
-    ret_audio = tee_audio_pad.link(queue_audio_pad)
-    ret_video = tee_video_pad.link(queue_video_pad)
-    ret_app = tee_app_pad.link(queue_app_pad)
-    if ret_audio != 0 or ret_video != 0 or ret_app != 0:
-        logger.error("Tee could not be linked")
-        sys.exit(1)
 
     # TO DO : What is happening here?
     # Setup bus and message handlers
@@ -229,6 +243,13 @@ def main():
     # Play pipeline
     data.pipeline.set_state(Gst.State.PLAYING)
     print("Pipeline play")
+    # Pull only once the appsink has started (see appsink_consumer.py)
+    data.consumer.start()
+
+    # Compare feed modes: throughput of the feeder and how late the main loop
+    # runs a 10 ms timer
+    data.latency_probe = LoopLatencyProbe(10)
+    GLib.timeout_add_seconds(5, report_stats, data)
 
     # Create a GLib Main loop and set it to run
     data.main_loop = GLib.MainLoop(None)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# Batch transcoding over a process pool
+#
+# C-code/video-res.c encodes one appsrc ! vp8enc ! matroskamux ! filesink
+# pipeline at a time. This runner takes a manifest of jobs (input files or
+# generated test sources plus encode settings) and spreads them over a process
+# pool: every worker process runs one pipeline at a time, and by default there are
+# as many workers as cores with single-threaded encoders (vp8enc/vp9enc get
+# threads=1, see transcode_jobs.py), so the pool and not the encoders decide how
+# the cores are shared. Per job it records wall time, frames per second and
+# output size; the summary is written as JSON.
+#
+# Manifest (JSON):
+#   {
+#     "defaults": {"encoder": "vp8enc", "encoder_props": {"deadline": 1}, "muxer": "matroskamux"},
+#     "jobs": [
+#       {"name": "ball", "source": "videotestsrc pattern=ball", "frames": 300},
+#       {"name": "clip", "input": "/path/to/clip.webm", "width": 640, "height": 480}
+#     ]
+#   }
+#
+# python3 batch_transcode.py manifest.json --output-dir out --summary summary.json
+# python3 batch_transcode.py --generate 16   # no manifest, 16 test pattern jobs
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from process_runner import run_in_processes, wait_for_eos
+from transcode_jobs import EXTENSIONS, generated_jobs, load_manifest
+
+logger = logging.getLogger(__name__)
+
+
+def _props(props):
+    return " ".join(f"{name}={value}" for name, value in props.items())
+
+
+def launch_description(job, output):
+    caps = (
+        f"video/x-raw,format={job['format']},width={job['width']},height={job['height']},"
+        f"framerate={job['framerate']}/1"
+    )
+    if "input" in job:
+        uri = job["input"] if Gst.uri_is_valid(job["input"]) else Gst.filename_to_uri(job["input"])
+        # Only the video stream is decoded, audio is not even exposed
+        source = (
+            f'uridecodebin uri="{uri}" caps=video/x-raw expose-all-streams=false '
+            f"! videoconvert ! videoscale ! videorate"
+        )
+    else:
+        source = f"{job['source']} num-buffers={job['frames']}"
+    return (
+        f"{source} ! {caps} ! {job['encoder']} name=encoder {_props(job['encoder_props'])} "
+        f"! {job['muxer']} ! filesink location=\"{output}\""
+    )
+
+
+def run_job(job, output_dir):
+    # Runs in a worker process; returns the job's result dict
+    extension = EXTENSIONS.get(job["muxer"], "bin")
+    output = os.path.abspath(os.path.join(output_dir, f"{job['name']}.{extension}"))
+    result = {"name": job["name"], "output": output, "status": "ok", "error": None, "frames": 0}
+    start = time.perf_counter()
+    try:
+        pipeline = Gst.parse_launch(launch_description(job, output))
+    except GLib.Error as err:
+        result.update(status="failed", error=f"Could not build pipeline: {err.message}")
+        return result
+
+    # Frames actually reaching the encoder
+    frames = [0]
+
+    def count(pad, info):
+        frames[0] += 1
+        return Gst.PadProbeReturn.OK
+
+    pipeline.get_by_name("encoder").get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, count)
+
+    if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+        result.update(status="failed", error="Unable to set the pipeline to the playing state")
+    else:
+        error = wait_for_eos(pipeline)
+        if error:
+            result.update(status="failed", error=error)
+    pipeline.set_state(Gst.State.NULL)
+
+    wall = time.perf_counter() - start
+    result["frames"] = frames[0]
+    result["wall_s"] = wall
+    result["fps"] = frames[0] / wall if wall else 0.0
+    result["output_bytes"] = os.path.getsize(output) if os.path.exists(output) else 0
+    return result
+
+
+def run_batch(jobs, output_dir, workers=None):
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    start = time.perf_counter()
+    calls = [(job, output_dir) for job in jobs]
+    for (job, _), result, error in run_in_processes(run_job, calls, workers):
+        if error:
+            result = {"name": job["name"], "status": "failed", "error": error, "frames": 0}
+        logger.info(
+            f"{result['name']}: {result['status']}, {result['frames']} frames, "
+            f"{result.get('fps', 0.0):.1f} fps, {result.get('output_bytes', 0)} bytes"
+        )
+        results.append(result)
+    wall = time.perf_counter() - start
+
+    frames = sum(r["frames"] for r in results)
+    return {
+        "workers": workers,
+        "jobs": len(jobs),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "wall_s": wall,
+        "frames": frames,
+        "fps": frames / wall if wall else 0.0,
+        "output_bytes": sum(r.get("output_bytes", 0) for r in results),
+        # Sum of per-job wall times over the batch wall time: how many jobs ran in parallel on average
+        "parallelism": sum(r.get("wall_s", 0.0) for r in results) / wall if wall else 0.0,
+        "results": sorted(results, key=lambda r: r["name"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcode a batch of jobs over a process pool")
+    parser.add_argument("manifest", nargs="?", help="JSON manifest, see the top of this file")
+    parser.add_argument("--generate", type=int, default=0, help="test pattern jobs to run without a manifest")
+    parser.add_argument("--output-dir", default="transcoded")
+    parser.add_argument("--workers", type=int, default=None, help="default: number of cores")
+    parser.add_argument("--summary", help="write the summary here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    if args.manifest:
+        jobs = load_manifest(args.manifest)
+    elif args.generate:
+        jobs = generated_jobs(args.generate)
+    else:
+        parser.error("Either a manifest or --generate is needed")
+
+    summary = run_batch(jobs, args.output_dir, args.workers)
+    if args.summary:
+        with open(args.summary, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
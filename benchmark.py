@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# Headless throughput benchmark of the tutorial topologies
+#
+# The tutorials render to autoaudiosink / autovideosink and play network media in
+# real time, so they cannot show how fast a topology can actually run. This runs
+# each one as fast as possible instead:
+# - sinks become fakesink sync=false (appsink keeps its consumer, with sync=false)
+# - test sources get num-buffers and is-live=false, uridecodebin plays a local
+#   file (generated once if --media is not given), appsrc is fed from a producer
+#   thread and ends the stream itself
+# The graphs are the tutorials' own GRAPHs (tut-2 has none, see TUT2_GRAPH), so
+# the benchmark follows changes to them. Every topology runs in a fresh spawned
+# process, so peak RSS and CPU time belong to that stream alone. Reported per
+# topology: buffers and buffers/s at every sink, realtime factor (media time
+# reached / wall time), peak RSS and CPU time, as JSON.
+#
+# python3 benchmark.py --seconds 60 --report bench.json
+# python3 benchmark.py tut3 --media /path/to/clip.webm
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+gi.require_version("GstAudio", "1.0")
+from gi.repository import GLib, Gst, GstAudio
+
+from appsink_consumer import AppSinkConsumer
+from buffers import MapError, fill_buffer
+from decode_dispatcher import DecodeDispatcher, Route
+from feeders import make_feeder
+from pipeline_builder import PipelineBuildError, build
+from pools import ProducerPool
+from process_runner import run_in_processes, wait_for_eos
+from stats import resource_usage
+from timestamps import StreamClock
+from waveforms import WaveformGenerator
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# basic-tut-2.py builds this by hand
+TUT2_GRAPH = {
+    "nodes": {
+        "source": ("videotestsrc", {"pattern": 1}),
+        "sink": "autovideosink",
+    },
+    "links": ["source ! sink"],
+}
+
+TOPOLOGIES = {
+    "tut2": None,
+    "tut3": "basic-tut-3.py",
+    "tut7": "basic-tut-7.py",
+    "tut8": "basic-tut-8.py",
+}
+
+HEADLESS_SINKS = ("autoaudiosink", "autovideosink", "alsasink", "pulsesink", "xvimagesink", "ximagesink")
+
+# Test source settings the buffer counts are computed from
+VIDEO_FRAMERATE = 30
+AUDIO_RATE = 44100
+AUDIO_SAMPLES_PER_BUFFER = 1024
+
+
+def tutorial_graph(name):
+    script = TOPOLOGIES[name]
+    if script is None:
+        return TUT2_GRAPH
+    # The scripts are not importable by name (dashes), and only run main() as __main__
+    spec = importlib.util.spec_from_file_location(script[:-3].replace("-", "_"), os.path.join(HERE, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.GRAPH
+
+
+def headless(graph, seconds, media_uri=None):
+    # Copy of graph with fakesinks and finite, non-live sources
+    nodes = {}
+    for name, node in graph["nodes"].items():
+        factory, props = (node, {}) if isinstance(node, str) else node
+        props = dict(props)
+        if factory in HEADLESS_SINKS:
+            factory, props = "fakesink", {"sync": False}
+        elif factory == "appsink":
+            props["sync"] = False
+        elif factory == "videotestsrc":
+            props.update({"is-live": False, "num-buffers": int(seconds * VIDEO_FRAMERATE)})
+        elif factory == "audiotestsrc":
+            props.update(
+                {
+                    "is-live": False,
+                    "samplesperbuffer": AUDIO_SAMPLES_PER_BUFFER,
+                    "num-buffers": -(-int(seconds * AUDIO_RATE) // AUDIO_SAMPLES_PER_BUFFER),
+                }
+            )
+        elif factory == "uridecodebin":
+            if media_uri is None:
+                raise ValueError("uridecodebin needs a local media file")
+            props["uri"] = media_uri
+        nodes[name] = (factory, props)
+    return {"nodes": nodes, "links": list(graph.get("links", ()))}
+
+
+def generate_media(path, seconds):
+    # A local stand-in for the sintel trailer tut-3 plays: VP8 480p video and Vorbis audio in WebM
+    frames = int(seconds * 24)
+    audio_buffers = -(-int(seconds * AUDIO_RATE) // AUDIO_SAMPLES_PER_BUFFER)
+    description = (
+        f"videotestsrc num-buffers={frames} pattern=ball ! video/x-raw,width=854,height=480,framerate=24/1 "
+        f"! vp8enc deadline=1 ! queue ! webmmux name=mux ! filesink location={path} "
+        f"audiotestsrc num-buffers={audio_buffers} samplesperbuffer={AUDIO_SAMPLES_PER_BUFFER} "
+        f"! audio/x-raw,rate={AUDIO_RATE},channels=2 ! audioconvert ! vorbisenc ! queue ! mux."
+    )
+    pipeline = Gst.parse_launch(description)
+    pipeline.set_state(Gst.State.PLAYING)
+    error = wait_for_eos(pipeline)
+    pipeline.set_state(Gst.State.NULL)
+    if error:
+        raise RuntimeError(f"Could not generate {path}: {error}")
+    return Gst.filename_to_uri(path)
+
+
+class SinkCounter:
+    # Buffers reaching one sink and the furthest media time among them
+    def __init__(self, element):
+        self.name = element.get_name()
+        self.buffers = 0
+        self.bytes = 0
+        self.first_pts = None
+        self.end_time = 0
+        element.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self._on_buffer)
+
+    def _on_buffer(self, pad, info):
+        buffer = info.get_buffer()
+        self.buffers += 1
+        self.bytes += buffer.get_size()
+        if buffer.pts != Gst.CLOCK_TIME_NONE:
+            if self.first_pts is None:
+                self.first_pts = buffer.pts
+            duration = buffer.duration if buffer.duration != Gst.CLOCK_TIME_NONE else 0
+            self.end_time = max(self.end_time, buffer.pts + duration)
+        return Gst.PadProbeReturn.OK
+
+    @property
+    def media_time(self):
+        return (self.end_time - self.first_pts) / Gst.SECOND if self.first_pts is not None else 0.0
+
+
+class AppSrcPlayer:
+    # tut-8's appsrc producer without the adaptive chunking: fixed chunks of
+    # generated audio from a thread, then end-of-stream after `seconds`
+    def __init__(self, appsrc, appsink, seconds):
+        info = GstAudio.AudioInfo()
+        info.set_format(GstAudio.AudioFormat.S16, AUDIO_RATE, 1, None)
+        self.caps = info.to_caps()
+        self.appsrc = appsrc
+        self.generator = WaveformGenerator("psychedelic", AUDIO_RATE)
+        self.clock = StreamClock.from_audio_info(info)
+        self.pool = ProducerPool()
+        self.pool.set_caps(self.caps, samples_per_buffer=AUDIO_SAMPLES_PER_BUFFER)
+        self.total = int(seconds * AUDIO_RATE)
+        self.ended = False
+        appsrc.set_property("caps", self.caps)
+        appsink.set_property("caps", self.caps)
+        self.feeder = make_feeder("thread", appsrc, self.produce)
+        # Pulling and mapping every sample is part of what tut-8 costs; nothing is
+        # dropped, so every pushed buffer must come out (see check())
+        self.consumer = AppSinkConsumer(appsink, lambda frames: None, dtype=np.int16, drop=False)
+
+    def start(self):
+        # Once the pipeline is on its way to PLAYING (see appsink_consumer.py)
+        self.consumer.start()
+
+    def check(self, timeout_s=10):
+        # Error message if the appsink was not fully drained, else None
+        if not self.consumer.wait(timeout_s):
+            return f"appsink consumer still running {timeout_s} s after EOS"
+        pushed, consumed = self.feeder.buffers_pushed, self.consumer.samples
+        if consumed != pushed:
+            return f"appsink consumer got {consumed} of {pushed} pushed buffers"
+        return None
+
+    def produce(self):
+        if self.clock.units >= self.total:
+            if not self.ended:
+                self.ended = True
+                self.appsrc.emit("end-of-stream")
+            return None
+        buffer = self.clock.stamp(self.pool.acquire())
+        try:
+            fill_buffer(buffer, self.generator.fill, np.int16)
+        except MapError as err:
+            logger.error(f"Could not fill buffer: {err}")
+            return None
+        return buffer
+
+    def stop(self):
+        self.feeder.stop()
+        self.consumer.stop()
+        self.pool.release()
+
+    def stats(self):
+        return {"feeder": self.feeder.stats(), "consumer": self.consumer.stats()}
+
+
+def run_topology(name, seconds, media_uri=None, timeout_s=600):
+    # Runs in its own worker process; returns the topology's result dict
+    result = {"topology": name, "status": "ok", "error": None}
+    try:
+        pipeline, elements = build(headless(tutorial_graph(name), seconds, media_uri))
+    except (PipelineBuildError, ValueError) as err:
+        result.update(status="failed", error=f"Pipeline could not be built: {err}")
+        return result
+
+    helper = None
+    if "app_source" in elements:
+        helper = AppSrcPlayer(elements["app_source"], elements["app_sink"], seconds)
+    elif name == "tut3":
+        # As in basic-tut-3.py: only the audio is decoded
+        helper = DecodeDispatcher(pipeline, elements["source"], [Route("audio/x-raw", elements["convert"])])
+    counters = [
+        SinkCounter(element)
+        for element in elements.values()
+        if element.get_factory().get_name() in ("fakesink", "appsink")
+    ]
+
+    cpu_start, start = resource_usage()[1], time.perf_counter()
+    if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+        result.update(status="failed", error="Unable to set the pipeline to the playing state")
+    else:
+        if isinstance(helper, AppSrcPlayer):
+            helper.start()
+        error = wait_for_eos(pipeline, timeout_s)
+        if error:
+            result.update(status="failed", error=error)
+    if isinstance(helper, AppSrcPlayer) and result["status"] == "ok":
+        # Numbers of a sink that was never drained would be meaningless
+        error = helper.check()
+        if error:
+            result.update(status="failed", error=error)
+    wall = time.perf_counter() - start
+    cpu = resource_usage()[1] - cpu_start
+    pipeline.set_state(Gst.State.NULL)
+    if isinstance(helper, AppSrcPlayer):
+        helper.stop()
+        result["appsrc"] = helper.stats()
+    elif helper is not None:
+        helper.stop()
+        result["streams"] = helper.stats()
+
+    media_time = max((counter.media_time for counter in counters), default=0.0)
+    buffers = sum(counter.buffers for counter in counters)
+    result.update(
+        {
+            "wall_s": wall,
+            "media_s": media_time,
+            "realtime_factor": media_time / wall if wall else 0.0,
+            "buffers": buffers,
+            "buffers_per_second": buffers / wall if wall else 0.0,
+            "sinks": {
+                counter.name: {
+                    "buffers": counter.buffers,
+                    "bytes": counter.bytes,
+                    "buffers_per_second": counter.buffers / wall if wall else 0.0,
+                    "media_s": counter.media_time,
+                }
+                for counter in counters
+            },
+            "cpu_s": cpu,
+            "cpu_percent": 100 * cpu / wall if wall else 0.0,
+            # ru_maxrss is in KiB on Linux; includes Python and plugin loading
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
+    )
+    return result
+
+
+def run_benchmark(names, seconds, media_uri=None):
+    results = []
+    calls = [(name, seconds, media_uri) for name in names]
+    for (name, _, _), result, error in run_in_processes(run_topology, calls, fresh_process=True):
+        if error:
+            result = {"topology": name, "status": "failed", "error": error}
+        if result["status"] == "ok":
+            logger.info(
+                f"{name}: {result['buffers_per_second']:.0f} buffers/s, {result['realtime_factor']:.1f}x realtime, "
+                f"{result['cpu_s']:.2f} s CPU, {result['peak_rss_bytes'] / 2**20:.1f} MiB peak RSS"
+            )
+        else:
+            logger.error(f"{name}: {result['error']}")
+        results.append(result)
+    return {
+        "seconds": seconds,
+        "media_uri": media_uri,
+        "cpu_count": os.cpu_count(),
+        "gstreamer": Gst.version_string(),
+        "results": results,
+        "failed": sum(1 for result in results if result["status"] != "ok"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the tutorial topologies headless, as fast as possible")
+    parser.add_argument("topologies", nargs="*", help=f"any of {', '.join(TOPOLOGIES)} (default: all)")
+    parser.add_argument("--seconds", type=float, default=30, help="media time each topology processes")
+    parser.add_argument("--media", help="local file for tut3 (default: generate a WebM of --seconds)")
+    parser.add_argument("--report", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    unknown = set(args.topologies) - set(TOPOLOGIES)
+    if unknown:
+        parser.error(f"Unknown topologies: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    Gst.init(None)
+    names = args.topologies or list(TOPOLOGIES)
+    with tempfile.TemporaryDirectory() as tmp:
+        media_uri = None
+        if "tut3" in names:
+            try:
+                if args.media:
+                    media_uri = Gst.filename_to_uri(os.path.abspath(args.media))
+                else:
+                    media_uri = generate_media(os.path.join(tmp, "media.webm"), args.seconds)
+            except (GLib.Error, RuntimeError) as err:
+                # run_topology() then reports tut3 as failed
+                logger.error(f"No media for tut3: {err}")
+        report = run_benchmark(names, args.seconds, media_uri)
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Zero-copy access to Gst.Buffer memory for appsrc feeders
+#
+# Without the gst-python overrides, Gst.Buffer.map() hands back map_info.data as
+# a read-only bytes copy: writes never reach the buffer. map_buffer() exposes the
+# mapped memory itself as a writable memoryview (or a NumPy array via map_array)
+# and always unmaps it again, even if the fill code raises. The GstBuffer pointer
+# comes from PyGObject's __gpointer__ capsule; where that is missing the data is
+# copied out with extract_dup() and written back with fill() instead.
+import ctypes
+import ctypes.util
+from contextlib import contextmanager
+
+import gi
+import numpy as np
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+
+# Mirrors struct GstMapInfo from gst/gstmemory.h
+class _GstMapInfo(ctypes.Structure):
+    _fields_ = [
+        ("memory", ctypes.c_void_p),
+        ("flags", ctypes.c_int),
+        ("data", ctypes.POINTER(ctypes.c_ubyte)),
+        ("size", ctypes.c_size_t),
+        ("maxsize", ctypes.c_size_t),
+        ("user_data", ctypes.c_void_p * 4),
+        ("_gst_reserved", ctypes.c_void_p * 4),
+    ]
+
+
+_libgst = None
+
+
+def _gst_library():
+    global _libgst
+    if _libgst is None:
+        _libgst = ctypes.CDLL(ctypes.util.find_library("gstreamer-1.0") or "libgstreamer-1.0.so.0")
+        _libgst.gst_buffer_map.argtypes = [ctypes.c_void_p, ctypes.POINTER(_GstMapInfo), ctypes.c_int]
+        _libgst.gst_buffer_map.restype = ctypes.c_int
+        _libgst.gst_buffer_unmap.argtypes = [ctypes.c_void_p, ctypes.POINTER(_GstMapInfo)]
+        _libgst.gst_buffer_unmap.restype = None
+    return _libgst
+
+
+_capsule_pointer = ctypes.pythonapi.PyCapsule_GetPointer
+_capsule_pointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+_capsule_pointer.restype = ctypes.c_void_p
+
+
+class MapError(RuntimeError):
+    pass
+
+
+def _buffer_address(buffer):
+    # The GstBuffer* behind a Gst.Buffer from the capsule PyGObject exposes in
+    # __gpointer__, or None if this PyGObject does not have it
+    capsule = getattr(buffer, "__gpointer__", None)
+    if capsule is None:
+        return None
+    return _capsule_pointer(capsule, None)
+
+
+@contextmanager
+def _copied_buffer(buffer, flags):
+    # Fallback without the pointer: a copy of the data, written back afterwards
+    data = bytearray(buffer.extract_dup(0, buffer.get_size()))
+    view = memoryview(data)
+    if not flags & Gst.MapFlags.WRITE:
+        yield view.toreadonly()
+        return
+    if not buffer.is_writable():
+        raise MapError("Could not map buffer")
+    yield view
+    buffer.fill(0, bytes(data))
+
+
+@contextmanager
+def map_buffer(buffer, flags=Gst.MapFlags.WRITE):
+    # Yields a memoryview over the mapped memory, writable if flags include WRITE.
+    # The view must not be used after the with block: the memory is unmapped then.
+    address = _buffer_address(buffer)
+    if address is None:
+        with _copied_buffer(buffer, flags) as view:
+            yield view
+        return
+    libgst = _gst_library()
+    info = _GstMapInfo()
+    if not libgst.gst_buffer_map(address, ctypes.byref(info), int(flags)):
+        # Mapping WRITE fails for shared (non-writable) buffers
+        raise MapError("Could not map buffer")
+    try:
+        array_type = ctypes.c_ubyte * info.size
+        view = memoryview(array_type.from_address(ctypes.cast(info.data, ctypes.c_void_p).value)).cast("B")
+        if not flags & Gst.MapFlags.WRITE:
+            view = view.toreadonly()
+        yield view
+    finally:
+        libgst.gst_buffer_unmap(address, ctypes.byref(info))
+
+
+@contextmanager
+def map_array(buffer, dtype=np.uint8, flags=Gst.MapFlags.WRITE):
+    # Same as map_buffer(), viewed as a flat NumPy array of dtype
+    with map_buffer(buffer, flags) as view:
+        yield np.frombuffer(view, dtype=dtype)
+
+
+def fill_buffer(buffer, fill, dtype=np.uint8):
+    # Calls fill(array) on the mapped memory, for feeders that just want it filled
+    with map_array(buffer, dtype) as array:
+        fill(array)
+    return buffer
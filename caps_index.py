@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# Caps compatibility index for picking elements automatically
+#
+# Built from the pad template caps in the factory cache (introspection.py): for
+# each direction it maps a media type (e.g. audio/x-raw) to the factories whose
+# templates handle it, together with the formats they list. Lookups are plain
+# dict accesses, so finding the elements that can follow a given src caps takes
+# microseconds instead of trial-linking candidates one by one.
+#
+# Caps strings are parsed here without GI. Structures with caps features other
+# than system memory (GL, DMABuf, ...) are left out since they need special
+# upstream elements anyway.
+import re
+import sys
+import time
+from collections import defaultdict, namedtuple
+
+Candidate = namedtuple("Candidate", ["rank", "factory", "formats", "klass"])
+
+_FORMAT_FIELD = re.compile(r"(?:^|,)\s*format=(?:\(string\))?(\{[^}]*\}|[^,]+)")
+
+
+def split_structures(caps_string):
+    # "a, x=1; b, y={ 1, 2 }" -> ["a, x=1", "b, y={ 1, 2 }"]
+    structures, depth, current = [], 0, []
+    for char in caps_string:
+        if char in "{[(<":
+            depth += 1
+        elif char in "}])>":
+            depth -= 1
+        if char == ";" and depth == 0:
+            structures.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        structures.append("".join(current).strip())
+    return structures
+
+
+def parse_structure(structure):
+    # Returns (media_type, formats) with formats None for "any format", or None
+    # for structures with non-system-memory caps features
+    head, _, fields = structure.partition(",")
+    head = head.strip()
+    if "(" in head:
+        head, _, features = head.partition("(")
+        if features.rstrip(")") != "memory:SystemMemory":
+            return None
+    match = _FORMAT_FIELD.search(fields)
+    if not match:
+        return head, None
+    value = match.group(1).strip()
+    if value.startswith("{"):
+        formats = value.strip("{} ").split(",")
+    else:
+        formats = [value]
+    return head, frozenset(f.strip().strip('"') for f in formats if f.strip())
+
+
+def parse_caps_string(caps_string):
+    caps_string = caps_string.strip()
+    if caps_string == "ANY":
+        return "ANY"
+    if caps_string in ("", "EMPTY", "NONE"):
+        return []
+    return [parsed for parsed in map(parse_structure, split_structures(caps_string)) if parsed]
+
+
+def caps_key(caps):
+    # (media_type, format) of a Gst.Caps, a caps string or an existing tuple
+    if isinstance(caps, tuple):
+        return caps
+    caps_string = caps if isinstance(caps, str) else caps.to_string()
+    parsed = parse_caps_string(caps_string)
+    if not parsed or parsed == "ANY":
+        raise ValueError(f"Cannot index caps {caps_string!r}")
+    media_type, formats = parsed[0]
+    if formats and len(formats) == 1:
+        return media_type, next(iter(formats))
+    return media_type, None
+
+
+class CapsIndex:
+    def __init__(self, factories):
+        # factories: iterable of factory dicts, see introspection.describe_factory()
+        self._by_type = {"sink": defaultdict(list), "src": defaultdict(list)}
+        self._any = {"sink": [], "src": []}
+        for info in factories:
+            for template in info["pad_templates"]:
+                direction = template["direction"]
+                if direction not in self._by_type:
+                    continue
+                parsed = parse_caps_string(template["caps"])
+                if parsed == "ANY":
+                    self._any[direction].append(Candidate(info["rank"], info["name"], None, info["klass"]))
+                    continue
+                for media_type, formats in parsed:
+                    self._by_type[direction][media_type].append(
+                        Candidate(info["rank"], info["name"], formats, info["klass"])
+                    )
+        for table in self._by_type.values():
+            for candidates in table.values():
+                candidates.sort(key=lambda c: (-c.rank, c.factory))
+        for candidates in self._any.values():
+            candidates.sort(key=lambda c: (-c.rank, c.factory))
+        self._cache = {}
+
+    @classmethod
+    def from_factory_cache(cls, cache=None):
+        if cache is None:
+            from introspection import FactoryCache
+
+            cache = FactoryCache()
+        return cls(cache.factories())
+
+    def media_types(self, direction="sink"):
+        return sorted(self._by_type[direction])
+
+    def _lookup(self, direction, caps, klass, include_any):
+        media_type, format = caps_key(caps)
+        key = (direction, media_type, format, klass, include_any)
+        result = self._cache.get(key)
+        if result is None:
+            seen = set()
+            result = []
+            candidates = self._by_type[direction].get(media_type, [])
+            if include_any:
+                candidates = sorted(candidates + self._any[direction], key=lambda c: (-c.rank, c.factory))
+            for candidate in candidates:
+                if candidate.factory in seen:
+                    continue
+                if format and candidate.formats is not None and format not in candidate.formats:
+                    continue
+                if klass and klass not in candidate.klass:
+                    continue
+                seen.add(candidate.factory)
+                result.append(candidate.factory)
+            self._cache[key] = result
+        return result
+
+    def downstream(self, caps, klass=None, include_any=False):
+        # Factories with a sink template accepting caps, best rank first.
+        # klass filters on the factory class, e.g. "Sink/Audio" or "Converter".
+        # include_any adds elements like queue or tee that accept ANY caps.
+        return self._lookup("sink", caps, klass, include_any)
+
+    def upstream(self, caps, klass=None, include_any=False):
+        # Factories with a src template producing caps, best rank first
+        return self._lookup("src", caps, klass, include_any)
+
+
+def main():
+    import gi
+
+    gi.require_version("Gst", "1.0")
+    from gi.repository import Gst
+
+    Gst.init(None)
+    start = time.perf_counter()
+    index = CapsIndex.from_factory_cache()
+    print(f"Index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for caps in sys.argv[1:] or ["audio/x-raw, format=(string)S16LE", "video/x-raw, format=(string)I420"]:
+        start = time.perf_counter_ns()
+        candidates = index.downstream(caps)
+        elapsed = (time.perf_counter_ns() - start) / 1000
+        print(f"{caps} -> {len(candidates)} candidates in {elapsed:.1f} us: {', '.join(candidates[:10])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Adaptive appsrc chunk sizing
+#
+# ChunkSizer only listens to an appsrc's need-data / enough-data signals and
+# reads its max-bytes property, so it needs no GStreamer imports of its own and
+# can be exercised with any object that has connect() and get_property().
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkSizer:
+    # Chooses the chunk size at runtime:
+    # - never more than target_latency worth of data, nor a quarter of the
+    #   appsrc max-bytes queue (so it still holds several buffers)
+    # - need-data again before enough-data closed the previous cycle means the
+    #   queue ran dry while we were still filling it, i.e. we are not keeping
+    #   up: double the chunk so each Python call moves more data. (An empty
+    #   queue alone says nothing: with the default min-percent=0 appsrc only
+    #   asks for data once it is empty.)
+    # - a need-data/enough-data cycle that needed only a couple of pushes means
+    #   chunks are coarse compared to the queue: halve them
+    # - a cycle with very many pushes is pure call overhead: double the chunk
+    # Sizes are multiples of align (bytes per audio frame).
+    def __init__(
+        self,
+        appsrc,
+        bytes_per_second,
+        align=1,
+        target_latency=0.05,
+        min_chunk=256,
+        initial_chunk=1024,
+        few_pushes=2,
+        many_pushes=64,
+    ):
+        self.appsrc = appsrc
+        self.bytes_per_second = bytes_per_second
+        self.align = align
+        self.target_latency = target_latency
+        self.min_chunk = self._align(max(min_chunk, align))
+        self.few_pushes = few_pushes
+        self.many_pushes = many_pushes
+        self.chunk_size = self._clamp(initial_chunk)
+        self.cycles = 0
+        self.underruns = 0
+        self.resizes = 0
+        self._pushes_in_cycle = 0
+        self._filling = False  # between need-data and enough-data
+        self._lock = threading.Lock()
+        self._handlers = [
+            appsrc.connect("need-data", self._on_need_data),
+            appsrc.connect("enough-data", self._on_enough_data),
+        ]
+
+    def _align(self, size):
+        return max(self.align, size // self.align * self.align)
+
+    @property
+    def max_chunk(self):
+        by_latency = int(self.target_latency * self.bytes_per_second)
+        max_bytes = self.appsrc.get_property("max-bytes")
+        by_queue = max_bytes // 4 if max_bytes else by_latency
+        return self._align(max(self.min_chunk, min(by_latency, by_queue)))
+
+    def _clamp(self, size):
+        return self._align(min(max(size, self.min_chunk), self.max_chunk))
+
+    def _resize(self, size):
+        size = self._clamp(size)
+        if size != self.chunk_size:
+            logger.debug(f"Chunk size {self.chunk_size} -> {size} bytes")
+            self.chunk_size = size
+            self.resizes += 1
+
+    def _on_need_data(self, appsrc, length):
+        with self._lock:
+            if self._filling and self._pushes_in_cycle:
+                self.underruns += 1
+                self._resize(self.chunk_size * 2)
+            self._filling = True
+
+    def _on_enough_data(self, appsrc):
+        with self._lock:
+            self._filling = False
+            self.cycles += 1
+            if self._pushes_in_cycle <= self.few_pushes:
+                self._resize(self.chunk_size // 2)
+            elif self._pushes_in_cycle >= self.many_pushes:
+                self._resize(self.chunk_size * 2)
+            self._pushes_in_cycle = 0
+
+    def next_chunk(self):
+        # Size for the next buffer (at most max_chunk, so buffers can come from
+        # one pool sized max_chunk); call once per buffer produced
+        with self._lock:
+            self._pushes_in_cycle += 1
+            return self.chunk_size
+
+    def stop(self):
+        for handler in self._handlers:
+            self.appsrc.disconnect(handler)
+        self._handlers = []
+
+    def stats(self):
+        return {
+            "chunk_size": self.chunk_size,
+            "max_chunk": self.max_chunk,
+            "cycles": self.cycles,
+            "underruns": self.underruns,
+            "resizes": self.resizes,
+        }
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# Multi-stream dispatcher for uridecodebin / decodebin
+#
+# basic-tut-3.py's pad_added_handler linked the first audio/x-raw pad and
+# ignored everything else, but by then the video (and any extra audio track) had
+# already been demuxed and decoded, only to be left unlinked. DecodeDispatcher
+# maps caps prefixes to routes:
+#   Route("audio/x-raw", convert)                           - link to an element
+#   Route("video/x-raw", "videoconvert ! autovideosink")    - new branch per stream
+#   Route("audio/x-raw", graph, max_streams=2)              - pipeline_builder graph
+# and decides twice for each stream:
+# - in autoplug-select, before a decoder is created: if no route with room left
+#   wants the decoder's output, the stream is exposed still encoded (EXPOSE), so
+#   it is never decoded. Otherwise a slot is reserved for the decoder, which is
+#   recognised when decodebin adds it (deep-element-added, same thread, same
+#   factory). A decoder that decodebin removes again (it failed to link or to
+#   start) gives its slot back.
+# - in pad-added: the pad is linked to its route, or to a fakesink if it is
+#   unwanted or its branch cannot be built or linked, which keeps the demuxer
+#   from failing with not-linked. The reservation used is the one of the decoder
+#   found upstream of the pad.
+# When decodebin removes a pad (new stream or chain), the route slot is freed at
+# once and the branch is set to NULL and removed from the main loop: streaming
+# threads must not change states. Nothing is removed when the pipeline itself is
+# going to NULL, it takes its children down anyway; without a running main loop
+# (basic-tut-3.py) that is the only teardown there is.
+import logging
+import threading
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from caps_index import parse_caps_string
+from pipeline_builder import PipelineBuildError, build
+
+logger = logging.getLogger(__name__)
+
+# GstAutoplugSelectResult from decodebin
+AUTOPLUG_TRY = 0
+AUTOPLUG_EXPOSE = 1
+AUTOPLUG_SKIP = 2
+
+
+class Route:
+    def __init__(self, prefix, target, max_streams=1):
+        # target: Gst.Element to link to, a gst-launch style branch description
+        # or a pipeline_builder graph; branches are built once per stream
+        self.prefix = prefix
+        self.target = target
+        self.max_streams = 1 if isinstance(target, Gst.Element) else max_streams
+        self.streams = []  # branch bins (or the target element) in use
+        self.reserved = 0  # decoders accepted in autoplug-select, not yet linked
+
+    def matches(self, media_type):
+        return media_type.startswith(self.prefix)
+
+    @property
+    def has_room(self):
+        return len(self.streams) + self.reserved < self.max_streams
+
+
+def pad_media_type(pad):
+    caps = pad.get_current_caps() or pad.query_caps(None)
+    if caps is None or caps.is_empty() or caps.is_any():
+        return None
+    return caps.get_structure(0).get_name()
+
+
+class DecodeDispatcher:
+    def __init__(self, pipeline, decodebin, routes):
+        self.pipeline = pipeline
+        self.decodebin = decodebin
+        self.routes = list(routes)
+        self.decoders_skipped = 0  # streams exposed encoded instead of decoded
+        self.discarded = []  # media types sent to fakesink
+        self._lock = threading.Lock()
+        self._selected = {}  # streaming thread -> (Route, factory name), until decodebin adds the decoder
+        self._reservations = {}  # decoder element -> Route, until it exposes a pad or is removed
+        self._decoder_outputs = {}  # decoder factory name -> raw media types
+        self._linked = {}  # exposed pad -> (Route, branch), or (None, fakesink)
+        self._handlers = [
+            decodebin.connect("autoplug-select", self._on_autoplug_select),
+            decodebin.connect("deep-element-added", self._on_element_added),
+            decodebin.connect("deep-element-removed", self._on_element_removed),
+            decodebin.connect("pad-added", self._on_pad_added),
+            decodebin.connect("pad-removed", self._on_pad_removed),
+        ]
+
+    def _route_for(self, media_type):
+        # First route for media_type that still has room, or None
+        for route in self.routes:
+            if route.matches(media_type) and route.has_room:
+                return route
+        return None
+
+    def _outputs(self, factory):
+        name = factory.get_name()
+        outputs = self._decoder_outputs.get(name)
+        if outputs is None:
+            outputs = []
+            for template in factory.get_static_pad_templates():
+                if template.direction == Gst.PadDirection.SRC:
+                    parsed = parse_caps_string(template.get_caps().to_string())
+                    if parsed != "ANY":
+                        outputs.extend(media_type for media_type, formats in parsed)
+            self._decoder_outputs[name] = outputs
+        return outputs
+
+    def _on_autoplug_select(self, bin, pad, caps, factory):
+        # Streaming thread of the demuxer; only decoders are of interest here
+        klass = factory.get_metadata(Gst.ELEMENT_METADATA_KLASS) or ""
+        if "Decoder" not in klass:
+            return AUTOPLUG_TRY
+        outputs = self._outputs(factory)
+        thread = threading.get_ident()
+        with self._lock:
+            # decodebin creates the decoder right after TRY, on this thread; a
+            # selection still pending here was never created
+            self._unselect(thread)
+            for media_type in outputs:
+                route = self._route_for(media_type)
+                if route is not None:
+                    route.reserved += 1
+                    self._selected[thread] = (route, factory.get_name())
+                    return AUTOPLUG_TRY
+            self.decoders_skipped += 1
+        logger.info(f"Not decoding {caps.get_structure(0).get_name()}: no route wants {', '.join(outputs) or 'it'}")
+        return AUTOPLUG_EXPOSE
+
+    def _unselect(self, thread):
+        # With the lock held
+        route, factory_name = self._selected.pop(thread, (None, None))
+        if route is not None:
+            route.reserved -= 1
+
+    def _on_element_added(self, bin, sub_bin, element):
+        factory = element.get_factory()
+        if factory is None:
+            return
+        thread = threading.get_ident()
+        with self._lock:
+            route, factory_name = self._selected.get(thread, (None, None))
+            if factory_name == factory.get_name():
+                del self._selected[thread]
+                self._reservations[element] = route
+
+    def _on_element_removed(self, bin, sub_bin, element):
+        with self._lock:
+            route = self._reservations.pop(element, None)
+            if route is None:
+                return
+            route.reserved -= 1
+        logger.info(f"Decoder {element.get_name()} removed before exposing a stream, {route.prefix} slot freed")
+
+    def _on_pad_added(self, src, new_pad):
+        media_type = pad_media_type(new_pad)
+        logger.info(f"Received new pad {new_pad.get_name()} ({media_type}) from {src.get_name()}")
+        with self._lock:
+            route = self._route_for_pad(new_pad, media_type)
+        if route is None:
+            self._discard(new_pad, media_type)
+            return
+        try:
+            branch, sink_pad = self._make_branch(route)
+        except PipelineBuildError as err:
+            logger.error(f"Could not build branch for {media_type}: {err}")
+            self._discard(new_pad, media_type)
+            return
+        if new_pad.link(sink_pad) != Gst.PadLinkReturn.OK:
+            logger.error(f"Could not link {media_type} pad to its branch, discarding it")
+            with self._lock:
+                unused = self._release(route, branch)
+            self._teardown(unused)
+            self._discard(new_pad, media_type)
+            return
+        with self._lock:
+            self._linked[new_pad] = (route, branch)
+        logger.info(f"Linked {media_type} to route {route.prefix} ({len(route.streams)}/{route.max_streams})")
+
+    def _on_pad_removed(self, src, pad):
+        with self._lock:
+            route, branch = self._linked.pop(pad, (None, None))
+            if branch is None:
+                return
+            # A discarded stream's fakesink has no route
+            unused = branch if route is None else self._release(route, branch)
+        self._teardown(unused)
+        logger.info(f"Pad {pad.get_name()} removed, its branch is going away")
+
+    def _release(self, route, branch):
+        # Frees the route slot, with the lock held; returns the branch if it has
+        # to be torn down, None for a target element that stays in the pipeline
+        route.streams.remove(branch)
+        return None if branch is route.target else branch
+
+    def _pipeline_stopping(self):
+        # Non-blocking: current and pending state only, no waiting for ASYNC
+        ret, state, pending = self.pipeline.get_state(0)
+        return Gst.State.NULL in (state, pending)
+
+    def _teardown(self, element):
+        if element is None or self._pipeline_stopping():
+            return
+        GLib.idle_add(self._remove_element, element)
+
+    def _remove_element(self, element):
+        # Main loop; the pipeline may have stopped since
+        if element.get_parent() == self.pipeline:
+            element.set_state(Gst.State.NULL)
+            self.pipeline.remove(element)
+        return False
+
+    def _decoder_of(self, pad):
+        # The reserved decoder feeding an exposed pad, or None: through the ghost
+        # pads of (uri)decodebin to the element behind them, then upstream
+        while isinstance(pad, Gst.GhostPad):
+            pad = pad.get_target()
+        element = pad.get_parent_element() if pad is not None else None
+        while element is not None:
+            if element in self._reservations:
+                return element
+            sink_pad = element.get_static_pad("sink")
+            peer = sink_pad.get_peer() if sink_pad is not None else None
+            element = peer.get_parent_element() if peer is not None else None
+        return None
+
+    def _route_for_pad(self, pad, media_type):
+        # A decoder accepted in autoplug-select turns its reservation into a stream
+        decoder = self._decoder_of(pad)
+        if decoder is not None:
+            route = self._reservations.pop(decoder)
+            route.reserved -= 1
+            if media_type is not None and route.matches(media_type):
+                return route
+        if media_type is None:
+            return None
+        return self._route_for(media_type)
+
+    def _make_branch(self, route):
+        # Returns (branch, its sink pad); the branch already holds a route slot
+        if isinstance(route.target, Gst.Element):
+            route.streams.append(route.target)
+            return route.target, route.target.get_static_pad("sink")
+        name = f"{route.prefix.replace('/', '_')}_{len(route.streams)}"
+        if isinstance(route.target, dict):
+            branch = Gst.Bin.new(name)
+            build(route.target, pipeline=branch)
+            first = branch.find_unlinked_pad(Gst.PadDirection.SINK)
+            if first is None:
+                raise PipelineBuildError(f"Branch {name!r} has no unlinked sink pad", name)
+            branch.add_pad(Gst.GhostPad.new("sink", first))
+        else:
+            branch = Gst.parse_bin_from_description(route.target, True)
+            branch.set_name(name)
+        self.pipeline.add(branch)
+        branch.sync_state_with_parent()
+        route.streams.append(branch)
+        return branch, branch.get_static_pad("sink")
+
+    def _discard(self, pad, media_type):
+        # Unwanted streams still need a peer, or the demuxer stops with not-linked
+        sink = Gst.ElementFactory.make("fakesink", None)
+        sink.set_property("sync", False)
+        sink.set_property("async", False)
+        self.pipeline.add(sink)
+        sink.sync_state_with_parent()
+        pad.link(sink.get_static_pad("sink"))
+        with self._lock:
+            self._linked[pad] = (None, sink)
+        self.discarded.append(media_type)
+        logger.info(f"Discarding {media_type}")
+
+    def stats(self):
+        return {
+            "routes": {route.prefix: len(route.streams) for route in self.routes},
+            "decoders_skipped": self.decoders_skipped,
+            "discarded": list(self.discarded),
+        }
+
+    def stop(self):
+        for handler in self._handlers:
+            self.decodebin.disconnect(handler)
+        self._handlers = []
+        with self._lock:
+            for thread in list(self._selected):
+                self._unselect(thread)
+            for route in self._reservations.values():
+                route.reserved -= 1
+            self._reservations = {}
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# Ways of feeding an appsrc, driven by its need-data / enough-data signals
+#
+# IdleFeeder  - one buffer per GLib main loop dispatch via GLib.idle_add
+#               (what basic-tut-8.py always did)
+# ThreadFeeder - a background thread pushes batches of buffers until
+#               enough-data fires, then sleeps on a condition variable until
+#               need-data fires again; the main loop only handles bus messages
+#
+# Both take a produce() callable returning the next Gst.Buffer and keep the same
+# counters, so the modes can be compared. LoopLatencyProbe measures how late the
+# main loop runs a periodic timer, i.e. how busy feeding keeps it.
+#
+# ChunkSizer (chunk_sizer.py, re-exported here) picks how many bytes produce()
+# should put in each buffer from the need-data / enough-data cycles it observes.
+import abc
+import logging
+import threading
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from chunk_sizer import ChunkSizer  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+FEED_MODES = ("idle", "thread")
+
+
+class Feeder(abc.ABC):
+    # Subclasses must implement both signal handlers: instantiating one that
+    # misses either fails here instead of raising inside a GStreamer callback
+    def __init__(self, appsrc, produce):
+        self.appsrc = appsrc
+        self.produce = produce
+        self.buffers_pushed = 0
+        self.bytes_pushed = 0
+        self.started_at = None
+        self._handlers = [
+            appsrc.connect("need-data", self._on_need_data),
+            appsrc.connect("enough-data", self._on_enough_data),
+        ]
+
+    @abc.abstractmethod
+    def _on_need_data(self, appsrc, length):
+        pass
+
+    @abc.abstractmethod
+    def _on_enough_data(self, appsrc):
+        pass
+
+    def push_one(self):
+        # Returns False once the appsrc no longer accepts data
+        buffer = self.produce()
+        if buffer is None:
+            return False
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        size = buffer.get_size()
+        ret = self.appsrc.emit("push-buffer", buffer)  # push-buffer is an appsrc signal
+        if ret != Gst.FlowReturn.OK:
+            logger.debug(f"push-buffer returned {ret}, feeding stopped")
+            return False
+        self.buffers_pushed += 1
+        self.bytes_pushed += size
+        return True
+
+    def stop(self):
+        for handler in self._handlers:
+            self.appsrc.disconnect(handler)
+        self._handlers = []
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "buffers": self.buffers_pushed,
+            "bytes": self.bytes_pushed,
+            "buffers_per_second": self.buffers_pushed / elapsed if elapsed else 0.0,
+            "bytes_per_second": self.bytes_pushed / elapsed if elapsed else 0.0,
+        }
+
+
+class IdleFeeder(Feeder):
+    def __init__(self, appsrc, produce):
+        super().__init__(appsrc, produce)
+        self.sourceid = 0  # to control GSource
+
+    def _on_need_data(self, appsrc, length):
+        if self.sourceid == 0:
+            logger.debug("Start feeding")
+            self.sourceid = GLib.idle_add(self._push)
+
+    def _on_enough_data(self, appsrc):
+        if self.sourceid != 0:
+            logger.debug("Stop feeding")
+            GLib.source_remove(self.sourceid)
+            self.sourceid = 0
+
+    def _push(self):
+        if self.push_one():
+            return True
+        self.sourceid = 0
+        return False
+
+    def stop(self):
+        self._on_enough_data(self.appsrc)
+        super().stop()
+
+
+class ThreadFeeder(Feeder):
+    def __init__(self, appsrc, produce, batch_size=16):
+        super().__init__(appsrc, produce)
+        self.batch_size = batch_size
+        self.wakeups = 0
+        self._cond = threading.Condition()
+        self._wanted = False
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="appsrc-feeder", daemon=True)
+        self._thread.start()
+
+    # need-data / enough-data come from the streaming thread, or from our own
+    # thread while it is inside push-buffer, so they only flip the flag
+    def _on_need_data(self, appsrc, length):
+        with self._cond:
+            self._wanted = True
+            self._cond.notify()
+
+    def _on_enough_data(self, appsrc):
+        with self._cond:
+            self._wanted = False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wanted and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            self.wakeups += 1
+            # Push a batch without holding the lock; enough-data may clear
+            # _wanted while we are inside push-buffer
+            for _ in range(self.batch_size):
+                if not self.push_one():
+                    with self._cond:
+                        self._wanted = False
+                    break
+                if not self._wanted:
+                    break
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        super().stop()
+
+    def stats(self):
+        stats = super().stats()
+        stats["wakeups"] = self.wakeups
+        return stats
+
+
+def make_feeder(mode, appsrc, produce, **kwargs):
+    if mode == "idle":
+        return IdleFeeder(appsrc, produce)
+    if mode == "thread":
+        return ThreadFeeder(appsrc, produce, **kwargs)
+    raise ValueError(f"Unknown feed mode {mode!r}, expected one of {FEED_MODES}")
+
+
+class LoopLatencyProbe:
+    # Fires every interval_ms on the main loop and records how late it ran
+    def __init__(self, interval_ms=10):
+        self.interval = interval_ms / 1000
+        self.samples = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self._expected = time.monotonic() + self.interval
+        self.sourceid = GLib.timeout_add(interval_ms, self._tick)
+
+    def _tick(self):
+        now = time.monotonic()
+        delay = max(0.0, now - self._expected)
+        self.samples += 1
+        self.total_delay += delay
+        self.max_delay = max(self.max_delay, delay)
+        self._expected = now + self.interval
+        return True
+
+    def stop(self):
+        if self.sourceid:
+            GLib.source_remove(self.sourceid)
+            self.sourceid = 0
+
+    def stats(self):
+        return {
+            "mean_delay_ms": 1000 * self.total_delay / self.samples if self.samples else 0.0,
+            "max_delay_ms": 1000 * self.max_delay,
+        }
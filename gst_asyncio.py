@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# asyncio adapter for pipelines
+#
+# The tutorials either block in bus.timed_pop_filtered() or run a GLib main loop,
+# neither of which composes with an asyncio service. AsyncPipeline installs a bus
+# sync handler instead: it runs in whichever thread posts the message and only
+# hands the message to the event loop with call_soon_threadsafe(), so no thread
+# or GLib main loop is needed per pipeline. On the loop side:
+#
+#   async for msg in apipe.messages(Gst.MessageType.ERROR | Gst.MessageType.EOS):
+#       ...
+#   await apipe.set_state(Gst.State.PLAYING)   # returns once PLAYING is reached
+#   await apipe.wait_eos()
+#
+# AppSrcWriter turns appsrc's need-data / enough-data signals into an
+# asyncio.Event, so `await writer.push(buffer)` only returns once the appsrc
+# wants more data. enough-data is emitted from inside push-buffer, i.e. on the
+# loop thread, so it clears the event right away; a tight push loop that never
+# yields still stops at max-bytes. `python3 gst_asyncio.py --check` verifies that.
+#
+# The sync handler drops every message after dispatching it, so bus.add_watch()
+# and timed_pop_filtered() see nothing while an AsyncPipeline is attached.
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(RuntimeError):
+    def __init__(self, message, element=None, debug_info=None):
+        super().__init__(message)
+        self.element = element
+        self.debug_info = debug_info
+
+
+class StateChangeError(RuntimeError):
+    pass
+
+
+def _error_from_message(msg):
+    err, debug_info = msg.parse_error()
+    name = msg.src.get_name() if msg.src else None
+    return PipelineError(f"Error received from element {name}: {err.message}", name, debug_info)
+
+
+class AsyncPipeline:
+    def __init__(self, pipeline, loop=None):
+        self.pipeline = pipeline
+        self.loop = loop or asyncio.get_running_loop()
+        self._subscribers = []  # [(types, asyncio.Queue), ...]
+        self._state_waiters = []  # [(state, future), ...]
+        self._eos = self.loop.create_future()
+        self._closed = False
+        self._bus = pipeline.get_bus()
+        self._bus.set_sync_handler(self._on_sync_message)
+
+    def _on_sync_message(self, bus, msg):
+        # Any streaming thread; only hand over to the loop here
+        try:
+            self.loop.call_soon_threadsafe(self._dispatch, msg)
+        except RuntimeError:
+            # Event loop already closed
+            pass
+        return Gst.BusSyncReply.DROP
+
+    def _dispatch(self, msg):
+        if msg.type == Gst.MessageType.STATE_CHANGED and msg.src == self.pipeline:
+            old_state, new_state, pending_state = msg.parse_state_changed()
+            if pending_state == Gst.State.VOID_PENDING:
+                for state, future in self._state_waiters:
+                    if state == new_state and not future.done():
+                        future.set_result(new_state)
+        elif msg.type == Gst.MessageType.ERROR:
+            error = _error_from_message(msg)
+            for state, future in self._state_waiters:
+                if not future.done():
+                    future.set_exception(error)
+            if not self._eos.done():
+                self._eos.set_exception(error)
+        elif msg.type == Gst.MessageType.EOS:
+            if not self._eos.done():
+                self._eos.set_result(True)
+
+        for types, queue in self._subscribers:
+            if msg.type & types:
+                queue.put_nowait(msg)
+
+    async def messages(self, types=Gst.MessageType.ANY):
+        # Async iterator over bus messages matching types, until close()
+        queue = asyncio.Queue()
+        entry = (types, queue)
+        self._subscribers.append(entry)
+        try:
+            while True:
+                msg = await queue.get()
+                if msg is None:
+                    return
+                yield msg
+        finally:
+            self._subscribers.remove(entry)
+
+    async def set_state(self, state, timeout=None):
+        # Returns once the pipeline reached state; raises StateChangeError if the
+        # change failed and PipelineError if an element posts an error meanwhile
+        future = self.loop.create_future()
+        waiter = (state, future)
+        # Registered before set_state(): the loop cannot dispatch the resulting
+        # messages before we await, so none can be missed
+        self._state_waiters.append(waiter)
+        try:
+            ret = self.pipeline.set_state(state)
+            if ret == Gst.StateChangeReturn.FAILURE:
+                raise StateChangeError(f"Unable to set the pipeline to {Gst.Element.state_get_name(state)}")
+            if ret == Gst.StateChangeReturn.ASYNC:
+                await asyncio.wait_for(future, timeout)
+            return ret
+        finally:
+            self._state_waiters.remove(waiter)
+
+    async def wait_eos(self, timeout=None):
+        # Raises PipelineError if an error arrives first
+        await asyncio.wait_for(asyncio.shield(self._eos), timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._bus.set_sync_handler(None)
+        for types, queue in self._subscribers:
+            queue.put_nowait(None)
+        if not self._eos.done():
+            self._eos.cancel()
+
+
+class AppSrcWriter:
+    def __init__(self, appsrc, loop=None):
+        self.appsrc = appsrc
+        self.loop = loop or asyncio.get_running_loop()
+        self.buffers_pushed = 0
+        self.waits = 0
+        self._wanted = asyncio.Event()
+        self._wanted.set()  # appsrc accepts data until it says otherwise
+        self._handlers = [
+            appsrc.connect("need-data", self._on_need_data),
+            appsrc.connect("enough-data", self._on_enough_data),
+        ]
+
+    def _on_need_data(self, appsrc, length):
+        self._signal(self._wanted.set)
+
+    def _on_enough_data(self, appsrc):
+        self._signal(self._wanted.clear)
+
+    def _signal(self, callback):
+        # need-data / enough-data come from the streaming thread or from inside
+        # push-buffer; asyncio.Event is only touched from the loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            # Inside push-buffer: must take effect before push() checks again
+            callback()
+            return
+        try:
+            self.loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass
+
+    def _full(self):
+        max_bytes = self.appsrc.get_property("max-bytes")
+        return max_bytes and self.appsrc.get_property("current-level-bytes") >= max_bytes
+
+    async def push(self, buffer):
+        # Waits while the appsrc queue is full, then pushes; returns the FlowReturn
+        if self._wanted.is_set() and self._full():
+            # enough-data may still be on its way from another thread
+            self._wanted.clear()
+        if not self._wanted.is_set():
+            self.waits += 1
+            await self._wanted.wait()
+        ret = self.appsrc.emit("push-buffer", buffer)
+        if ret == Gst.FlowReturn.OK:
+            self.buffers_pushed += 1
+        return ret
+
+    def end_of_stream(self):
+        return self.appsrc.emit("end-of-stream")
+
+    def close(self):
+        for handler in self._handlers:
+            self.appsrc.disconnect(handler)
+        self._handlers = []
+
+
+async def run_stream(buffers, buffer_size):
+    # is-live: PLAYING is reached without a preroll buffer, so set_state() can
+    # be awaited before the first push
+    pipeline = Gst.parse_launch(
+        f"appsrc name=source format=time is-live=true max-bytes={16 * buffer_size} ! queue ! fakesink name=sink sync=false"
+    )
+    apipe = AsyncPipeline(pipeline)
+    writer = AppSrcWriter(pipeline.get_by_name("source"))
+    try:
+        await apipe.set_state(Gst.State.PLAYING, timeout=10)
+        for n in range(buffers):
+            buffer = Gst.Buffer.new_allocate(None, buffer_size, None)
+            buffer.pts = n * Gst.SECOND // 100
+            buffer.duration = Gst.SECOND // 100
+            if await writer.push(buffer) != Gst.FlowReturn.OK:
+                break
+        writer.end_of_stream()
+        await apipe.wait_eos(timeout=30)
+        return writer.buffers_pushed, writer.waits
+    finally:
+        writer.close()
+        apipe.close()
+        pipeline.set_state(Gst.State.NULL)
+
+
+async def check_backpressure(buffers=100, buffer_size=4096):
+    # A tight push loop into a clock-synced sink: push() has to wait for the
+    # appsrc, and its queue must never grow past max-bytes plus one buffer
+    max_bytes = 8 * buffer_size
+    pipeline = Gst.parse_launch(
+        f"appsrc name=source format=time is-live=true max-bytes={max_bytes} ! fakesink sync=true"
+    )
+    apipe = AsyncPipeline(pipeline)
+    appsrc = pipeline.get_by_name("source")
+    writer = AppSrcWriter(appsrc)
+    peak = 0
+    try:
+        await apipe.set_state(Gst.State.PLAYING, timeout=10)
+        for n in range(buffers):
+            buffer = Gst.Buffer.new_allocate(None, buffer_size, None)
+            buffer.pts = n * Gst.SECOND // 1000
+            buffer.duration = Gst.SECOND // 1000
+            if await writer.push(buffer) != Gst.FlowReturn.OK:
+                break
+            peak = max(peak, appsrc.get_property("current-level-bytes"))
+        writer.end_of_stream()
+        await apipe.wait_eos(timeout=30)
+    finally:
+        writer.close()
+        apipe.close()
+        pipeline.set_state(Gst.State.NULL)
+    ok = writer.waits > 0 and peak <= max_bytes + buffer_size
+    print(f"{writer.waits} backpressure waits, peak level {peak}/{max_bytes} bytes  {'OK' if ok else 'FAIL'}")
+    return ok
+
+
+async def run(streams, buffers, buffer_size):
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_stream(buffers, buffer_size) for _ in range(streams)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if isinstance(r, Exception)]
+    for error in failed:
+        logger.error(f"Stream failed: {error}")
+    pushed = sum(r[0] for r in results if not isinstance(r, Exception))
+    waits = sum(r[1] for r in results if not isinstance(r, Exception))
+    print(
+        f"{streams} streams, {pushed} buffers in {elapsed:.2f}s "
+        f"({pushed / elapsed:.0f} buffers/s, {waits} backpressure waits, {len(failed)} failed)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many appsrc pipelines from one asyncio loop")
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--buffers", type=int, default=200)
+    parser.add_argument("--buffer-size", type=int, default=4096)
+    parser.add_argument("--check", action="store_true", help="only check that appsrc backpressure holds")
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    if args.check:
+        sys.exit(0 if asyncio.run(check_backpressure(buffer_size=args.buffer_size)) else 1)
+    asyncio.run(run(args.streams, args.buffers, args.buffer_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Persistent cache of element factory metadata
+#
+# Walking Gst.ElementFactory pad templates and their caps through GI is slow and
+# basic-tut-6.py did it on every start. FactoryCache walks every element factory
+# once, serializes what the tutorials need (rank, klass, pad templates with
+# direction, presence and caps string) to a JSON file and answers later lookups
+# from that file. The file is keyed by a hash of the registry's feature and plugin
+# list, so installing, removing or upgrading plugins rebuilds it automatically.
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+DIRECTIONS = {
+    Gst.PadDirection.SRC: "src",
+    Gst.PadDirection.SINK: "sink",
+}
+PRESENCES = {
+    Gst.PadPresence.ALWAYS: "always",
+    Gst.PadPresence.SOMETIMES: "sometimes",
+    Gst.PadPresence.REQUEST: "request",
+}
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "gstreamer-py-tuts")
+
+
+def registry_key(registry=None):
+    # Cheap fingerprint of the registry: no pad templates are touched
+    registry = registry or Gst.Registry.get()
+    digest = hashlib.sha1()
+    digest.update(f"{CACHE_VERSION} {Gst.version_string()}\n".encode())
+    plugins = sorted(f"{plugin.get_name()} {plugin.get_version()}" for plugin in registry.get_plugin_list())
+    features = sorted(
+        f"{feature.get_plugin_name()} {feature.get_name()} {feature.get_rank()}"
+        for feature in registry.get_feature_list(Gst.ElementFactory)
+    )
+    for line in plugins + features:
+        digest.update(line.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def describe_factory(factory):
+    templates = []
+    for static_template in factory.get_static_pad_templates():
+        padtemplate = static_template.get()
+        caps = padtemplate.get_caps()
+        templates.append(
+            {
+                "name": padtemplate.name_template,
+                "direction": DIRECTIONS.get(padtemplate.direction, "unknown"),
+                "presence": PRESENCES.get(padtemplate.presence, "unknown"),
+                "caps": caps.to_string() if caps else "",
+            }
+        )
+    return {
+        "name": factory.get_name(),
+        "longname": factory.get_metadata(Gst.ELEMENT_METADATA_LONGNAME) or "",
+        "klass": factory.get_metadata(Gst.ELEMENT_METADATA_KLASS) or "",
+        "rank": factory.get_rank(),
+        "pad_templates": templates,
+    }
+
+
+class FactoryCache:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.key = registry_key()
+        self.path = os.path.join(self.cache_dir, f"factories-{self.key[:16]}.json")
+        self.built = False  # True if this run had to walk the registry
+        self._factories = self._load() or self._build()
+
+    def _load(self):
+        try:
+            with open(self.path) as cache_file:
+                contents = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if contents.get("key") != self.key:
+            return None
+        return contents["factories"]
+
+    def _build(self):
+        start = time.perf_counter()
+        factories = {}
+        for feature in Gst.Registry.get().get_feature_list(Gst.ElementFactory):
+            factories[feature.get_name()] = describe_factory(feature)
+        logger.info(f"Described {len(factories)} element factories in {time.perf_counter() - start:.2f}s")
+        self.built = True
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"key": self.key, "factories": factories}, cache_file)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            # Still usable for this run, just not persisted
+            logger.error(f"Could not write factory cache {self.path}: {err}")
+        return factories
+
+    def names(self):
+        return sorted(self._factories)
+
+    def factories(self):
+        return self._factories.values()
+
+    def factory(self, name):
+        # Metadata of the factory, or None if it does not exist
+        return self._factories.get(name)
+
+    def pad_templates(self, name, direction=None):
+        info = self._factories.get(name)
+        if info is None:
+            return []
+        return [t for t in info["pad_templates"] if direction is None or t["direction"] == direction]
+
+
+def main():
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    start = time.perf_counter()
+    cache = FactoryCache()
+    elapsed = time.perf_counter() - start
+    print(f"{'Built' if cache.built else 'Loaded'} {cache.path} in {elapsed * 1000:.1f} ms")
+    for name in sys.argv[1:]:
+        print(json.dumps(cache.factory(name), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# Minimal Matroska / WebM reader for checking encoded output
+#
+# Walks the EBML elements of a file (no mkvinfo needed, and no GStreamer) and
+# collects the doc type, the track headers, the number of blocks and the
+# dimensions of every VP8/VP9 key frame. check_output() compares that with what
+# was fed into the encoder, frame by frame. Used by res_change_bench.py.
+import struct
+
+CODEC_IDS = {"vp8enc": "V_VP8", "vp9enc": "V_VP9"}
+DOC_TYPES = {"matroskamux": "matroska", "webmmux": "webm"}
+
+# EBML / Matroska element IDs, with their length marker bits
+EBML_HEADER = 0x1A45DFA3
+DOC_TYPE = 0x4282
+SEGMENT = 0x18538067
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+DEFAULT_DURATION = 0x23E383
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+CLUSTER_TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+# Masters whose children are read in place rather than skipped
+MASTERS = {EBML_HEADER, SEGMENT, TRACKS, TRACK_ENTRY, VIDEO, CLUSTER, BLOCK_GROUP}
+
+
+def _read_vint(data, pos, keep_marker=False):
+    # Returns (value, length, all value bits set); raises on a bad first byte
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError(f"Invalid EBML variable length integer at {pos}")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[pos + 1 : pos + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, unknown
+
+
+def iter_elements(data):
+    # Flat walk over (id, payload start, payload size) of every element; the
+    # children of MASTERS come right after them, so unknown sizes (as written
+    # by live muxers) need no special handling
+    pos = 0
+    while pos < len(data):
+        element_id, id_length, _ = _read_vint(data, pos, keep_marker=True)
+        size, size_length, unknown = _read_vint(data, pos + id_length)
+        start = pos + id_length + size_length
+        if unknown:
+            size = None
+        yield element_id, start, size
+        if element_id in MASTERS or size is None:
+            pos = start
+        else:
+            pos = start + size
+
+
+def _uint(data, start, size):
+    return int.from_bytes(data[start : start + size], "big")
+
+
+def vp8_frame_size(frame):
+    # (width, height) of a VP8 key frame, None for inter frames
+    if len(frame) < 10 or frame[0] & 1 or frame[3:6] != b"\x9d\x01\x2a":
+        return None
+    width, height = struct.unpack("<HH", frame[6:10])
+    return width & 0x3FFF, height & 0x3FFF
+
+
+class _BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, bits):
+        value = 0
+        for _ in range(bits):
+            byte = self.data[self.pos // 8]
+            value = (value << 1) | ((byte >> (7 - self.pos % 8)) & 1)
+            self.pos += 1
+        return value
+
+
+def vp9_frame_size(frame):
+    # (width, height) of a VP9 key frame from its uncompressed header
+    try:
+        bits = _BitReader(frame)
+        if bits.read(2) != 2:  # frame marker
+            return None
+        profile = bits.read(1) | (bits.read(1) << 1)
+        if profile == 3:
+            bits.read(1)
+        if bits.read(1):  # show_existing_frame
+            return None
+        if bits.read(1):  # frame_type: 1 = inter frame
+            return None
+        bits.read(2)  # show_frame, error_resilient_mode
+        if bits.read(24) != 0x498342:
+            return None
+        if profile >= 2:
+            bits.read(1)  # ten_or_twelve_bit
+        color_space = bits.read(3)
+        if color_space != 7:  # not sRGB
+            bits.read(1)  # color_range
+            if profile in (1, 3):
+                bits.read(3)  # subsampling_x, subsampling_y, reserved
+        elif profile in (1, 3):
+            bits.read(1)
+        return bits.read(16) + 1, bits.read(16) + 1
+    except IndexError:
+        return None
+
+
+def parse_matroska(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    info = {"doc_type": None, "tracks": [], "blocks": 0, "keyframes": [], "bytes": len(data), "damaged": False}
+    try:
+        _parse_elements(data, info)
+    except (IndexError, ValueError, struct.error):
+        # Truncated or corrupt: report what was read up to there
+        info["damaged"] = True
+    return info
+
+
+def _parse_elements(data, info):
+    track = None
+    cluster_time = 0
+    frames = {}  # track number -> blocks seen, i.e. the next block's frame index
+    for element_id, start, size in iter_elements(data):
+        if size is None:
+            continue
+        if element_id == DOC_TYPE:
+            info["doc_type"] = data[start : start + size].decode("ascii", "replace")
+        elif element_id == TRACK_ENTRY:
+            track = {}
+            info["tracks"].append(track)
+        elif element_id == TRACK_NUMBER and track is not None:
+            track["number"] = _uint(data, start, size)
+        elif element_id == TRACK_TYPE and track is not None:
+            track["type"] = _uint(data, start, size)
+        elif element_id == CODEC_ID and track is not None:
+            track["codec_id"] = data[start : start + size].decode("ascii", "replace").rstrip("\0")
+        elif element_id == DEFAULT_DURATION and track is not None:
+            track["default_duration"] = _uint(data, start, size)
+        elif element_id == PIXEL_WIDTH and track is not None:
+            track["width"] = _uint(data, start, size)
+        elif element_id == PIXEL_HEIGHT and track is not None:
+            track["height"] = _uint(data, start, size)
+        elif element_id == CLUSTER_TIMECODE:
+            cluster_time = _uint(data, start, size)
+        elif element_id in (SIMPLE_BLOCK, BLOCK):
+            track_number, length, _ = _read_vint(data, start)
+            timecode = struct.unpack(">h", data[start + length : start + length + 2])[0]
+            frame = data[start + length + 3 : start + size]
+            info["blocks"] += 1
+            index = frames.get(track_number, 0)
+            frames[track_number] = index + 1
+            codec = next((t.get("codec_id") for t in info["tracks"] if t.get("number") == track_number), None)
+            dimensions = vp9_frame_size(frame) if codec == "V_VP9" else vp8_frame_size(frame)
+            if dimensions:
+                info["keyframes"].append(
+                    {"frame": index, "time": cluster_time + timecode, "size": list(dimensions)}
+                )
+
+
+def _collapse(sizes):
+    result = []
+    for size in sizes:
+        if not result or result[-1] != size:
+            result.append(size)
+    return result
+
+
+def check_output(path, encoder, muxer, expected_sizes, frames):
+    # Compares the parsed file with what was fed in; expected_sizes is the
+    # resolution of every frame, in order. VP8/VP9 have no B-frames and libvpx
+    # packs hidden frames into the next block, so the n-th block is frame n.
+    info = parse_matroska(path)
+    expected_sizes = [list(size) for size in expected_sizes]
+    problems = []
+    if info["damaged"]:
+        problems.append("file is truncated or corrupt")
+    if info["doc_type"] != DOC_TYPES.get(muxer):
+        problems.append(f"doc type {info['doc_type']!r}, expected {DOC_TYPES.get(muxer)!r}")
+    video = [t for t in info["tracks"] if t.get("type") == 1]
+    if len(video) != 1:
+        problems.append(f"{len(video)} video tracks, expected 1")
+    else:
+        track = video[0]
+        if track.get("codec_id") != CODEC_IDS[encoder]:
+            problems.append(f"codec ID {track.get('codec_id')!r}, expected {CODEC_IDS[encoder]!r}")
+        # The header is written from the caps the stream starts with
+        header_size = [track.get("width"), track.get("height")]
+        if expected_sizes and header_size != expected_sizes[0]:
+            problems.append(f"track header size {header_size}, expected the first size {expected_sizes[0]}")
+    if info["blocks"] != frames:
+        problems.append(f"{info['blocks']} blocks, expected {frames}")
+    keyframes = {}
+    for keyframe in info["keyframes"]:
+        index = keyframe["frame"]
+        keyframes[index] = keyframe["size"]
+        if index >= len(expected_sizes):
+            problems.append(f"key frame at frame {index}, only {len(expected_sizes)} frames were scheduled")
+        elif keyframe["size"] != expected_sizes[index]:
+            problems.append(f"key frame {index} is {keyframe['size']}, scheduled {expected_sizes[index]}")
+    # Every size change has to start with a key frame of the new size
+    for index, size in enumerate(expected_sizes):
+        if (index == 0 or size != expected_sizes[index - 1]) and index not in keyframes:
+            problems.append(f"no key frame at frame {index}, where the size changes to {size}")
+    keyframe_sizes = _collapse([keyframe["size"] for keyframe in info["keyframes"]])
+    return {
+        "ok": not problems,
+        "problems": problems,
+        "doc_type": info["doc_type"],
+        "tracks": info["tracks"],
+        "blocks": info["blocks"],
+        "keyframes": len(info["keyframes"]),
+        "size_changes_in_file": max(len(keyframe_sizes) - 1, 0),
+    }
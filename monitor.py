@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# Event-driven position / duration monitoring
+#
+# basic-tut-4.py used to wake up every 100 ms in bus.timed_pop_filtered() just to
+# query the position. PositionMonitor instead runs on a GLib main loop:
+# - bus messages arrive through bus.add_watch(), no polling
+# - the position timer only exists while the pipeline is PLAYING and someone
+#   is subscribed, so idle or paused pipelines cause no wakeups at all
+# - the duration is queried once and cached until DURATION_CHANGED arrives
+import logging
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+logger = logging.getLogger(__name__)
+
+
+class DurationCache:
+    # Duration of a pipeline, queried lazily on first demand and kept until
+    # invalidate() is called for a DURATION_CHANGED message
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._duration = None  # None = unknown, query on next use
+
+    def get(self):
+        if self._duration is not None:
+            self.hits += 1
+            return self._duration
+        self.misses += 1
+        ret, duration = self.pipeline.query_duration(Gst.Format.TIME)
+        if not ret:
+            # Not known yet (e.g. still prerolling), try again next time
+            return Gst.CLOCK_TIME_NONE
+        self._duration = duration
+        return duration
+
+    def invalidate(self):
+        if self._duration is not None:
+            self.invalidations += 1
+            self._duration = None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+class PositionMonitor:
+    def __init__(self, pipeline, interval_ms=100, duration_cache=None):
+        self.pipeline = pipeline
+        self.interval_ms = interval_ms
+        self.playing = False
+        self.duration_cache = duration_cache or DurationCache(pipeline)
+        self._position_subscribers = []
+        self._message_subscribers = []
+        self._timer_id = 0
+        self._bus = pipeline.get_bus()
+        self._watch_id = self._bus.add_watch(GLib.PRIORITY_DEFAULT, self._on_message)
+
+    def subscribe(self, callback):
+        # callback(position, duration) on every tick while PLAYING
+        self._position_subscribers.append(callback)
+        self._update_timer()
+
+    def unsubscribe(self, callback):
+        self._position_subscribers.remove(callback)
+        self._update_timer()
+
+    def subscribe_messages(self, callback, types=Gst.MessageType.ANY):
+        # callback(msg) for every bus message matching types
+        self._message_subscribers.append((callback, types))
+
+    def set_interval(self, interval_ms):
+        self.interval_ms = interval_ms
+        self._remove_timer()
+        self._update_timer()
+
+    @property
+    def duration(self):
+        return self.duration_cache.get()
+
+    def _on_message(self, bus, msg):
+        if msg.type == Gst.MessageType.DURATION_CHANGED:
+            # The duration has changed, mark the cached one as invalid
+            self.duration_cache.invalidate()
+        elif msg.type == Gst.MessageType.STATE_CHANGED and msg.src == self.pipeline:
+            old_state, new_state, pending_state = msg.parse_state_changed()
+            self.playing = new_state == Gst.State.PLAYING
+            self._update_timer()
+
+        for callback, types in self._message_subscribers:
+            if msg.type & types:
+                callback(msg)
+        return True
+
+    def _update_timer(self):
+        wanted = self.playing and bool(self._position_subscribers)
+        if wanted and not self._timer_id:
+            if self.interval_ms >= 1000 and self.interval_ms % 1000 == 0:
+                # Second granularity timers are coalesced with other wakeups
+                self._timer_id = GLib.timeout_add_seconds(self.interval_ms // 1000, self._tick)
+            else:
+                self._timer_id = GLib.timeout_add(self.interval_ms, self._tick)
+        elif not wanted:
+            self._remove_timer()
+
+    def _remove_timer(self):
+        if self._timer_id:
+            GLib.source_remove(self._timer_id)
+            self._timer_id = 0
+
+    def _tick(self):
+        ret, position = self.pipeline.query_position(Gst.Format.TIME)
+        if not ret:
+            logger.error("Could not query current position")
+            return True
+        duration = self.duration
+        for callback in list(self._position_subscribers):
+            callback(position, duration)
+        return True
+
+    def stop(self):
+        self._remove_timer()
+        if self._watch_id:
+            self._bus.remove_watch()
+            self._watch_id = 0
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Caps negotiation diagnostics
+#
+# NegotiationTracker puts an event probe on every src pad of a pipeline,
+# including pads and elements that appear later (pad-added, deep-element-added).
+# Each CAPS event is recorded once, with a timestamp, as it travels over a link,
+# so nothing has to be queried afterwards. The report shows how long initial
+# negotiation took and which links renegotiated, and how often.
+import logging
+import threading
+import time
+from collections import namedtuple
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+logger = logging.getLogger(__name__)
+
+CapsRecord = namedtuple("CapsRecord", ["time_ns", "caps"])
+
+
+def iterate(iterator):
+    # Items of a Gst.Iterator, restarting if the underlying list changes
+    items = []
+    while True:
+        ret, item = iterator.next()
+        if ret == Gst.IteratorResult.OK:
+            items.append(item)
+        elif ret == Gst.IteratorResult.RESYNC:
+            iterator.resync()
+            items = []
+        else:
+            return items
+
+
+def link_name(pad):
+    peer = pad.get_peer()
+    name = f"{pad.get_parent_element().get_name()}:{pad.get_name()}"
+    if peer is not None and peer.get_parent_element() is not None:
+        name += f" -> {peer.get_parent_element().get_name()}:{peer.get_name()}"
+    return name
+
+
+class NegotiationTracker:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.start_ns = time.monotonic_ns()
+        self.links = {}  # link name -> [CapsRecord, ...]
+        self._lock = threading.Lock()
+        self._probed = set()  # src pads with a probe; holding them keeps each pad's wrapper alive
+        self._probes = []
+        self._handlers = []
+        self._watch_element(pipeline)
+        self._handlers.append((pipeline, pipeline.connect("deep-element-added", self._on_element_added)))
+        for element in iterate(pipeline.iterate_recurse()):
+            self._watch_element(element)
+
+    def restart(self):
+        # Forget everything and measure from now, e.g. right before set_state()
+        with self._lock:
+            self.start_ns = time.monotonic_ns()
+            self.links = {}
+
+    def _on_element_added(self, bin, sub_bin, element):
+        self._watch_element(element)
+
+    def _watch_element(self, element):
+        self._handlers.append((element, element.connect("pad-added", self._on_pad_added)))
+        for pad in iterate(element.iterate_src_pads()):
+            self._probe(pad)
+
+    def _on_pad_added(self, element, pad):
+        if pad.get_direction() == Gst.PadDirection.SRC:
+            self._probe(pad)
+
+    def _probe(self, pad):
+        # Only src pads: every CAPS event crosses exactly one src pad per link.
+        # pad-added and deep-element-added come from streaming threads, so two
+        # of them may race to probe the same pad.
+        with self._lock:
+            if pad in self._probed:
+                return
+            self._probed.add(pad)
+        probe_id = pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._on_event)
+        with self._lock:
+            self._probes.append((pad, probe_id))
+
+    def _on_event(self, pad, info):
+        event = info.get_event()
+        if event.type == Gst.EventType.CAPS:
+            record = CapsRecord(time.monotonic_ns(), event.parse_caps().to_string())
+            name = link_name(pad)
+            with self._lock:
+                self.links.setdefault(name, []).append(record)
+        return Gst.PadProbeReturn.OK
+
+    def caps(self, name):
+        # Last caps seen on a link, or None
+        with self._lock:
+            records = self.links.get(name)
+            return records[-1].caps if records else None
+
+    def renegotiations(self):
+        # {link: number of caps events after the first one}
+        with self._lock:
+            return {name: len(records) - 1 for name, records in self.links.items() if len(records) > 1}
+
+    def report(self):
+        with self._lock:
+            links = {name: list(records) for name, records in self.links.items()}
+        if not links:
+            return {"links": 0, "negotiation_ms": None, "renegotiations": {}}
+        first_caps = [records[0].time_ns for records in links.values()]
+        return {
+            "links": len(links),
+            # From restart() until the last link got its first caps
+            "negotiation_ms": (max(first_caps) - self.start_ns) / 1e6,
+            "caps_events": sum(len(records) for records in links.values()),
+            "renegotiations": {name: len(records) - 1 for name, records in links.items() if len(records) > 1},
+        }
+
+    def log_report(self):
+        report = self.report()
+        logger.info(
+            f"Negotiated {report['links']} links in {report['negotiation_ms']} ms, "
+            f"{report.get('caps_events', 0)} caps events"
+        )
+        for name, count in sorted(report["renegotiations"].items(), key=lambda item: -item[1]):
+            logger.info(f"  {name} renegotiated {count} times, now {self.caps(name)}")
+
+    def stop(self):
+        for element, handler in self._handlers:
+            element.disconnect(handler)
+        self._handlers = []
+        with self._lock:
+            probes, self._probes = self._probes, []
+            self._probed = set()
+        for pad, probe_id in probes:
+            pad.remove_probe(probe_id)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# Declarative pipeline construction
+#
+# Instead of one Gst.ElementFactory.make() per element, a long "if not ... or not
+# ..." check and a chain of link() calls, a pipeline is described once:
+#
+#   GRAPH = {
+#       "nodes": {
+#           "source": ("audiotestsrc", {"freq": 215.0}),
+#           "tee": "tee",
+#           "queue": "queue",
+#           "sink": "autoaudiosink",
+#       },
+#       "links": ["source ! tee", "tee.src_%u ! queue ! sink"],
+#   }
+#   pipeline, elements = build(GRAPH)
+#
+# Links are chains of "node" or "node.pad"; a pad name that is a request
+# template (like tee's src_%u) requests a new pad. The description is parsed,
+# checked and its factories looked up once and then cached, so building the
+# same graph again only creates, configures and links elements. Failures raise
+# PipelineBuildError naming the element or link at fault.
+import logging
+import time
+
+import gi
+
+gi.require_version("GObject", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GObject, Gst
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineBuildError(RuntimeError):
+    def __init__(self, message, element=None):
+        super().__init__(message)
+        self.element = element
+
+
+class CompiledGraph:
+    def __init__(self, nodes, links):
+        self.nodes = nodes  # [(name, Gst.ElementFactory, ((prop, value), ...)), ...]
+        self.links = links  # [(src, src_pad or None, sink, sink_pad or None), ...]
+
+
+_factories = {}
+_compiled = {}
+
+
+def _find_factory(factory_name, node):
+    factory = _factories.get(factory_name)
+    if factory is None:
+        factory = Gst.ElementFactory.find(factory_name)
+        if factory is None:
+            raise PipelineBuildError(f"No element factory {factory_name!r} for {node!r}", node)
+        _factories[factory_name] = factory
+    return factory
+
+
+def _parse_endpoint(endpoint, nodes):
+    name, _, pad = endpoint.strip().partition(".")
+    if name not in nodes:
+        raise PipelineBuildError(f"Link refers to unknown node {name!r}", name)
+    return name, pad or None
+
+
+def _graph_key(description):
+    nodes = []
+    for name, node in description["nodes"].items():
+        if isinstance(node, str):
+            node = (node, {})
+        factory_name, props = node
+        nodes.append((name, factory_name, tuple(sorted(props.items()))))
+    return tuple(nodes), tuple(description.get("links", ()))
+
+
+def compile_graph(description):
+    # Parse and validate description; cached by its contents
+    key = _graph_key(description)
+    compiled = _compiled.get(key)
+    if compiled is not None:
+        return compiled
+
+    node_names = {name for name, _, _ in key[0]}
+    nodes = [(name, _find_factory(factory_name, name), props) for name, factory_name, props in key[0]]
+    links = []
+    for chain in key[1]:
+        endpoints = [_parse_endpoint(endpoint, node_names) for endpoint in chain.split("!")]
+        if len(endpoints) < 2:
+            raise PipelineBuildError(f"Link {chain!r} needs at least two nodes")
+        for (src, src_pad), (sink, sink_pad) in zip(endpoints, endpoints[1:]):
+            links.append((src, src_pad, sink, sink_pad))
+    compiled = CompiledGraph(nodes, links)
+    _compiled[key] = compiled
+    return compiled
+
+
+def _set_property(element, name, prop, value):
+    pspec = element.find_property(prop)
+    if pspec is None:
+        raise PipelineBuildError(f"Element {name!r} has no property {prop!r}", name)
+    try:
+        if isinstance(value, str) and pspec.value_type != GObject.TYPE_STRING:
+            # Enums and flags given by nick, numbers given as text
+            Gst.util_set_object_arg(element, prop, value)
+        else:
+            element.set_property(prop, value)
+    except (TypeError, ValueError) as err:
+        raise PipelineBuildError(f"Could not set {name}.{prop}={value!r}: {err}", name)
+
+
+def build(description, pipeline_name="test-pipeline", pipeline=None):
+    # Returns (pipeline, {node name: element}); elements are named after their node
+    compiled = compile_graph(description)
+    if pipeline is None:
+        pipeline = Gst.Pipeline.new(pipeline_name)
+    if not pipeline:
+        raise PipelineBuildError("Could not create pipeline")
+
+    elements = {}
+    for name, factory, props in compiled.nodes:
+        element = factory.create(name)
+        if element is None:
+            raise PipelineBuildError(f"Could not create element {name!r} ({factory.get_name()})", name)
+        for prop, value in props:
+            _set_property(element, name, prop, value)
+        pipeline.add(element)
+        elements[name] = element
+
+    for src, src_pad, sink, sink_pad in compiled.links:
+        if src_pad is None and sink_pad is None:
+            linked = elements[src].link(elements[sink])
+        else:
+            linked = elements[src].link_pads(src_pad, elements[sink], sink_pad)
+        if not linked:
+            src_name = f"{src}.{src_pad}" if src_pad else src
+            sink_name = f"{sink}.{sink_pad}" if sink_pad else sink
+            raise PipelineBuildError(f"Could not link {src_name} to {sink_name}", src)
+    return pipeline, elements
+
+
+# basic-tut-7.py's graph, used for the benchmark below
+TEE_GRAPH = {
+    "nodes": {
+        "audio_source": ("audiotestsrc", {"freq": 215.0}),
+        "tee": "tee",
+        "audio_queue": "queue",
+        "audio_convert": "audioconvert",
+        "audio_resample": "audioresample",
+        "audio_sink": "fakesink",
+        "video_queue": "queue",
+        "visual": ("wavescope", {"shader": 0, "style": 1}),
+        "video_convert": "videoconvert",
+        "video_sink": "fakesink",
+    },
+    "links": [
+        "audio_source ! tee",
+        "tee.src_%u ! audio_queue ! audio_convert ! audio_resample ! audio_sink",
+        "tee.src_%u ! video_queue ! visual ! video_convert ! video_sink",
+    ],
+}
+
+TEE_LAUNCH = (
+    "audiotestsrc name=audio_source freq=215 ! tee name=tee "
+    "tee. ! queue name=audio_queue ! audioconvert name=audio_convert "
+    "! audioresample name=audio_resample ! fakesink name=audio_sink "
+    "tee. ! queue name=video_queue ! wavescope name=visual shader=0 style=1 "
+    "! videoconvert name=video_convert ! fakesink name=video_sink"
+)
+
+
+def build_by_hand():
+    make = Gst.ElementFactory.make
+    pipeline = Gst.Pipeline.new("test-pipeline")
+    source = make("audiotestsrc", "audio_source")
+    tee = make("tee", "tee")
+    audio_queue = make("queue", "audio_queue")
+    audio_convert = make("audioconvert", "audio_convert")
+    audio_resample = make("audioresample", "audio_resample")
+    audio_sink = make("fakesink", "audio_sink")
+    video_queue = make("queue", "video_queue")
+    visual = make("wavescope", "visual")
+    video_convert = make("videoconvert", "video_convert")
+    video_sink = make("fakesink", "video_sink")
+    source.set_property("freq", 215.0)
+    visual.set_property("shader", 0)
+    visual.set_property("style", 1)
+    pipeline.add(source, tee, audio_queue, audio_convert, audio_resample, audio_sink)
+    pipeline.add(video_queue, visual, video_convert, video_sink)
+    source.link(tee)
+    audio_queue.link(audio_convert)
+    audio_convert.link(audio_resample)
+    audio_resample.link(audio_sink)
+    video_queue.link(visual)
+    visual.link(video_convert)
+    video_convert.link(video_sink)
+    tee.get_request_pad("src_%u").link(audio_queue.get_static_pad("sink"))
+    tee.get_request_pad("src_%u").link(video_queue.get_static_pad("sink"))
+    return pipeline
+
+
+def benchmark(iterations=200):
+    results = {}
+    for name, func in (
+        ("hand-written", build_by_hand),
+        ("parse_launch", lambda: Gst.parse_launch(TEE_LAUNCH)),
+        ("builder", lambda: build(TEE_GRAPH)),
+    ):
+        func()  # warm up plugin loading
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        results[name] = (time.perf_counter() - start) / iterations
+    return results
+
+
+def main():
+    Gst.init(None)
+    for name, seconds in benchmark().items():
+        print(f"{name:>14}: {seconds * 1e6:8.1f} us per pipeline")
+
+
+if __name__ == "__main__":
+    main()
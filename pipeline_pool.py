@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Warm pipeline pool
+#
+# basic-tut-1.py / basic-tut-2.py build a pipeline, go NULL -> PLAYING and tear it
+# down to NULL again, so every stream pays for element creation, plugin loading
+# and the NULL -> READY transition. PipelinePool keeps a number of pipelines
+# (playbin or a pipeline_builder graph) parked in READY, or prerolled in PAUSED
+# on a given URI, and hands them out with a new URI. Returned pipelines are reset
+# and parked again instead of being destroyed.
+#
+# python3 pipeline_pool.py [URI] compares time-to-first-buffer with and without
+# the pool.
+import argparse
+import logging
+import statistics
+import threading
+import time
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+from pipeline_builder import build
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URI = "https://www.freedesktop.org/software/gstreamer-sdk/data/media/sintel_trailer-480p.webm"
+
+
+class PooledPipeline:
+    def __init__(self, pipeline, source, sinks):
+        self.pipeline = pipeline
+        self.source = source  # element with the "uri" property
+        self.sinks = sinks  # first buffer on any of these counts as started
+        self.uri = None
+        self.acquired_at = None
+        self.first_buffer_at = None
+        self.uses = 0
+        self._first_buffer = threading.Event()
+        self._probes = []
+
+    def set_uri(self, uri):
+        if uri != self.uri:
+            self.source.set_property("uri", uri)
+            self.uri = uri
+
+    def arm(self):
+        # Watch for the next first buffer at the sinks
+        self.disarm()
+        self._first_buffer.clear()
+        self.first_buffer_at = None
+        for sink in self.sinks:
+            pad = sink.get_static_pad("sink")
+            self._probes.append((pad, pad.add_probe(Gst.PadProbeType.BUFFER, self._on_buffer)))
+
+    def disarm(self):
+        for pad, probe_id in self._probes:
+            pad.remove_probe(probe_id)
+        self._probes = []
+
+    def _on_buffer(self, pad, info):
+        if not self._first_buffer.is_set():
+            self.first_buffer_at = time.perf_counter()
+            self._first_buffer.set()
+        return Gst.PadProbeReturn.OK
+
+    def play(self):
+        return self.pipeline.set_state(Gst.State.PLAYING) != Gst.StateChangeReturn.FAILURE
+
+    def wait_first_buffer(self, timeout=10.0):
+        # Seconds from acquire() to the first buffer, or None on error / timeout
+        bus = self.pipeline.get_bus()
+        deadline = time.perf_counter() + timeout
+        while not self._first_buffer.wait(0.005):
+            msg = bus.pop_filtered(Gst.MessageType.ERROR)
+            if msg:
+                err, debug_info = msg.parse_error()
+                logger.error(f"Error received from element {msg.src.get_name()}: {err.message}")
+                return None
+            if time.perf_counter() > deadline:
+                logger.error("No buffer reached the sinks in time")
+                return None
+        self.disarm()
+        return self.first_buffer_at - self.acquired_at
+
+
+def playbin_factory():
+    # playbin with fakesinks, so the benchmark does not open windows or devices
+    def make():
+        pipeline = Gst.ElementFactory.make("playbin", None)
+        audio_sink = Gst.ElementFactory.make("fakesink", None)
+        video_sink = Gst.ElementFactory.make("fakesink", None)
+        if not pipeline or not audio_sink or not video_sink:
+            raise RuntimeError("Not all elements could be created")
+        pipeline.set_property("audio-sink", audio_sink)
+        pipeline.set_property("video-sink", video_sink)
+        return PooledPipeline(pipeline, pipeline, [audio_sink, video_sink])
+
+    return make
+
+
+def graph_factory(description, source, sinks):
+    # A pipeline_builder graph; source names the node taking the URI
+    def make():
+        pipeline, elements = build(description)
+        return PooledPipeline(pipeline, elements[source], [elements[name] for name in sinks])
+
+    return make
+
+
+class PipelinePool:
+    def __init__(self, factory, size=2, park_state=Gst.State.READY, preroll_uri=None):
+        if park_state not in (Gst.State.READY, Gst.State.PAUSED):
+            raise ValueError("Pipelines can only be parked in READY or PAUSED")
+        if park_state == Gst.State.PAUSED and not preroll_uri:
+            raise ValueError("Parking in PAUSED needs a preroll_uri")
+        self.factory = factory
+        self.size = size
+        self.park_state = park_state
+        self.preroll_uri = preroll_uri
+        self.created = 0
+        self.hits = 0
+        self.prerolled_hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.append(self._park(self._create()))
+
+    def _create(self):
+        self.created += 1
+        return self.factory()
+
+    def _park(self, pooled):
+        pooled.disarm()
+        pooled.pipeline.set_state(Gst.State.READY)
+        # Drop stale EOS / error / state messages of the previous stream
+        bus = pooled.pipeline.get_bus()
+        bus.set_flushing(True)
+        bus.set_flushing(False)
+        if self.park_state == Gst.State.PAUSED:
+            pooled.set_uri(self.preroll_uri)
+            pooled.pipeline.set_state(Gst.State.PAUSED)
+        return pooled
+
+    def acquire(self, uri):
+        # A pipeline ready to play uri; call play() on it and release() when done
+        start = time.perf_counter()
+        with self._lock:
+            pooled = self._idle.pop() if self._idle else None
+        if pooled is None:
+            self.misses += 1
+            pooled = self._create()
+        else:
+            self.hits += 1
+        if self.park_state == Gst.State.PAUSED and uri == pooled.uri:
+            # Prerolled on this very URI, it only needs to start the clock
+            self.prerolled_hits += 1
+        elif pooled.uri is not None and pooled.uri != uri:
+            # The URI can only change in READY or NULL
+            pooled.pipeline.set_state(Gst.State.READY)
+        pooled.set_uri(uri)
+        pooled.uses += 1
+        pooled.acquired_at = start
+        pooled.arm()
+        return pooled
+
+    def release(self, pooled, failed=False):
+        # Park a pipeline again, or drop it if it failed or the pool is full
+        with self._lock:
+            full = len(self._idle) >= self.size
+        if failed or full:
+            self.discarded += 1
+            pooled.disarm()
+            pooled.pipeline.set_state(Gst.State.NULL)
+            return
+        self._park(pooled)
+        with self._lock:
+            self._idle.append(pooled)
+
+    def wait_parked(self, timeout=Gst.CLOCK_TIME_NONE):
+        # Block until idle pipelines finished their state change (prerolling)
+        with self._lock:
+            idle = list(self._idle)
+        for pooled in idle:
+            pooled.pipeline.get_state(timeout)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.pipeline.set_state(Gst.State.NULL)
+
+    def stats(self):
+        return {
+            "created": self.created,
+            "hits": self.hits,
+            "prerolled_hits": self.prerolled_hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+            "idle": len(self._idle),
+        }
+
+
+def time_without_pool(factory, uri, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pooled = factory()
+        pooled.set_uri(uri)
+        pooled.acquired_at = start
+        pooled.arm()
+        if pooled.play():
+            elapsed = pooled.wait_first_buffer()
+            if elapsed is not None:
+                times.append(elapsed)
+        pooled.pipeline.set_state(Gst.State.NULL)
+    return times
+
+
+def time_with_pool(pool, uri, runs):
+    times = []
+    for _ in range(runs):
+        pooled = pool.acquire(uri)
+        elapsed = pooled.wait_first_buffer() if pooled.play() else None
+        if elapsed is not None:
+            times.append(elapsed)
+        pool.release(pooled, failed=elapsed is None)
+    return times
+
+
+def summarize(times):
+    if not times:
+        return "no successful runs"
+    ms = [t * 1000 for t in times]
+    return f"median {statistics.median(ms):.1f} ms, min {min(ms):.1f} ms, max {max(ms):.1f} ms ({len(ms)} runs)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-buffer with and without a pipeline pool")
+    parser.add_argument("uri", nargs="?", default=DEFAULT_URI)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--size", type=int, default=2)
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    factory = playbin_factory()
+    factory().pipeline.set_state(Gst.State.NULL)  # load plugins outside of the measurements
+
+    print(f"{'no pool':>16}: {summarize(time_without_pool(factory, args.uri, args.runs))}")
+    for park_state, preroll_uri in ((Gst.State.READY, None), (Gst.State.PAUSED, args.uri)):
+        pool = PipelinePool(factory, size=args.size, park_state=park_state, preroll_uri=preroll_uri)
+        pool.wait_parked()
+        times = []
+        for _ in range(args.runs):
+            times += time_with_pool(pool, args.uri, 1)
+            pool.wait_parked()  # a new request would not arrive mid-preroll either
+        label = f"pool ({park_state.value_nick})"
+        print(f"{label:>16}: {summarize(times)}")
+        logger.info(f"Pool stats: {pool.stats()}")
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Gst.BufferPool-backed buffer recycling for appsrc producers
+#
+# Instead of Gst.Buffer.new_allocate() per push, producers acquire buffers from a
+# pool sized from the caps they negotiate. Buffers go back to the pool when
+# downstream drops its last reference, so in steady state nothing is allocated.
+import logging
+
+import gi
+
+gi.require_version("Gst", "1.0")
+gi.require_version("GstAudio", "1.0")
+gi.require_version("GstVideo", "1.0")
+from gi.repository import Gst, GstAudio, GstVideo
+
+logger = logging.getLogger(__name__)
+
+
+class CountingBufferPool(Gst.BufferPool):
+    # A plain Gst.BufferPool that counts how often it really allocates memory
+    def __init__(self):
+        super().__init__()
+        self.allocated = 0
+
+    def do_alloc_buffer(self, params):
+        self.allocated += 1
+        return Gst.BufferPool.do_alloc_buffer(self, params)
+
+
+def buffer_size_for_caps(caps, samples_per_buffer=None):
+    # Video: one frame. Audio: samples_per_buffer frames of bpf bytes each.
+    name = caps.get_structure(0).get_name()
+    if name == "video/x-raw":
+        info = GstVideo.VideoInfo.new_from_caps(caps)
+        if info is None:
+            raise ValueError(f"Could not parse video caps {caps.to_string()}")
+        return info.size
+    if name == "audio/x-raw":
+        if not samples_per_buffer:
+            raise ValueError("samples_per_buffer is required for audio caps")
+        info = GstAudio.AudioInfo.new_from_caps(caps)
+        if info is None:
+            raise ValueError(f"Could not parse audio caps {caps.to_string()}")
+        return info.bpf * samples_per_buffer
+    raise ValueError(f"Cannot size buffers for caps {name}")
+
+
+class ProducerPool:
+    def __init__(self, min_buffers=4, max_buffers=0):
+        self.min_buffers = min_buffers
+        self.max_buffers = max_buffers  # 0 = unlimited
+        self.pool = None
+        self.caps = None
+        self.size = 0
+        self.acquired = 0
+        self.reconfigured = 0
+        # Allocations of pools that have since been replaced
+        self._retired_allocations = 0
+        self._mark = 0
+
+    @property
+    def allocated(self):
+        current = self.pool.allocated if self.pool else 0
+        return self._retired_allocations + current
+
+    def set_caps(self, caps, size=None, samples_per_buffer=None):
+        # (Re)configure for caps; a no-op if neither caps nor size changed
+        if size is None:
+            size = buffer_size_for_caps(caps, samples_per_buffer)
+        if self.pool and self.size == size and self.caps and self.caps.is_equal(caps):
+            return False
+
+        # A pool cannot be reconfigured while buffers are still outstanding
+        # downstream, so start a new one; the old pool frees its buffers as
+        # they come back
+        self.release()
+        pool = CountingBufferPool()
+        config = pool.get_config()
+        Gst.BufferPool.config_set_params(config, caps, size, self.min_buffers, self.max_buffers)
+        if not pool.set_config(config):
+            raise RuntimeError(f"Could not configure buffer pool for {caps.to_string()}")
+        if not pool.set_active(True):
+            raise RuntimeError("Could not activate buffer pool")
+        self.pool, self.caps, self.size = pool, caps, size
+        self.reconfigured += 1
+        logger.debug(f"Buffer pool configured: {size} bytes for {caps.to_string()}")
+        return True
+
+    def acquire(self):
+        if self.pool is None:
+            raise RuntimeError("Buffer pool has no caps yet, call set_caps() first")
+        ret, buffer = self.pool.acquire_buffer(None)
+        if ret != Gst.FlowReturn.OK:
+            raise RuntimeError(f"Could not acquire buffer from pool: {ret}")
+        self.acquired += 1
+        return buffer
+
+    def mark(self):
+        # Start of the steady-state window
+        self._mark = self.allocated
+
+    @property
+    def allocations_since_mark(self):
+        return self.allocated - self._mark
+
+    def release(self):
+        if self.pool is not None:
+            self._retired_allocations += self.pool.allocated
+            self.pool.set_active(False)
+            self.pool = None
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "acquired": self.acquired,
+            "allocated": self.allocated,
+            "allocations_since_mark": self.allocations_since_mark,
+            "reconfigured": self.reconfigured,
+        }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Running pipelines in spawned worker processes
+#
+# batch_transcode.py and benchmark.py both run one pipeline per worker process
+# and block on its bus until it ends. run_in_processes() yields the result of
+# every call as it completes; a worker that dies (a plugin segfaulted) gives an
+# error instead of taking the parent down. With fresh_process each call gets its
+# own interpreter, one after another, so ru_maxrss and CPU time are its own.
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import gi
+
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+
+def init_worker():
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    Gst.init(None)
+
+
+def _outcome(future):
+    try:
+        return future.result(), None
+    except Exception as err:
+        return None, repr(err)
+
+
+def run_in_processes(func, calls, workers=1, fresh_process=False):
+    # Yields (args, result, error) for every args tuple in calls; error is None
+    # unless the worker crashed
+    # spawn: workers must not inherit GStreamer / GLib state through fork()
+    context = multiprocessing.get_context("spawn")
+    if fresh_process:
+        for args in calls:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=init_worker) as pool:
+                yield (args, *_outcome(pool.submit(func, *args)))
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+        futures = {pool.submit(func, *args): args for args in calls}
+        for future in as_completed(futures):
+            yield (futures[future], *_outcome(future))
+
+
+def wait_for_eos(pipeline, timeout_s=None):
+    # Blocks on the bus until EOS (returns None) or an error or the timeout
+    # (returns what went wrong); fine with one pipeline per process and no main loop
+    timeout = Gst.CLOCK_TIME_NONE if timeout_s is None else int(timeout_s * Gst.SECOND)
+    msg = pipeline.get_bus().timed_pop_filtered(timeout, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    if msg is None:
+        return f"No EOS after {timeout_s} s"
+    if msg.type == Gst.MessageType.ERROR:
+        err, debug_info = msg.parse_error()
+        return f"Error received from element {msg.src.get_name()}: {err.message}"
+    return None
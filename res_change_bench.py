@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# Resolution-change stress benchmark for encoders and muxers
+#
+# Automates what C-code/notes.txt did by hand with video-res.c and mkvinfo
+# (C-code/mkvinfodump.txt): generated video (video_gen.py) goes through
+# vp8enc/vp9enc and matroskamux/webmmux into a file while the resolution and
+# framerate change every N frames. For every encoder / muxer / change frequency
+# combination it measures
+# - throughput (frames per second through the whole pipeline)
+# - per-frame encoder latency (encoder sink pad -> src pad, matched by PTS), and
+#   how much it spikes in the frames after each change compared to the rest
+# and then parses the output file itself (matroska.py, no mkvinfo needed) to
+# check the container: doc type, codec ID, track header size, one block per
+# frame, and that every key frame has the size scheduled for its frame.
+#
+# python3 res_change_bench.py --every 10,50,100 --report report.json
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from matroska import check_output
+from video_gen import CapsSchedule, VideoGenerator
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"matroskamux": "mkv", "webmmux": "webm"}
+
+
+class LatencyRecorder:
+    # Encoder latency per frame, from its sink pad to its src pad by PTS
+    def __init__(self, encoder):
+        self.entered = {}  # pts -> perf_counter at the sink pad
+        self.latencies = []  # (frame index, seconds) in output order
+        self._frames_in = 0
+        self._index = {}  # pts -> frame index
+        encoder.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, self._on_sink)
+        encoder.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self._on_src)
+
+    def _on_sink(self, pad, info):
+        pts = info.get_buffer().pts
+        self.entered[pts] = time.perf_counter()
+        self._index[pts] = self._frames_in
+        self._frames_in += 1
+        return Gst.PadProbeReturn.OK
+
+    def _on_src(self, pad, info):
+        pts = info.get_buffer().pts
+        entered = self.entered.pop(pts, None)
+        if entered is not None:
+            self.latencies.append((self._index.pop(pts), time.perf_counter() - entered))
+        return Gst.PadProbeReturn.OK
+
+
+def _ms(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": 1000 * values[len(values) // 2],
+        "p95_ms": 1000 * values[min(len(values) - 1, int(0.95 * len(values)))],
+        "max_ms": 1000 * values[-1],
+    }
+
+
+def spike_report(latencies, change_frames, window):
+    # Latency in the `window` frames after each change vs all other frames
+    near = set()
+    for frame in change_frames:
+        near.update(range(frame, frame + window))
+    around = [latency for index, latency in latencies if index in near]
+    elsewhere = [latency for index, latency in latencies if index not in near]
+    baseline = statistics.median(elsewhere) if elsewhere else None
+    per_change = []
+    by_index = dict(latencies)
+    for frame in change_frames:
+        window_latencies = [by_index[i] for i in range(frame, frame + window) if i in by_index]
+        if window_latencies:
+            peak = max(window_latencies)
+            per_change.append(
+                {
+                    "frame": frame,
+                    "max_ms": 1000 * peak,
+                    "vs_baseline": peak / baseline if baseline else None,
+                }
+            )
+    return {
+        "around_changes": _ms(around),
+        "elsewhere": _ms(elsewhere),
+        "changes": per_change,
+    }
+
+
+def run_case(encoder, muxer, schedule, frames, output, encoder_props, spike_window):
+    pipeline = Gst.parse_launch(
+        f"appsrc name=video_source ! {encoder} name=encoder {encoder_props} ! {muxer} "
+        f'! filesink location="{output}"'
+    )
+    generator = VideoGenerator(pipeline.get_by_name("video_source"), schedule, format="I420", frames=frames)
+    recorder = LatencyRecorder(pipeline.get_by_name("encoder"))
+    main_loop = GLib.MainLoop(None)
+    errors = []
+
+    def on_message(bus, msg):
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            errors.append(f"Error received from element {msg.src.get_name()}: {err.message}")
+            main_loop.quit()
+        elif msg.type == Gst.MessageType.EOS:
+            main_loop.quit()
+        return True
+
+    bus = pipeline.get_bus()
+    bus.add_watch(GLib.PRIORITY_DEFAULT, on_message)
+    start = time.perf_counter()
+    pipeline.set_state(Gst.State.PLAYING)
+    main_loop.run()
+    elapsed = time.perf_counter() - start
+    generator.stop()
+    bus.remove_watch()
+    pipeline.set_state(Gst.State.NULL)
+
+    change_frames = [frame for frame, pts, resolution in generator.switch_frames[1:]]
+    result = {
+        "encoder": encoder,
+        "muxer": muxer,
+        "every": schedule.every,
+        "frames": generator.frame,
+        "changes": generator.switches,
+        "wall_s": elapsed,
+        "fps": generator.frame / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "latency": spike_report(recorder.latencies, change_frames, spike_window),
+    }
+    if not errors:
+        expected = [schedule.resolution_for(i).size for i in range(generator.frame)]
+        result["container"] = check_output(output, encoder, muxer, expected, generator.frame)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder / muxer renegotiation benchmark")
+    parser.add_argument("--encoders", default="vp8enc,vp9enc")
+    parser.add_argument("--muxers", default="matroskamux,webmmux")
+    parser.add_argument("--schedule", default="1024x768@30,640x480@30,1280x720@25", help="comma separated WxH[@fps]")
+    parser.add_argument("--every", default="10,50,100", help="comma separated frames between changes")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--encoder-props", default="deadline=1 threads=1")
+    parser.add_argument("--spike-window", type=int, default=5, help="frames after a change counted as around it")
+    parser.add_argument("--output-dir", help="keep the encoded files here (default: temporary directory)")
+    parser.add_argument("--report", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="res-change-")
+    os.makedirs(output_dir, exist_ok=True)
+
+    cases = []
+    for encoder in args.encoders.split(","):
+        for muxer in args.muxers.split(","):
+            for every in (int(e) for e in args.every.split(",")):
+                schedule = CapsSchedule.parse(args.schedule, every)
+                output = os.path.join(output_dir, f"{encoder}-{muxer}-{every}.{EXTENSIONS[muxer]}")
+                result = run_case(
+                    encoder, muxer, schedule, args.frames, output, args.encoder_props, args.spike_window
+                )
+                container = result.get("container", {})
+                logger.info(
+                    f"{encoder} / {muxer} / every {every}: {result['fps']:.0f} fps, "
+                    f"container {'ok' if container.get('ok') else container.get('problems') or result['errors']}"
+                )
+                cases.append(result)
+                if not args.output_dir and os.path.exists(output):
+                    os.remove(output)
+
+    report = {
+        "schedule": args.schedule,
+        "frames": args.frames,
+        "cases": cases,
+        "failed": sum(1 for c in cases if c["errors"] or not c.get("container", {}).get("ok")),
+    }
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if not args.output_dir:
+        os.rmdir(output_dir)
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Seek scheduling for scrubbing-heavy workloads
+#
+# Clients may ask for many seeks per second. SeekScheduler keeps at most one
+# flushing seek in flight: requests arriving meanwhile only replace the pending
+# target, so a burst collapses into a seek to the latest position once the
+# previous one has completed (ASYNC_DONE, i.e. the first frame after the seek has
+# reached the sinks). The time from issuing a seek to that ASYNC_DONE is recorded
+# as the seek-to-first-frame latency. Each seek is sent as an event whose seqnum
+# the pipeline copies onto its ASYNC_DONE; ASYNC_DONE messages with any other
+# seqnum (state changes, a seek that already timed out) are ignored.
+#
+# Policies choose the seek flags:
+#   key-unit - jump to the nearest earlier key frame, fastest
+#   accurate - decode up to the exact position, slowest
+#   snap     - key frame nearest to the target (before or after)
+#   auto     - accurate for short scrubs, snap for long jumps
+import logging
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from stats import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+SEEK_POLICIES = ("key-unit", "accurate", "snap", "auto")
+
+
+class SeekScheduler:
+    def __init__(self, pipeline, policy="auto", accurate_window=2 * Gst.SECOND, timeout_ms=5000):
+        if policy not in SEEK_POLICIES:
+            raise ValueError(f"Unknown seek policy {policy!r}, expected one of {SEEK_POLICIES}")
+        self.pipeline = pipeline
+        self.policy = policy
+        self.accurate_window = accurate_window
+        self.timeout_ms = timeout_ms
+        self.latency = LatencyHistogram()
+        self.requested = 0
+        self.issued = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+        self._pending = None
+        self._in_flight_since = None
+        self._seqnum = None  # seqnum of the seek in flight
+        self._dispatch_id = 0
+        self._timeout_id = 0
+        self._seek_range = None  # (seekable, start, end) from the SEEKING query
+
+    def request(self, position):
+        # Ask for a seek to position (ns); may be merged with later requests
+        self.requested += 1
+        if self._pending is not None:
+            self.coalesced += 1
+        self._pending = position
+        if self._in_flight_since is None and not self._dispatch_id:
+            # Dispatch from the main loop so a burst of requests in one
+            # iteration ends up as a single seek
+            self._dispatch_id = GLib.idle_add(self._dispatch)
+
+    def on_message(self, msg):
+        # Feed bus messages of the pipeline here (ASYNC_DONE, DURATION_CHANGED)
+        if msg.type == Gst.MessageType.ASYNC_DONE and msg.src == self.pipeline:
+            if self._in_flight_since is not None and msg.get_seqnum() == self._seqnum:
+                self.latency.record(time.perf_counter() - self._in_flight_since)
+                self._finish()
+        elif msg.type == Gst.MessageType.DURATION_CHANGED:
+            self._seek_range = None
+
+    def _finish(self):
+        self._in_flight_since = None
+        self._seqnum = None
+        if self._timeout_id:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = 0
+        if self._pending is not None and not self._dispatch_id:
+            self._dispatch_id = GLib.idle_add(self._dispatch)
+
+    def _on_timeout(self, seqnum):
+        if seqnum != self._seqnum:
+            return False
+        logger.error("Seek did not complete in time")
+        self._timeout_id = 0
+        self.failed += 1
+        self._finish()
+        return False
+
+    def seek_range(self):
+        if self._seek_range is None:
+            query = Gst.Query.new_seeking(Gst.Format.TIME)
+            if not self.pipeline.query(query):
+                return None
+            format, seekable, start, end = query.parse_seeking()
+            self._seek_range = (seekable, start, end)
+        return self._seek_range
+
+    def _accepts(self, position):
+        seek_range = self.seek_range()
+        if seek_range is None:
+            # No answer yet, let the pipeline decide
+            return True
+        seekable, start, end = seek_range
+        if not seekable:
+            return False
+        if start >= 0 and position < start:
+            return False
+        if end not in (-1, Gst.CLOCK_TIME_NONE) and position > end:
+            return False
+        return True
+
+    def flags_for(self, position):
+        policy = self.policy
+        if policy == "auto":
+            ret, current = self.pipeline.query_position(Gst.Format.TIME)
+            near = ret and abs(position - current) <= self.accurate_window
+            policy = "accurate" if near else "snap"
+        if policy == "key-unit":
+            return Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT
+        if policy == "accurate":
+            return Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+        return Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_NEAREST
+
+    def _dispatch(self):
+        self._dispatch_id = 0
+        if self._in_flight_since is not None or self._pending is None:
+            return False
+        position, self._pending = self._pending, None
+
+        if not self._accepts(position):
+            logger.info(f"Rejecting seek to {position}: outside the seekable range")
+            self.rejected += 1
+            return False
+
+        event = Gst.Event.new_seek(
+            1.0, Gst.Format.TIME, self.flags_for(position), Gst.SeekType.SET, position, Gst.SeekType.NONE, -1
+        )
+        self._seqnum = event.get_seqnum()
+        self._in_flight_since = time.perf_counter()
+        if not self.pipeline.send_event(event):
+            logger.error(f"Seek to {position} failed")
+            self.failed += 1
+            self._finish()
+            return False
+        self.issued += 1
+        self._timeout_id = GLib.timeout_add(self.timeout_ms, self._on_timeout, self._seqnum)
+        return False
+
+    def stats(self):
+        return {
+            "requested": self.requested,
+            "issued": self.issued,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "latency": self.latency.stats(),
+        }
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Measurement helpers shared by the schedulers, tracers and benchmarks
+#
+# LatencyHistogram buckets durations on fixed millisecond bounds, so recording
+# is O(log buckets) and memory stays constant however many samples come in;
+# subclasses only change BOUNDS_MS (see tracer.ProcessingHistogram).
+# resource_usage() samples memory and CPU time of the whole process.
+import bisect
+import resource
+
+
+class LatencyHistogram:
+    # Bucket upper bounds in milliseconds, the last bucket is open-ended
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        # Upper bound (ms) of the bucket holding the given fraction of samples
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return float("inf")
+
+    def stats(self):
+        labels = [f"<={bound}ms" for bound in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000 * self.max,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+
+def resource_usage():
+    # Current resident set size (bytes) and CPU time of the whole process
+    rss = None
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    if rss is None:
+        # Peak instead of current, in KiB on Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return rss, usage.ru_utime + usage.ru_stime
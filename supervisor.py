@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# Many pipelines in one process
+#
+# The tutorials block in bus.timed_pop_filtered() on a single pipeline, so N
+# streams need N processes or N blocked threads. Supervisor hosts any number of
+# pipelines on one GLib main loop: each pipeline gets a bus watch, and its
+# messages drive a small per-stream state machine (the same ERROR / EOS /
+# STATE_CHANGED handling as handle_message() in basic-tut-4.py). Failed or
+# finished streams are restarted according to their restart policy, with a
+# growing back-off between attempts. A stream that stays PLAYING for
+# healthy_after_s gets its attempt count (and back-off) reset, so rare transient
+# errors over a long run do not use up max_restarts.
+#
+# python3 supervisor.py --streams 32 adds streams step by step and reports how
+# resident memory and CPU time grow per added stream.
+import argparse
+import json
+import logging
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from stats import resource_usage
+
+logger = logging.getLogger(__name__)
+
+RESTART_POLICIES = ("never", "on-failure", "always")
+
+# Stream states
+STARTING = "starting"
+PAUSED = "paused"
+PLAYING = "playing"
+EOS = "eos"
+FAILED = "failed"
+RESTARTING = "restarting"
+STOPPED = "stopped"
+FINISHED = (EOS, FAILED, STOPPED)
+
+
+class Stream:
+    def __init__(self, name, factory, restart="on-failure", max_restarts=3, backoff_ms=500, healthy_after_s=60):
+        if restart not in RESTART_POLICIES:
+            raise ValueError(f"Unknown restart policy {restart!r}, expected one of {RESTART_POLICIES}")
+        self.name = name
+        self.factory = factory  # () -> Gst.Pipeline, called again on every restart
+        self.restart = restart
+        self.max_restarts = max_restarts
+        self.backoff_ms = backoff_ms
+        self.healthy_after_s = healthy_after_s
+        self.pipeline = None
+        self.state = STOPPED
+        self.restarts = 0  # attempts since the stream last ran healthy_after_s
+        self.total_restarts = 0
+        self.errors = 0
+        self.last_error = None
+        self.started_at = None
+        self._watch_bus = None
+        self._restart_id = 0
+        self._healthy_id = 0
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "restarts": self.restarts,
+            "total_restarts": self.total_restarts,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "uptime_s": time.monotonic() - self.started_at if self.started_at and self.state == PLAYING else 0.0,
+        }
+
+
+class Supervisor:
+    def __init__(self, main_loop=None, quit_when_done=False):
+        self.main_loop = main_loop or GLib.MainLoop(None)
+        self.quit_when_done = quit_when_done
+        self.streams = {}
+        self._listeners = []
+
+    def add(self, name, factory, start=True, **policy):
+        # policy: restart, max_restarts, backoff_ms, healthy_after_s; see Stream
+        if name in self.streams:
+            raise ValueError(f"Stream {name!r} already exists")
+        stream = Stream(name, factory, **policy)
+        self.streams[name] = stream
+        if start:
+            self.start(name)
+        return stream
+
+    def subscribe(self, callback):
+        # callback(stream, old_state, new_state) on every state machine transition
+        self._listeners.append(callback)
+
+    def _transition(self, stream, state):
+        if state == stream.state:
+            return
+        old_state, stream.state = stream.state, state
+        logger.debug(f"[{stream.name}] {old_state} -> {state}")
+        for callback in self._listeners:
+            callback(stream, old_state, state)
+
+    def start(self, name):
+        stream = self.streams[name]
+        self._teardown(stream)
+        try:
+            stream.pipeline = stream.factory()
+        except Exception as err:
+            logger.error(f"[{stream.name}] Could not build pipeline: {err}")
+            stream.errors += 1
+            stream.last_error = str(err)
+            self._transition(stream, FAILED)
+            self._maybe_restart(stream)
+            return False
+
+        bus = stream.pipeline.get_bus()
+        bus.add_watch(GLib.PRIORITY_DEFAULT, self._on_message, stream)
+        stream._watch_bus = bus
+        stream.started_at = time.monotonic()
+        self._transition(stream, STARTING)
+        if stream.pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            logger.error(f"[{stream.name}] Unable to set the pipeline to the playing state")
+            stream.errors += 1
+            stream.last_error = "state change failed"
+            self._transition(stream, FAILED)
+            self._maybe_restart(stream)
+            return False
+        return True
+
+    def _teardown(self, stream):
+        if stream._healthy_id:
+            GLib.source_remove(stream._healthy_id)
+            stream._healthy_id = 0
+        if stream._watch_bus is not None:
+            stream._watch_bus.remove_watch()
+            stream._watch_bus = None
+        if stream.pipeline is not None:
+            stream.pipeline.set_state(Gst.State.NULL)
+            stream.pipeline = None
+
+    def stop(self, name):
+        stream = self.streams[name]
+        if stream._restart_id:
+            GLib.source_remove(stream._restart_id)
+            stream._restart_id = 0
+        self._teardown(stream)
+        self._transition(stream, STOPPED)
+        self._check_done()
+
+    def remove(self, name):
+        self.stop(name)
+        del self.streams[name]
+
+    def stop_all(self):
+        for name in list(self.streams):
+            self.stop(name)
+
+    def _on_message(self, bus, msg, stream):
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            logger.error(f"[{stream.name}] Error received from element {msg.src.get_name()}: {err.message}")
+            logger.debug(f"[{stream.name}] Debugging information: {debug_info if debug_info else 'none'}")
+            stream.errors += 1
+            stream.last_error = err.message
+            self._teardown(stream)
+            self._transition(stream, FAILED)
+            self._maybe_restart(stream)
+            # The watch was removed together with the pipeline
+            return False
+        if msg.type == Gst.MessageType.EOS:
+            logger.info(f"[{stream.name}] End-Of-Stream reached.")
+            self._teardown(stream)
+            self._transition(stream, EOS)
+            self._maybe_restart(stream)
+            return False
+        if msg.type == Gst.MessageType.STATE_CHANGED and msg.src == stream.pipeline:
+            old_state, new_state, pending_state = msg.parse_state_changed()
+            if new_state == Gst.State.PLAYING:
+                self._transition(stream, PLAYING)
+                if stream.restarts and not stream._healthy_id:
+                    stream._healthy_id = GLib.timeout_add_seconds(stream.healthy_after_s, self._on_healthy, stream)
+            elif new_state == Gst.State.PAUSED and stream.state == PLAYING:
+                self._transition(stream, PAUSED)
+                if stream._healthy_id:
+                    # The healthy period has to be spent PLAYING without a break
+                    GLib.source_remove(stream._healthy_id)
+                    stream._healthy_id = 0
+        return True
+
+    def _on_healthy(self, stream):
+        stream._healthy_id = 0
+        if stream.state == PLAYING:
+            logger.info(f"[{stream.name}] Running for {stream.healthy_after_s} s, restart count reset")
+            stream.restarts = 0
+        return False
+
+    def _maybe_restart(self, stream):
+        wanted = stream.restart == "always" or (stream.restart == "on-failure" and stream.state == FAILED)
+        if not wanted or stream.restarts >= stream.max_restarts:
+            self._check_done()
+            return
+        # 1x, 2x, 4x ... the base back-off, so a broken source does not spin
+        delay = stream.backoff_ms * 2 ** stream.restarts
+        stream.restarts += 1
+        stream.total_restarts += 1
+        logger.info(f"[{stream.name}] Restarting in {delay} ms (attempt {stream.restarts}/{stream.max_restarts})")
+        self._transition(stream, RESTARTING)
+        stream._restart_id = GLib.timeout_add(delay, self._on_restart, stream)
+
+    def _on_restart(self, stream):
+        stream._restart_id = 0
+        self.start(stream.name)
+        return False
+
+    def _check_done(self):
+        if self.quit_when_done and all(s.state in FINISHED for s in self.streams.values()):
+            self.main_loop.quit()
+
+    def run(self):
+        self.main_loop.run()
+
+    def stats(self):
+        return {name: stream.stats() for name, stream in self.streams.items()}
+
+
+def scaling_report(supervisor, factory, streams, step, settle_s):
+    # Adds `step` streams every settle_s seconds; before each step memory and the
+    # CPU used since the previous step are sampled
+    samples = []
+    added = 0
+    last_cpu, last_wall = resource_usage()[1], time.monotonic()
+
+    def on_step():
+        nonlocal added, last_cpu, last_wall
+        rss, cpu = resource_usage()
+        wall = time.monotonic()
+        samples.append(
+            {
+                "streams": added,
+                "playing": sum(1 for s in supervisor.streams.values() if s.state == PLAYING),
+                "rss_mb": rss / 2**20,
+                "cpu_percent": 100 * (cpu - last_cpu) / (wall - last_wall),
+            }
+        )
+        logger.info(f"{samples[-1]}")
+        if added >= streams:
+            supervisor.main_loop.quit()
+            return False
+        for _ in range(min(step, streams - added)):
+            supervisor.add(f"stream-{added}", factory)
+            added += 1
+        # Startup cost is not part of the steady state CPU of the next sample
+        last_cpu, last_wall = resource_usage()[1], time.monotonic()
+        return True
+
+    GLib.timeout_add(int(settle_s * 1000), on_step)
+    supervisor.run()
+
+    baseline, last = samples[0], samples[-1]
+    count = max(last["streams"], 1)
+    return {
+        "samples": samples,
+        "rss_mb_per_stream": (last["rss_mb"] - baseline["rss_mb"]) / count,
+        "cpu_percent_per_stream": (last["cpu_percent"] - baseline["cpu_percent"]) / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many pipelines on one main loop")
+    parser.add_argument("--streams", type=int, default=16)
+    parser.add_argument("--step", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds between steps")
+    parser.add_argument(
+        "--launch",
+        default="audiotestsrc is-live=true ! audioconvert ! volume volume=0.5 ! fakesink sync=true",
+        help="gst-launch style description of each stream",
+    )
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    supervisor = Supervisor()
+    report = scaling_report(supervisor, lambda: Gst.parse_launch(args.launch), args.streams, args.step, args.settle)
+    report["streams"] = supervisor.stats()
+    supervisor.stop_all()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+# Tee branch isolation
+#
+# Every branch after a tee starts with a queue, and with the default queue
+# (200 buffers / 10 MB / 1 s, never leaky) a slow branch such as the wavescope
+# visualizer fills its queue and then blocks the tee, which stalls every other
+# branch including the audio. TeeBranches sets each branch queue's limits and
+# leaky mode from a policy:
+#   primary  - must not lose data: leaky=no, 1 s of headroom
+#   lossy    - may drop old data when it falls behind: leaky=downstream, 200 ms
+#   realtime - like lossy with only 50 ms, for analysis that wants fresh data
+# and tracks each queue: its fill level (sampled on a background thread, so no
+# main loop is needed), overrun and underrun signals, and how often it was full.
+# A full non-leaky queue means its branch is throttling the source; a full
+# leaky queue means its branch is dropping data instead. Both states clear again
+# on an underrun (the branch caught up) or after recover_after_s without the
+# queue running full.
+#
+# BranchManager adds and removes whole branches while the pipeline is PLAYING,
+# without disturbing the branches that stay. Run this file directly to attach and
+# detach a branch many times and check that nothing is left behind.
+import argparse
+import logging
+import sys
+import threading
+import time
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from negotiation import iterate
+from pipeline_builder import PipelineBuildError, build
+from stats import LatencyHistogram, resource_usage
+
+logger = logging.getLogger(__name__)
+
+LEAKY_MODES = ("no", "upstream", "downstream")
+
+
+class BranchPolicy:
+    def __init__(self, max_time=Gst.SECOND, max_buffers=0, max_bytes=0, leaky="no"):
+        # Limits of 0 are disabled, like on queue itself
+        if leaky not in LEAKY_MODES:
+            raise ValueError(f"Unknown leaky mode {leaky!r}, expected one of {LEAKY_MODES}")
+        if not (max_time or max_buffers or max_bytes):
+            raise ValueError("A branch queue needs at least one limit")
+        self.max_time = max_time
+        self.max_buffers = max_buffers
+        self.max_bytes = max_bytes
+        self.leaky = leaky
+
+    def __repr__(self):
+        return (
+            f"BranchPolicy(max_time={self.max_time}, max_buffers={self.max_buffers}, "
+            f"max_bytes={self.max_bytes}, leaky={self.leaky!r})"
+        )
+
+
+BRANCH_POLICIES = {
+    "primary": BranchPolicy(max_time=Gst.SECOND, leaky="no"),
+    "lossy": BranchPolicy(max_time=200 * Gst.MSECOND, leaky="downstream"),
+    "realtime": BranchPolicy(max_time=50 * Gst.MSECOND, leaky="downstream"),
+}
+
+
+def get_policy(policy):
+    if isinstance(policy, BranchPolicy):
+        return policy
+    try:
+        return BRANCH_POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"Unknown branch policy {policy!r}, expected one of {sorted(BRANCH_POLICIES)}")
+
+
+class Branch:
+    def __init__(self, queue, policy, recover_after_s=2.0):
+        self.queue = queue
+        self.name = queue.get_name()
+        self.policy = get_policy(policy)
+        self.recover_after_s = recover_after_s
+        self.overruns = 0  # queue full: upstream blocked, or data dropped if leaky
+        self.underruns = 0  # queue empty: the branch is waiting for data
+        self.samples = 0
+        self.full_samples = 0
+        self.empty_samples = 0
+        self.level_total = 0.0
+        self.level_max = 0.0
+        self._full_at = None  # monotonic time the queue was last seen full, None once drained
+        self.apply()
+        self._handlers = [
+            queue.connect("overrun", self._on_overrun),
+            queue.connect("underrun", self._on_underrun),
+        ]
+
+    def apply(self):
+        self.queue.set_property("max-size-time", self.policy.max_time)
+        self.queue.set_property("max-size-buffers", self.policy.max_buffers)
+        self.queue.set_property("max-size-bytes", self.policy.max_bytes)
+        Gst.util_set_object_arg(self.queue, "leaky", self.policy.leaky)
+
+    # Both come from streaming threads
+    def _on_overrun(self, queue):
+        self.overruns += 1
+        self._full_at = time.monotonic()
+
+    def _on_underrun(self, queue):
+        self.underruns += 1
+        self._full_at = None
+
+    def level(self):
+        # Fill level as a fraction of the tightest enabled limit
+        fractions = []
+        for limit, prop in (
+            (self.policy.max_time, "current-level-time"),
+            (self.policy.max_buffers, "current-level-buffers"),
+            (self.policy.max_bytes, "current-level-bytes"),
+        ):
+            if limit:
+                fractions.append(self.queue.get_property(prop) / limit)
+        return max(fractions)
+
+    def sample(self):
+        level = self.level()
+        self.samples += 1
+        self.level_total += level
+        self.level_max = max(self.level_max, level)
+        # Time levels are estimated from timestamps, so allow a little slack
+        if level >= 0.95:
+            self.full_samples += 1
+            self._full_at = time.monotonic()
+        elif level == 0:
+            self.empty_samples += 1
+        return level
+
+    @property
+    def congested(self):
+        # Full recently and not drained since
+        full_at = self._full_at
+        return full_at is not None and time.monotonic() - full_at < self.recover_after_s
+
+    @property
+    def throttling(self):
+        # A full queue that does not leak blocks the tee and so the source
+        return self.policy.leaky == "no" and self.congested
+
+    @property
+    def full_fraction(self):
+        return self.full_samples / self.samples if self.samples else 0.0
+
+    def stats(self):
+        return {
+            "policy": repr(self.policy),
+            "level": self.level(),
+            "level_mean": self.level_total / self.samples if self.samples else 0.0,
+            "level_max": self.level_max,
+            "full_fraction": self.full_fraction,
+            "empty_fraction": self.empty_samples / self.samples if self.samples else 0.0,
+            "overruns": self.overruns,
+            "underruns": self.underruns,
+            "state": self.state,
+        }
+
+    @property
+    def state(self):
+        if self.throttling:
+            return "throttling"
+        if self.congested:
+            # Leaky queues drop instead of blocking when they overrun
+            return "dropping"
+        return "ok"
+
+    def disconnect(self):
+        for handler in self._handlers:
+            self.queue.disconnect(handler)
+        self._handlers = []
+
+
+class TeeBranches:
+    def __init__(self, branches=None, interval_ms=100):
+        # branches: {queue element: policy name or BranchPolicy}
+        self.interval = interval_ms / 1000
+        self.branches = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        for queue, policy in (branches or {}).items():
+            self.add(queue, policy)
+        self._thread = threading.Thread(target=self._run, name="tee-branch-sampler", daemon=True)
+        self._thread.start()
+
+    def add(self, queue, policy="primary"):
+        branch = Branch(queue, policy)
+        with self._lock:
+            self.branches[branch.name] = branch
+        logger.debug(f"Branch {branch.name}: {branch.policy}")
+        return branch
+
+    def remove(self, name):
+        with self._lock:
+            branch = self.branches.pop(name)
+        branch.disconnect()
+        return branch
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            with self._lock:
+                branches = list(self.branches.values())
+            for branch in branches:
+                branch.sample()
+
+    def throttling(self):
+        # Names of the branches holding back the source, worst first
+        with self._lock:
+            branches = [b for b in self.branches.values() if b.throttling]
+        return [b.name for b in sorted(branches, key=lambda b: -b.full_fraction)]
+
+    def report(self):
+        with self._lock:
+            branches = dict(self.branches)
+        return {
+            "branches": {name: branch.stats() for name, branch in branches.items()},
+            "throttling": self.throttling(),
+        }
+
+    def log_report(self):
+        report = self.report()
+        for name, stats in report["branches"].items():
+            logger.info(
+                f"  {name}: {stats['state']}, level {stats['level']:.0%} "
+                f"(mean {stats['level_mean']:.0%}, full {stats['full_fraction']:.0%} of the time), "
+                f"{stats['overruns']} overruns, {stats['underruns']} underruns"
+            )
+        if report["throttling"]:
+            logger.info(f"  Source throttled by: {', '.join(report['throttling'])}")
+        return True
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._lock:
+            branches = list(self.branches.values())
+        for branch in branches:
+            branch.disconnect()
+
+
+class HotBranch:
+    def __init__(self, name, bin, queue, tee_pad):
+        self.name = name
+        self.bin = bin
+        self.queue = queue
+        self.tee_pad = tee_pad
+        self.attach_started = time.perf_counter()
+        self.first_buffer_at = None
+        self.detach_started = None
+        self.on_detached = None
+        self.eos_pending = set()  # sink elements that have not seen EOS yet
+        self.timeout_id = 0
+
+
+class BranchManager:
+    # Attaches and detaches tee branches while the pipeline is PLAYING
+    #
+    # attach(): the branch is built in its own bin behind a queue (policy applied
+    # through TeeBranches), added, brought to the pipeline's state and only then
+    # linked to a new tee request pad, so data never reaches a branch that is not
+    # running. Its sinks get async=false: a new sink must not make the pipeline
+    # preroll again.
+    # detach(): an IDLE probe on the tee pad unlinks the branch between two
+    # buffers, then EOS is sent into the branch so its elements can finish (a
+    # recorder finalizes its file). Once EOS reached the branch's sinks the bin
+    # is set to NULL, removed and the tee pad released, from the main loop.
+    # Existing branches never see a flush, a block or a state change.
+    #
+    # Attach latency is measured up to the first buffer in the new branch, detach
+    # latency up to the release of the tee pad. Needs a running GLib main loop.
+    def __init__(self, pipeline, tee, branches=None, eos_timeout_ms=2000):
+        self.pipeline = pipeline
+        self.tee = tee
+        self.branches = branches  # TeeBranches for queue policies, optional
+        self.eos_timeout_ms = eos_timeout_ms
+        self.active = {}  # name -> HotBranch
+        self.detaching = {}  # name -> HotBranch, until its bin has been removed
+        self.attached = 0
+        self.detached = 0
+        self.attach_latency = LatencyHistogram()
+        self.detach_latency = LatencyHistogram()
+
+    def _make_bin(self, name, description):
+        # description: gst-launch style string or pipeline_builder graph
+        if isinstance(description, dict):
+            bin = Gst.Bin.new(name)
+            build(description, pipeline=bin)
+        else:
+            bin = Gst.parse_bin_from_description(description, False)
+            bin.set_name(name)
+        first = bin.find_unlinked_pad(Gst.PadDirection.SINK)
+        if first is None:
+            raise PipelineBuildError(f"Branch {name!r} has no unlinked sink pad", name)
+        queue = Gst.ElementFactory.make("queue", f"{name}_queue")
+        bin.add(queue)
+        if queue.get_static_pad("src").link(first) != Gst.PadLinkReturn.OK:
+            raise PipelineBuildError(f"Could not link the queue of branch {name!r}", name)
+        bin.add_pad(Gst.GhostPad.new("sink", queue.get_static_pad("sink")))
+        # Sinks at any depth, including ones that auto sinks only create on
+        # their way to READY
+        for element in iterate(bin.iterate_recurse()):
+            self._disable_async(element)
+        bin.connect("deep-element-added", lambda bin, sub_bin, element: self._disable_async(element))
+        return bin, queue
+
+    @staticmethod
+    def _disable_async(element):
+        if not isinstance(element, Gst.Bin) and element.find_property("async") is not None:
+            element.set_property("async", False)
+
+    def attach(self, name, description, policy="lossy"):
+        if name in self.active or name in self.detaching:
+            raise ValueError(f"Branch {name!r} is still attached")
+        bin, queue = self._make_bin(name, description)
+        if self.branches is not None:
+            self.branches.add(queue, policy)
+        self.pipeline.add(bin)
+        # Running before linking: the first buffer must find the branch PLAYING
+        if not bin.sync_state_with_parent():
+            self.pipeline.remove(bin)
+            raise PipelineBuildError(f"Could not start branch {name!r}", name)
+
+        tee_pad = self.tee.get_request_pad("src_%u")
+        branch = HotBranch(name, bin, queue, tee_pad)
+        sink_pad = bin.get_static_pad("sink")
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, self._on_first_buffer, branch)
+        # The tee hands the new pad its sticky events (stream-start, caps,
+        # segment) before the next buffer, so the branch negotiates on its own
+        if tee_pad.link(sink_pad) != Gst.PadLinkReturn.OK:
+            self.tee.release_request_pad(tee_pad)
+            bin.set_state(Gst.State.NULL)
+            self.pipeline.remove(bin)
+            raise PipelineBuildError(f"Could not link branch {name!r} to the tee", name)
+        self.active[name] = branch
+        self.attached += 1
+        logger.debug(f"Branch {name} attached on {tee_pad.get_name()}")
+        return branch
+
+    def _on_first_buffer(self, pad, info, branch):
+        branch.first_buffer_at = time.perf_counter()
+        self.attach_latency.record(branch.first_buffer_at - branch.attach_started)
+        return Gst.PadProbeReturn.REMOVE
+
+    def detach(self, name, on_detached=None):
+        # on_detached(name) is called from the main loop once everything is released
+        branch = self.active.pop(name)
+        self.detaching[name] = branch
+        branch.detach_started = time.perf_counter()
+        branch.on_detached = on_detached
+        branch.eos_pending = {sink.get_name() for sink in iterate(branch.bin.iterate_sinks())}
+        for sink in iterate(branch.bin.iterate_sinks()):
+            pad = sink.get_static_pad("sink")
+            if pad is not None:
+                pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._on_branch_eos, branch)
+        # Runs right away if the pad is idle, otherwise right after the current buffer
+        branch.tee_pad.add_probe(Gst.PadProbeType.IDLE, self._on_tee_pad_idle, branch)
+        # Elements that swallow EOS must not keep the branch alive forever
+        branch.timeout_id = GLib.timeout_add(self.eos_timeout_ms, self._on_eos_timeout, branch)
+
+    def _on_tee_pad_idle(self, pad, info, branch):
+        sink_pad = branch.bin.get_static_pad("sink")
+        pad.unlink(sink_pad)
+        sink_pad.send_event(Gst.Event.new_eos())
+        return Gst.PadProbeReturn.REMOVE
+
+    def _on_branch_eos(self, pad, info, branch):
+        if info.get_event().type != Gst.EventType.EOS:
+            return Gst.PadProbeReturn.OK
+        branch.eos_pending.discard(pad.get_parent_element().get_name())
+        if not branch.eos_pending:
+            # Streaming thread of the branch: it cannot shut itself down
+            GLib.idle_add(self._finish, branch)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _on_eos_timeout(self, branch):
+        branch.timeout_id = 0
+        logger.error(f"Branch {branch.name} did not finish in time, removing it anyway")
+        self._finish(branch)
+        return False
+
+    def _finish(self, branch):
+        if branch.bin is None:
+            return False
+        if branch.timeout_id:
+            GLib.source_remove(branch.timeout_id)
+            branch.timeout_id = 0
+        branch.bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(branch.bin)
+        self.tee.release_request_pad(branch.tee_pad)
+        if self.branches is not None:
+            self.branches.remove(branch.queue.get_name())
+        # Drop our references so the elements and their memory go away
+        branch.bin = branch.queue = branch.tee_pad = None
+        del self.detaching[branch.name]
+        self.detached += 1
+        self.detach_latency.record(time.perf_counter() - branch.detach_started)
+        logger.debug(f"Branch {branch.name} detached")
+        if branch.on_detached:
+            branch.on_detached(branch.name)
+        return False
+
+    def stats(self):
+        return {
+            "active": sorted(self.active),
+            "detaching": sorted(self.detaching),
+            "attached": self.attached,
+            "detached": self.detached,
+            "attach_latency": self.attach_latency.stats(),
+            "detach_latency": self.detach_latency.stats(),
+        }
+
+
+def count_objects(pipeline, tee):
+    # (elements at any depth, tee src pads)
+    return len(list(iterate(pipeline.iterate_recurse()))), len(list(iterate(tee.iterate_src_pads())))
+
+
+def check_cycles(cycles=20, hold_ms=200):
+    # Attaches and detaches a branch `cycles` times on a playing pipeline; returns
+    # the object counts before and after and the RSS after every cycle
+    pipeline = Gst.parse_launch("audiotestsrc is-live=true ! tee name=tee ! queue ! fakesink sync=true")
+    tee = pipeline.get_by_name("tee")
+    main_loop = GLib.MainLoop(None)
+    manager = BranchManager(pipeline, tee)
+    rss = []
+
+    def attach():
+        manager.attach("cycle", "audioconvert ! level ! fakesink sync=true")
+        GLib.timeout_add(hold_ms, detach)
+        return False
+
+    def detach():
+        manager.detach("cycle", on_detached)
+        return False
+
+    def on_detached(name):
+        rss.append(resource_usage()[0])
+        if len(rss) < cycles:
+            attach()
+        else:
+            main_loop.quit()
+
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_state(Gst.CLOCK_TIME_NONE)
+    baseline = count_objects(pipeline, tee)
+    GLib.idle_add(attach)
+    main_loop.run()
+    after = count_objects(pipeline, tee)
+    pipeline.set_state(Gst.State.NULL)
+    return baseline, after, rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach and detach a tee branch repeatedly")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--hold-ms", type=int, default=200, help="how long each branch stays attached")
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    baseline, after, rss = check_cycles(args.cycles, args.hold_ms)
+    ok = after == baseline
+    # The first cycle loads the plugins; growth after that would be a leak
+    print(
+        f"{args.cycles} cycles: elements {baseline[0]} -> {after[0]}, tee src pads {baseline[1]} -> {after[1]}, "
+        f"RSS {rss[0] / 2**20:.1f} -> {rss[-1] / 2**20:.1f} MiB after the first cycle  {'OK' if ok else 'FAIL'}"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import pytest
+
+from caps_index import CapsIndex, caps_key, parse_caps_string, split_structures
+
+
+def factory(name, rank, klass, *templates):
+    # Factory dict in the shape of introspection.describe_factory()
+    return {
+        "name": name,
+        "rank": rank,
+        "klass": klass,
+        "pad_templates": [{"direction": direction, "caps": caps} for direction, caps in templates],
+    }
+
+
+FACTORIES = [
+    factory(
+        "audioconvert",
+        0,
+        "Filter/Converter/Audio",
+        ("sink", "audio/x-raw, format=(string){ S16LE, F32LE }, rate=(int)[ 1, 2147483647 ]"),
+        ("src", "audio/x-raw, format=(string){ S16LE, F32LE }"),
+    ),
+    factory("pulsesink", 256, "Sink/Audio", ("sink", "audio/x-raw, format=(string)S16LE; audio/x-alaw")),
+    factory("alsasink", 128, "Sink/Audio", ("sink", "audio/x-raw")),
+    factory("queue", 0, "Generic", ("sink", "ANY"), ("src", "ANY")),
+    factory("glimagesink", 128, "Sink/Video", ("sink", "video/x-raw(memory:GLMemory), format=(string)RGBA")),
+    factory("fakesrc", 0, "Source", ("src", "EMPTY")),
+]
+
+
+def test_split_structures_ignores_nested_separators():
+    caps = "audio/x-raw, format={ S16LE, F32LE }, rate=[ 1, 48000 ]; video/x-raw, framerate=(fraction)30/1"
+    assert split_structures(caps) == [
+        "audio/x-raw, format={ S16LE, F32LE }, rate=[ 1, 48000 ]",
+        "video/x-raw, framerate=(fraction)30/1",
+    ]
+    assert split_structures("audio/x-raw; ") == ["audio/x-raw"]
+
+
+def test_parse_caps_string():
+    assert parse_caps_string(" ANY ") == "ANY"
+    assert parse_caps_string("EMPTY") == []
+    assert parse_caps_string("") == []
+    assert parse_caps_string('audio/x-raw, format=(string){ "S16LE", F32LE }; audio/x-alaw') == [
+        ("audio/x-raw", frozenset({"S16LE", "F32LE"})),
+        ("audio/x-alaw", None),
+    ]
+
+
+def test_parse_caps_string_keeps_only_system_memory():
+    caps = "video/x-raw(memory:GLMemory), format=RGBA; video/x-raw(memory:SystemMemory), format=I420"
+    assert parse_caps_string(caps) == [("video/x-raw", frozenset({"I420"}))]
+
+
+def test_caps_key():
+    assert caps_key("audio/x-raw, format=(string)S16LE, rate=(int)44100") == ("audio/x-raw", "S16LE")
+    assert caps_key("audio/x-raw, format={ S16LE, F32LE }") == ("audio/x-raw", None)
+    assert caps_key("video/x-h264") == ("video/x-h264", None)
+    assert caps_key(("audio/x-raw", "F32LE")) == ("audio/x-raw", "F32LE")
+    for caps in ("ANY", "EMPTY"):
+        with pytest.raises(ValueError):
+            caps_key(caps)
+
+
+def test_downstream_orders_by_rank_and_filters_formats():
+    index = CapsIndex(FACTORIES)
+    assert index.downstream("audio/x-raw, format=(string)S16LE") == ["pulsesink", "alsasink", "audioconvert"]
+    # pulsesink only lists S16LE, alsasink takes any format
+    assert index.downstream("audio/x-raw, format=(string)F32LE") == ["alsasink", "audioconvert"]
+    assert index.downstream("audio/x-raw, format=(string)F32LE", klass="Sink/Audio") == ["alsasink"]
+    assert index.downstream("audio/x-alaw") == ["pulsesink"]
+
+
+def test_any_caps_and_features():
+    index = CapsIndex(FACTORIES)
+    assert index.downstream("audio/x-alaw", include_any=True) == ["pulsesink", "queue"]
+    # GL memory templates are not indexed
+    assert index.downstream("video/x-raw, format=(string)RGBA") == []
+    assert index.media_types("sink") == ["audio/x-alaw", "audio/x-raw"]
+    assert index.upstream("audio/x-raw, format=(string)F32LE") == ["audioconvert"]
+
+
+def test_lookups_are_cached():
+    index = CapsIndex(FACTORIES)
+    first = index.downstream("audio/x-raw, format=(string)S16LE")
+    assert index.downstream(("audio/x-raw", "S16LE")) is first
@@ -0,0 +1,93 @@
+import pytest
+
+from chunk_sizer import ChunkSizer
+
+
+class AppSrc:
+    # Just enough of an appsrc for ChunkSizer: properties and signal handlers
+    def __init__(self, max_bytes=200000):
+        self.props = {"max-bytes": max_bytes}
+        self.handlers = {}
+
+    def get_property(self, name):
+        return self.props[name]
+
+    def connect(self, signal, callback):
+        self.handlers.setdefault(signal, []).append(callback)
+        return len(self.handlers[signal])
+
+    def disconnect(self, handler_id):
+        pass
+
+    def emit(self, signal, *args):
+        for callback in self.handlers.get(signal, []):
+            callback(self, *args)
+
+
+def cycle(appsrc, sizer, pushes):
+    # One regular need-data -> pushes -> enough-data cycle
+    appsrc.emit("need-data", 0)
+    for _ in range(pushes):
+        sizer.next_chunk()
+    appsrc.emit("enough-data")
+
+
+def make_sizer(appsrc, **kwargs):
+    # S16 mono 44100 Hz, 50 ms target
+    return ChunkSizer(appsrc, 88200, align=2, **kwargs)
+
+
+def test_regular_cycles_keep_the_chunk_size():
+    appsrc = AppSrc()
+    sizer = make_sizer(appsrc, initial_chunk=1024)
+    for _ in range(20):
+        cycle(appsrc, sizer, pushes=16)
+    assert sizer.chunk_size == 1024
+    assert sizer.underruns == 0
+    assert sizer.resizes == 0
+
+
+def test_need_data_while_filling_is_an_underrun():
+    appsrc = AppSrc()
+    sizer = make_sizer(appsrc, initial_chunk=1024)
+    appsrc.emit("need-data", 0)
+    sizer.next_chunk()
+    # The queue ran dry again before enough-data
+    appsrc.emit("need-data", 0)
+    assert sizer.underruns == 1
+    assert sizer.chunk_size == 2048
+
+
+def test_repeated_need_data_without_pushes_is_not_an_underrun():
+    appsrc = AppSrc()
+    sizer = make_sizer(appsrc)
+    appsrc.emit("need-data", 0)
+    appsrc.emit("need-data", 0)
+    assert sizer.underruns == 0
+
+
+def test_few_pushes_halve_and_many_pushes_double():
+    appsrc = AppSrc()
+    sizer = make_sizer(appsrc, initial_chunk=2048)
+    cycle(appsrc, sizer, pushes=1)
+    assert sizer.chunk_size == 1024
+    cycle(appsrc, sizer, pushes=100)
+    assert sizer.chunk_size == 2048
+
+
+@pytest.mark.parametrize("max_bytes, expected", [(200000, 4410), (8000, 2000), (0, 4410)])
+def test_max_chunk_bounded_by_latency_and_queue(max_bytes, expected):
+    sizer = make_sizer(AppSrc(max_bytes))
+    assert sizer.max_chunk == expected
+
+
+def test_sizes_stay_aligned_and_within_bounds():
+    appsrc = AppSrc()
+    sizer = make_sizer(appsrc, initial_chunk=1001)
+    assert sizer.chunk_size % 2 == 0
+    for _ in range(10):
+        cycle(appsrc, sizer, pushes=100)
+    assert sizer.chunk_size == sizer.max_chunk
+    for _ in range(20):
+        cycle(appsrc, sizer, pushes=1)
+    assert sizer.chunk_size == sizer.min_chunk
@@ -0,0 +1,165 @@
+import struct
+
+import pytest
+
+import matroska
+from matroska import check_output, iter_elements, parse_matroska, vp8_frame_size, vp9_frame_size
+
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+
+
+def element_id(value):
+    # IDs keep their length marker, so their byte length follows from the value
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def element(id_value, payload=b"", unknown_size=False):
+    if unknown_size:
+        size = UNKNOWN_SIZE
+    elif len(payload) < 0x7F:
+        size = bytes([0x80 | len(payload)])
+    else:
+        size = b"\x01" + len(payload).to_bytes(7, "big")
+    return element_id(id_value) + size + payload
+
+
+def uint(id_value, value):
+    return element(id_value, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def vp8_keyframe(width, height):
+    return b"\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", width, height) + b"\x00" * 8
+
+
+VP8_INTER = b"\x01" + b"\x00" * 15
+
+
+def vp9_keyframe(width, height):
+    # Profile 0 uncompressed header up to frame_size
+    fields = [
+        (2, 2),  # frame marker
+        (0, 2),  # profile
+        (0, 1),  # show_existing_frame
+        (0, 1),  # frame_type: key frame
+        (1, 1),  # show_frame
+        (0, 1),  # error_resilient_mode
+        (0x498342, 24),  # sync code
+        (1, 3),  # color_space BT.601
+        (0, 1),  # color_range
+        (width - 1, 16),
+        (height - 1, 16),
+    ]
+    bits = "".join(format(value, f"0{count}b") for value, count in fields)
+    bits += "0" * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, "big") + b"\x00" * 4
+
+
+def block(frame, timecode=0, track=1):
+    return element(matroska.SIMPLE_BLOCK, bytes([0x80 | track]) + struct.pack(">hB", timecode, 0) + frame)
+
+
+def matroska_file(frames, codec_id="V_VP8", doc_type="webm", size=(64, 48), live=False):
+    header = element(matroska.EBML_HEADER, element(matroska.DOC_TYPE, doc_type.encode()))
+    video = uint(matroska.PIXEL_WIDTH, size[0]) + uint(matroska.PIXEL_HEIGHT, size[1])
+    track = element(
+        matroska.TRACK_ENTRY,
+        uint(matroska.TRACK_NUMBER, 1)
+        + uint(matroska.TRACK_TYPE, 1)
+        + element(matroska.CODEC_ID, codec_id.encode())
+        + element(matroska.VIDEO, video),
+    )
+    cluster_body = uint(matroska.CLUSTER_TIMECODE, 0) + b"".join(
+        block(frame, timecode=i * 33) for i, frame in enumerate(frames)
+    )
+    segment_body = element(matroska.TRACKS, track) + element(matroska.CLUSTER, cluster_body, unknown_size=live)
+    return header + element(matroska.SEGMENT, segment_body, unknown_size=live)
+
+
+def write(tmp_path, data, name="out.webm"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+# 6 frames: 64x48 for 3, then 32x24 for 3
+SCHEDULE = [(64, 48)] * 3 + [(32, 24)] * 3
+VP8_FRAMES = [vp8_keyframe(64, 48), VP8_INTER, VP8_INTER, vp8_keyframe(32, 24), VP8_INTER, VP8_INTER]
+
+
+def test_frame_sizes():
+    assert vp8_frame_size(vp8_keyframe(1024, 768)) == (1024, 768)
+    assert vp8_frame_size(VP8_INTER) is None
+    assert vp9_frame_size(vp9_keyframe(1280, 720)) == (1280, 720)
+    assert vp9_frame_size(b"\x86") is None  # inter frame
+    assert vp9_frame_size(b"\x80") is None  # truncated
+
+
+def test_iter_elements_descends_into_masters():
+    data = element(matroska.SEGMENT, element(matroska.TRACKS, uint(matroska.TRACK_NUMBER, 3)))
+    ids = [element_id for element_id, start, size in iter_elements(data)]
+    assert ids == [matroska.SEGMENT, matroska.TRACKS, matroska.TRACK_NUMBER]
+
+
+@pytest.mark.parametrize("live", [False, True])
+def test_parse_matroska(tmp_path, live):
+    info = parse_matroska(write(tmp_path, matroska_file(VP8_FRAMES, live=live)))
+    assert not info["damaged"]
+    assert info["doc_type"] == "webm"
+    assert info["tracks"] == [{"number": 1, "type": 1, "codec_id": "V_VP8", "width": 64, "height": 48}]
+    assert info["blocks"] == 6
+    assert info["keyframes"] == [
+        {"frame": 0, "time": 0, "size": [64, 48]},
+        {"frame": 3, "time": 99, "size": [32, 24]},
+    ]
+
+
+def test_truncated_file_is_damaged(tmp_path):
+    data = matroska_file(VP8_FRAMES)
+    info = parse_matroska(write(tmp_path, data[: len(data) - 20]))
+    assert info["damaged"]
+    assert info["doc_type"] == "webm"
+
+
+def test_check_output_accepts_the_schedule(tmp_path):
+    result = check_output(write(tmp_path, matroska_file(VP8_FRAMES)), "vp8enc", "webmmux", SCHEDULE, 6)
+    assert result["problems"] == []
+    assert result["ok"]
+    assert result["size_changes_in_file"] == 1
+
+
+def test_check_output_vp9_in_matroska(tmp_path):
+    frames = [vp9_keyframe(64, 48), b"\x86", b"\x86", vp9_keyframe(32, 24), b"\x86", b"\x86"]
+    path = write(tmp_path, matroska_file(frames, codec_id="V_VP9", doc_type="matroska"), "out.mkv")
+    assert check_output(path, "vp9enc", "matroskamux", SCHEDULE, 6)["ok"]
+
+
+def test_check_output_header_must_match_the_first_size(tmp_path):
+    # 32x24 is scheduled too, just not first
+    path = write(tmp_path, matroska_file(VP8_FRAMES, size=(32, 24)))
+    result = check_output(path, "vp8enc", "webmmux", SCHEDULE, 6)
+    assert not result["ok"]
+    assert result["problems"] == ["track header size [32, 24], expected the first size [64, 48]"]
+
+
+def test_check_output_keyframes_checked_per_frame(tmp_path):
+    # Same sizes in the same order, but the change lands one frame late
+    frames = [vp8_keyframe(64, 48), VP8_INTER, VP8_INTER, VP8_INTER, vp8_keyframe(32, 24), VP8_INTER]
+    result = check_output(write(tmp_path, matroska_file(frames)), "vp8enc", "webmmux", SCHEDULE, 6)
+    assert result["problems"] == ["no key frame at frame 3, where the size changes to [32, 24]"]
+
+
+def test_check_output_wrong_keyframe_size(tmp_path):
+    frames = list(VP8_FRAMES)
+    frames[3] = vp8_keyframe(48, 32)
+    result = check_output(write(tmp_path, matroska_file(frames)), "vp8enc", "webmmux", SCHEDULE, 6)
+    assert result["problems"] == ["key frame 3 is [48, 32], scheduled [32, 24]"]
+
+
+def test_check_output_container_problems(tmp_path):
+    path = write(tmp_path, matroska_file(VP8_FRAMES[:5], doc_type="matroska"))
+    result = check_output(path, "vp9enc", "webmmux", SCHEDULE, 6)
+    assert result["problems"] == [
+        "doc type 'matroska', expected 'webm'",
+        "codec ID 'V_VP8', expected 'V_VP9'",
+        "5 blocks, expected 6",
+    ]
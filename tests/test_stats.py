@@ -0,0 +1,57 @@
+import math
+
+from stats import LatencyHistogram, resource_usage
+
+
+class FineHistogram(LatencyHistogram):
+    BOUNDS_MS = (0.1, 1, 10)
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(0.5) is None
+    assert histogram.stats() == {
+        "count": 0,
+        "mean_ms": 0.0,
+        "max_ms": 0.0,
+        "p50_ms": None,
+        "p95_ms": None,
+        "buckets": {},
+    }
+
+
+def test_buckets_and_percentiles():
+    histogram = LatencyHistogram()
+    # 90 samples of 3 ms, 9 of 40 ms and one of 7 s
+    for seconds in [0.003] * 90 + [0.040] * 9 + [7.0]:
+        histogram.record(seconds)
+    stats = histogram.stats()
+    assert stats["count"] == 100
+    assert stats["buckets"] == {"<=5ms": 90, "<=50ms": 9, ">5000ms": 1}
+    assert stats["p50_ms"] == 5
+    assert stats["p95_ms"] == 50
+    assert histogram.percentile(1.0) == math.inf
+    assert math.isclose(stats["max_ms"], 7000)
+    assert math.isclose(stats["mean_ms"], (90 * 3 + 9 * 40 + 7000) / 100)
+
+
+def test_bounds_are_inclusive():
+    histogram = LatencyHistogram()
+    histogram.record(0.002)
+    assert histogram.stats()["buckets"] == {"<=2ms": 1}
+
+
+def test_subclass_bounds():
+    histogram = FineHistogram()
+    histogram.record(0.00005)
+    histogram.record(0.5)
+    assert histogram.counts == [1, 0, 0, 1]
+    assert histogram.stats()["buckets"] == {"<=0.1ms": 1, ">10ms": 1}
+
+
+def test_resource_usage_grows_with_allocations():
+    rss, cpu = resource_usage()
+    assert rss > 0 and cpu > 0
+    block = bytearray(64 * 2**20)
+    block[::4096] = b"\x01" * len(block[::4096])  # touch every page
+    assert resource_usage()[0] >= rss + 32 * 2**20
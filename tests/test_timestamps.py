@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from timestamps import SECOND, StreamClock
+
+
+def uint64_scale(value, num, denom):
+    # gst_util_uint64_scale(): value * num / denom, rounded down, without overflow
+    return value * num // denom
+
+
+def run(clock, hours, chunk_units, seed=0):
+    # Feeds hours of media through clock in chunks of random size; yields each
+    # buffer's (pts, duration) with the unit count it starts at, kept here and not
+    # taken from the clock
+    rng = random.Random(seed)
+    target = hours * 3600 * clock.rate_num // clock.rate_den
+    units = 0
+    while units < target:
+        count = min(rng.choice(chunk_units), target - units)
+        pts, duration = clock.advance(count)
+        yield units, count, pts, duration
+        units += count
+
+
+CLOCKS = [
+    ("S16 mono 44100 Hz", lambda: StreamClock(44100, bpf=2), [64, 441, 512, 1000, 4096]),
+    ("48000 Hz", lambda: StreamClock(48000, bpf=4), [480, 1024, 1536]),
+    ("29.97 fps", lambda: StreamClock(30000, 1001), [1]),
+    ("30 fps", lambda: StreamClock(30), [1]),
+]
+
+
+@pytest.mark.parametrize("name, make_clock, chunk_units", CLOCKS, ids=[c[0] for c in CLOCKS])
+def test_every_timestamp_matches_the_reference(name, make_clock, chunk_units):
+    clock = make_clock()
+    expected_end = 0
+    for units, count, pts, duration in run(clock, 1, chunk_units):
+        assert pts == uint64_scale(units, SECOND * clock.rate_den, clock.rate_num)
+        assert pts + duration == uint64_scale(units + count, SECOND * clock.rate_den, clock.rate_num)
+        # Contiguous: no gap or overlap between consecutive buffers
+        assert pts == expected_end
+        expected_end = pts + duration
+    # An hour of media ends less than one unit before the hour
+    assert 0 <= 3600 * SECOND - expected_end < SECOND * clock.rate_den // clock.rate_num + 1
+
+
+def test_naive_accumulation_drifts():
+    # Adding up each buffer's rounded duration, as before StreamClock, loses up to
+    # a nanosecond per buffer; after an hour that is more than a whole sample
+    clock = StreamClock(44100, bpf=2)
+    naive = 0
+    for units, count, pts, duration in run(clock, 1, [1000]):
+        naive += uint64_scale(count, SECOND, 44100)
+    exact = uint64_scale(clock.units, SECOND, 44100)
+    assert exact - naive > SECOND // 44100
+    assert clock.position == exact
+
+
+def test_base_time_and_stamp_offsets():
+    clock = StreamClock(48000, bpf=4, base_time=5 * SECOND)
+
+    class Buffer:
+        def __init__(self, size):
+            self.size = size
+
+        def get_size(self):
+            return self.size
+
+    buffer = clock.stamp(Buffer(4 * 480))
+    assert (buffer.pts, buffer.duration) == (5 * SECOND, 10_000_000)
+    assert (buffer.offset, buffer.offset_end) == (0, 480)
+    with pytest.raises(ValueError):
+        clock.stamp(Buffer(6))
+
+
+def test_invalid_rate():
+    with pytest.raises(ValueError):
+        StreamClock(0)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from transcode_jobs import DEFAULTS, generated_jobs, load_manifest
+
+
+def write_manifest(tmp_path, manifest):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(manifest))
+    return str(path)
+
+
+def test_defaults_apply_and_jobs_override(tmp_path):
+    path = write_manifest(
+        tmp_path,
+        {
+            "defaults": {"width": 640, "height": 480},
+            "jobs": [
+                {"name": "ball", "source": "videotestsrc pattern=ball", "frames": 10},
+                {"input": "/media/clip.webm", "height": 360},
+            ],
+        },
+    )
+    ball, clip = load_manifest(path)
+    assert (ball["width"], ball["height"], ball["frames"]) == (640, 480, 10)
+    assert (clip["width"], clip["height"], clip["frames"]) == (640, 360, DEFAULTS["frames"])
+    assert clip["name"] == "job-1"
+    assert ball["muxer"] == clip["muxer"] == "matroskamux"
+
+
+def test_encoder_props_merge_key_by_key(tmp_path):
+    path = write_manifest(
+        tmp_path,
+        {
+            "defaults": {"encoder_props": {"cpu-used": 4}},
+            "jobs": [
+                {"source": "videotestsrc", "encoder_props": {"threads": 4}},
+                {"source": "videotestsrc", "encoder_props": {"cpu-used": 8}},
+            ],
+        },
+    )
+    threaded, fast = load_manifest(path)
+    assert threaded["encoder_props"] == {"deadline": 1, "threads": 4, "cpu-used": 4}
+    assert fast["encoder_props"] == {"deadline": 1, "threads": 1, "cpu-used": 8}
+
+
+@pytest.mark.parametrize("encoder", ["vp8enc", "vp9enc"])
+def test_libvpx_defaults(tmp_path, encoder):
+    path = write_manifest(tmp_path, {"jobs": [{"source": "videotestsrc", "encoder": encoder}]})
+    assert load_manifest(path)[0]["encoder_props"] == {"deadline": 1, "threads": 1}
+
+
+def test_other_encoders_get_no_libvpx_props(tmp_path):
+    path = write_manifest(
+        tmp_path,
+        {
+            "defaults": {"encoder": "x264enc", "muxer": "mp4mux"},
+            "jobs": [
+                {"source": "videotestsrc"},
+                {"source": "videotestsrc", "encoder": "theoraenc", "encoder_props": {"quality": 30}},
+            ],
+        },
+    )
+    x264, theora = load_manifest(path)
+    assert x264["encoder_props"] == {}
+    assert theora["encoder_props"] == {"quality": 30}
+
+
+@pytest.mark.parametrize("job", [{}, {"source": "videotestsrc", "input": "/media/clip.webm"}])
+def test_jobs_need_exactly_one_source(tmp_path, job):
+    path = write_manifest(tmp_path, {"jobs": [{"source": "videotestsrc"}, job]})
+    with pytest.raises(ValueError, match="Job 1"):
+        load_manifest(path)
+
+
+def test_generated_jobs():
+    jobs = generated_jobs(8)
+    assert [job["name"] for job in jobs[:2]] == ["generated-0", "generated-1"]
+    assert jobs[0]["source"] == jobs[6]["source"] == "videotestsrc pattern=smpte"
+    assert all(job["encoder_props"] == {"deadline": 1, "threads": 1} for job in jobs)
+    # Jobs must not share the props dict
+    jobs[0]["encoder_props"]["threads"] = 2
+    assert jobs[1]["encoder_props"]["threads"] == 1
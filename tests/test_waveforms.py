@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+import pytest
+
+from waveforms import WAVEFORMS, WaveformGenerator
+
+
+def reference_psychedelic(chunks):
+    # The C tutorial's per-sample loop, chunk by chunk
+    a, b, c, d = 0.0, 1.0, 0.0, 1.0
+    out = []
+    for num_samples in chunks:
+        c += d
+        d -= c / 1000
+        freq = 1100 + 1000 * d
+        samples = []
+        for _ in range(num_samples):
+            a += b
+            b -= a / freq
+            samples.append(500 * a)
+        out.append(np.clip(np.rint(samples), -32768, 32767).astype(np.int16))
+    return out
+
+
+def reference_periodic(waveform, chunks, sample_rate, freq, amplitude):
+    out, n = [], 0
+    for num_samples in chunks:
+        samples = []
+        for _ in range(num_samples):
+            phase = (freq * n / sample_rate) % 1.0
+            if waveform == "sine":
+                samples.append(amplitude * math.sin(2 * math.pi * phase))
+            else:
+                samples.append(amplitude * (1.0 - 4.0 * abs(phase - 0.5)))
+            n += 1
+        out.append(np.rint(samples).astype(np.int16))
+    return out
+
+
+CHUNKS = [512, 1, 1000, 4096, 37]
+
+
+def test_psychedelic_matches_reference_loop():
+    generator = WaveformGenerator("psychedelic")
+    for expected, num_samples in zip(reference_psychedelic(CHUNKS), CHUNKS):
+        np.testing.assert_array_equal(generator.generate(num_samples), expected)
+
+
+@pytest.mark.parametrize("waveform", ["sine", "triangle"])
+def test_periodic_matches_reference_loop(waveform):
+    generator = WaveformGenerator(waveform, sample_rate=44100, freq=440.0, amplitude=8000)
+    expected = reference_periodic(waveform, CHUNKS, 44100, 440.0, 8000)
+    for chunk, num_samples in zip(expected, CHUNKS):
+        # The phase is carried modulo one cycle, so allow one LSB of rounding
+        np.testing.assert_allclose(generator.generate(num_samples), chunk, atol=1)
+
+
+def test_fill_writes_into_given_array():
+    out = np.zeros(256, dtype=np.int16)
+    result = WaveformGenerator("sine").fill(out)
+    assert result is out
+    assert out.any()
+
+
+def test_unknown_waveform():
+    with pytest.raises(ValueError):
+        WaveformGenerator("square")
+    assert "square" not in WAVEFORMS
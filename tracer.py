@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Per-element latency and throughput from buffer pad probes
+#
+# PipelineTracer puts a buffer probe on every sink and src pad of every element
+# in a pipeline (including ones added later). From these it derives
+# - per element: buffers / bytes in and out per second, and processing latency,
+#   i.e. the time from a buffer arriving on a sink pad to the element pushing its
+#   first output. In the same streaming thread that is matched per thread (works
+#   for elements that change timestamps, like wavescope); across threads (queue)
+#   it is matched by PTS and is the time spent queued.
+# - per link (src pad -> peer): buffers and bytes per second
+# Counting is a couple of integer additions per buffer; latency timing can be
+# limited to every Nth buffer per pad with sample_every. snapshot() returns the
+# current numbers at any time, and once every sink has seen EOS the full report
+# is logged or written to dump_path as JSON.
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import gi
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+from gi.repository import GLib, Gst
+
+from negotiation import iterate, link_name
+from stats import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingHistogram(LatencyHistogram):
+    # Finer buckets: element processing times are usually microseconds
+    BOUNDS_MS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 1000)
+
+
+class _PadCounter:
+    def __init__(self):
+        self.buffers = 0
+        self.bytes = 0
+
+
+class ElementTrace:
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.sink_pads = {}  # pad name -> _PadCounter
+        self.src_pads = {}
+        self.latency = ProcessingHistogram()
+        # PTS -> arrival time, for outputs pushed from another thread
+        self.pending = OrderedDict()
+
+    def totals(self, pads):
+        return sum(c.buffers for c in pads.values()), sum(c.bytes for c in pads.values())
+
+
+class PipelineTracer:
+    MAX_PENDING = 256  # per element, for PTS matching across threads
+
+    def __init__(self, pipeline, sample_every=1, dump_path=None):
+        self.pipeline = pipeline
+        self.sample_every = max(1, sample_every)
+        self.dump_path = dump_path
+        self.started_at = time.monotonic()
+        self.elements = {}  # element name -> ElementTrace
+        self.links = {}  # src pad -> _PadCounter
+        self._local = threading.local()  # per thread: {element name: arrival time}
+        self._lock = threading.Lock()
+        self._previous = None  # (time, {key: (buffers, bytes)}) of the last snapshot
+        self._sinks = set()
+        self._eos_sinks = set()
+        self._probes = []
+        self._handlers = []
+        self._live_id = 0
+        self._handlers.append((pipeline, pipeline.connect("deep-element-added", self._on_element_added)))
+        for element in iterate(pipeline.iterate_recurse()):
+            self._watch_element(element)
+
+    def _on_element_added(self, bin, sub_bin, element):
+        self._watch_element(element)
+
+    def _watch_element(self, element):
+        if isinstance(element, Gst.Bin):
+            # Only the elements inside do work
+            return
+        name = element.get_name()
+        factory = element.get_factory()
+        with self._lock:
+            if name in self.elements:
+                return
+            trace = self.elements[name] = ElementTrace(name, factory.get_name() if factory else None)
+        self._handlers.append((element, element.connect("pad-added", self._on_pad_added, trace)))
+        for pad in iterate(element.iterate_pads()):
+            self._probe(pad, trace)
+        klass = factory.get_metadata(Gst.ELEMENT_METADATA_KLASS) if factory else ""
+        if "Sink" in (klass or "").split("/"):
+            # Dump once all of these got EOS
+            self._sinks.add(name)
+
+    def _on_pad_added(self, element, pad, trace):
+        self._probe(pad, trace)
+
+    def _probe(self, pad, trace):
+        probe_types = Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST
+        counter = _PadCounter()
+        if pad.get_direction() == Gst.PadDirection.SINK:
+            trace.sink_pads[pad.get_name()] = counter
+            callback = self._on_sink_buffer
+            probe_types |= Gst.PadProbeType.EVENT_DOWNSTREAM
+        else:
+            trace.src_pads[pad.get_name()] = counter
+            callback = self._on_src_buffer
+        self._probes.append((pad, pad.add_probe(probe_types, callback, trace, counter)))
+
+    @staticmethod
+    def _size(info):
+        buffer = info.get_buffer()
+        if buffer is not None:
+            return 1, buffer.get_size(), buffer.pts
+        buffer_list = info.get_buffer_list()
+        if buffer_list is None:
+            return 0, 0, Gst.CLOCK_TIME_NONE
+        count = buffer_list.length()
+        return count, buffer_list.calculate_size(), buffer_list.get(0).pts if count else Gst.CLOCK_TIME_NONE
+
+    def _on_sink_buffer(self, pad, info, trace, counter):
+        if info.type & Gst.PadProbeType.EVENT_DOWNSTREAM:
+            if info.get_event().type == Gst.EventType.EOS:
+                self._on_eos(trace.name)
+            return Gst.PadProbeReturn.OK
+        buffers, size, pts = self._size(info)
+        counter.buffers += buffers
+        counter.bytes += size
+        if counter.buffers % self.sample_every < buffers:
+            now = time.perf_counter()
+            arrivals = getattr(self._local, "arrivals", None)
+            if arrivals is None:
+                arrivals = self._local.arrivals = {}
+            arrivals[trace.name] = now
+            if pts != Gst.CLOCK_TIME_NONE:
+                pending = trace.pending
+                pending[pts] = now
+                if len(pending) > self.MAX_PENDING:
+                    pending.popitem(last=False)
+        return Gst.PadProbeReturn.OK
+
+    def _on_src_buffer(self, pad, info, trace, counter):
+        buffers, size, pts = self._size(info)
+        counter.buffers += buffers
+        counter.bytes += size
+        link = self.links.get(pad)
+        if link is None:
+            link = self.links[pad] = _PadCounter()
+        link.buffers += buffers
+        link.bytes += size
+
+        arrivals = getattr(self._local, "arrivals", None)
+        arrived = arrivals.pop(trace.name, None) if arrivals else None
+        if arrived is None and pts != Gst.CLOCK_TIME_NONE:
+            # Pushed from another thread than the one that delivered the input
+            arrived = trace.pending.pop(pts, None)
+        elif arrived is not None and pts != Gst.CLOCK_TIME_NONE:
+            trace.pending.pop(pts, None)
+        if arrived is not None:
+            trace.latency.record(time.perf_counter() - arrived)
+        return Gst.PadProbeReturn.OK
+
+    def _on_eos(self, name):
+        if name not in self._sinks:
+            return
+        with self._lock:
+            self._eos_sinks.add(name)
+            done = self._eos_sinks >= self._sinks
+        if done:
+            # Streaming thread: hand the dump over to the main loop
+            GLib.idle_add(self._dump_at_eos)
+
+    def _dump_at_eos(self):
+        self.dump(self.dump_path)
+        return False
+
+    def snapshot(self):
+        # Totals and rates since start, and rates since the previous snapshot
+        now = time.monotonic()
+        elapsed = max(now - self.started_at, 1e-9)
+        previous_time, previous = self._previous or (self.started_at, {})
+        interval = max(now - previous_time, 1e-9)
+        current = {}
+
+        def rates(key, buffers, nbytes):
+            current[key] = (buffers, nbytes)
+            last_buffers, last_bytes = previous.get(key, (0, 0))
+            return {
+                "buffers": buffers,
+                "bytes": nbytes,
+                "buffers_per_second": buffers / elapsed,
+                "bytes_per_second": nbytes / elapsed,
+                "recent_buffers_per_second": (buffers - last_buffers) / interval,
+                "recent_bytes_per_second": (nbytes - last_bytes) / interval,
+            }
+
+        elements = {}
+        for name, trace in list(self.elements.items()):
+            elements[name] = {
+                "factory": trace.factory,
+                "in": rates(("in", name), *trace.totals(trace.sink_pads)),
+                "out": rates(("out", name), *trace.totals(trace.src_pads)),
+                "latency": trace.latency.stats(),
+            }
+        links = {}
+        for pad, counter in list(self.links.items()):
+            name = link_name(pad)
+            links[name] = rates(("link", name), counter.buffers, counter.bytes)
+        self._previous = (now, current)
+        return {"elapsed_s": elapsed, "sample_every": self.sample_every, "elements": elements, "links": links}
+
+    def slowest(self, count=5):
+        # Elements with the highest mean processing latency
+        means = [
+            (name, 1000 * trace.latency.total / trace.latency.count)
+            for name, trace in list(self.elements.items())
+            if trace.latency.count
+        ]
+        return sorted(means, key=lambda item: -item[1])[:count]
+
+    def log_snapshot(self):
+        for name, mean_ms in self.slowest():
+            logger.info(f"  {name}: {mean_ms:.3f} ms per buffer")
+        return True
+
+    def start_live_log(self, interval_s=5):
+        # Logs the slowest elements every interval_s seconds from the main loop
+        if not self._live_id:
+            self._live_id = GLib.timeout_add_seconds(interval_s, self.log_snapshot)
+
+    def dump(self, path=None):
+        report = self.snapshot()
+        if path:
+            with open(path, "w") as dump_file:
+                json.dump(report, dump_file, indent=2)
+            logger.info(f"Trace written to {path}")
+        else:
+            logger.info(json.dumps(report, indent=2))
+        return report
+
+    def stop(self):
+        if self._live_id:
+            GLib.source_remove(self._live_id)
+            self._live_id = 0
+        for element, handler in self._handlers:
+            element.disconnect(handler)
+        self._handlers = []
+        for pad, probe_id in self._probes:
+            pad.remove_probe(probe_id)
+        self._probes = []
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Job manifests for batch_transcode.py
+#
+# Kept apart from the runner so manifests can be loaded and checked without
+# GStreamer. Settings are resolved in this order, later ones winning: DEFAULTS,
+# the manifest's "defaults", the job itself. encoder_props are merged key by key
+# on top of ENCODER_DEFAULTS for the job's encoder, so a job that only sets
+# "cpu-used" keeps the single-threaded realtime settings.
+import json
+
+DEFAULTS = {
+    "encoder": "vp8enc",
+    "encoder_props": {},
+    "muxer": "matroskamux",
+    "width": 1024,
+    "height": 768,
+    "framerate": 30,
+    "format": "I420",
+    "frames": 300,
+}
+
+# Only properties the encoder actually has: one thread per encoder, the pool
+# decides how cores are shared, and realtime deadline for the libvpx encoders
+ENCODER_DEFAULTS = {
+    "vp8enc": {"deadline": 1, "threads": 1},
+    "vp9enc": {"deadline": 1, "threads": 1},
+}
+
+EXTENSIONS = {"matroskamux": "mkv", "webmmux": "webm", "mp4mux": "mp4", "oggmux": "ogg"}
+
+
+def resolve_job(job, defaults=DEFAULTS):
+    resolved = dict(defaults, **job)
+    resolved["encoder_props"] = {
+        **ENCODER_DEFAULTS.get(resolved["encoder"], {}),
+        **defaults.get("encoder_props", {}),
+        **job.get("encoder_props", {}),
+    }
+    return resolved
+
+
+def load_manifest(path):
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    defaults = dict(DEFAULTS, **manifest.get("defaults", {}))
+    jobs = []
+    for index, job in enumerate(manifest["jobs"]):
+        if ("input" in job) == ("source" in job):
+            raise ValueError(f"Job {index} needs exactly one of 'input' or 'source'")
+        job = resolve_job(job, defaults)
+        job.setdefault("name", f"job-{index}")
+        jobs.append(job)
+    return jobs
+
+
+def generated_jobs(count):
+    patterns = ["smpte", "ball", "snow", "checkers-8", "circular", "zone-plate"]
+    return [
+        resolve_job({"name": f"generated-{i}", "source": f"videotestsrc pattern={patterns[i % len(patterns)]}"})
+        for i in range(count)
+    ]
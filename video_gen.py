@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# appsrc video generator with scheduled resolution / framerate changes
+#
+# The Python counterpart of C-code/video-gen.c and C-code/video-res.c, built on
+# the basic-tut-8.py pieces instead of rebuilding caps and allocating a buffer
+# per frame:
+# - frames are raw GRAY8, RGB or I420, filled with NumPy from a per-resolution
+#   base pattern (one vectorized add per plane, no per-pixel loop)
+# - a CapsSchedule says which resolution / framerate each frame has; a change
+#   only sets new caps on the appsrc, which serializes them with the next buffer,
+#   so the feed never stops
+# - every resolution keeps its own ProducerPool, so switching back and forth
+#   reuses buffers instead of reallocating them
+# - StreamClock gives exact timestamps; a framerate change starts a new clock
+#   at the position reached
+# - pushing is done by one of the feeders.py feeders (idle or thread)
+#
+# python3 video_gen.py --format I420 --schedule 1024x768@30,640x480@30 --every 100
+import argparse
+import logging
+import sys
+import time
+
+import gi
+import numpy as np
+
+gi.require_version("GLib", "2.0")
+gi.require_version("Gst", "1.0")
+gi.require_version("GstVideo", "1.0")
+from gi.repository import GLib, Gst, GstVideo
+
+from buffers import MapError, map_array
+from feeders import FEED_MODES, make_feeder
+from pools import ProducerPool
+from timestamps import StreamClock
+
+logger = logging.getLogger(__name__)
+
+VIDEO_FORMATS = ("GRAY8", "RGB", "I420")
+PATTERNS = ("gradient", "bars")
+
+# 75% color bars as (R, G, B) and (Y, U, V)
+_BARS_RGB = np.array(
+    [(191, 191, 191), (191, 191, 0), (0, 191, 191), (0, 191, 0), (191, 0, 191), (191, 0, 0), (0, 0, 191)],
+    dtype=np.uint8,
+)
+_BARS_YUV = np.array(
+    [(180, 128, 128), (168, 44, 136), (145, 147, 44), (133, 63, 52), (63, 193, 204), (51, 109, 212), (28, 212, 120)],
+    dtype=np.uint8,
+)
+
+
+def _round_up(value, multiple):
+    return (value + multiple - 1) // multiple * multiple
+
+
+def plane_layout(format, width, height):
+    # [(offset, stride, rows, bytes per row used), ...] in GStreamer's default
+    # layout for the format (rows padded to 4 bytes)
+    if format == "GRAY8":
+        return [(0, _round_up(width, 4), height, width)]
+    if format == "RGB":
+        return [(0, _round_up(width * 3, 4), height, width * 3)]
+    if format == "I420":
+        y_stride = _round_up(width, 4)
+        chroma_width = _round_up(width, 2) // 2
+        chroma_stride = _round_up(chroma_width, 4)
+        chroma_rows = _round_up(height, 2) // 2
+        u_offset = y_stride * _round_up(height, 2)
+        v_offset = u_offset + chroma_stride * chroma_rows
+        return [
+            (0, y_stride, height, width),
+            (u_offset, chroma_stride, chroma_rows, chroma_width),
+            (v_offset, chroma_stride, chroma_rows, chroma_width),
+        ]
+    raise ValueError(f"Unsupported format {format!r}, expected one of {VIDEO_FORMATS}")
+
+
+def plane_views(data, format, width, height):
+    # 2D views (rows x used bytes) of each plane inside a flat uint8 frame
+    views = []
+    for offset, stride, rows, row_bytes in plane_layout(format, width, height):
+        plane = data[offset : offset + stride * rows].reshape(rows, stride)
+        views.append(plane[:, :row_bytes])
+    return views
+
+
+def base_pattern(pattern, format, width, height):
+    # One uint8 array per plane; frame n adds n * speed (wrapping) to each
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown pattern {pattern!r}, expected one of {PATTERNS}")
+    planes = []
+    for index, (offset, stride, rows, row_bytes) in enumerate(plane_layout(format, width, height)):
+        if pattern == "gradient":
+            y, x = np.mgrid[0:rows, 0:row_bytes]
+            plane = ((x + y) * 255 // max(rows + row_bytes - 2, 1)).astype(np.uint8)
+            if format == "I420" and index:
+                # Flat chroma, shifted per plane so the picture has some color
+                plane = np.full((rows, row_bytes), 96 + 64 * index, dtype=np.uint8)
+        else:
+            if format == "RGB":
+                pixels = row_bytes // 3
+                colors = _BARS_RGB[np.arange(pixels) * len(_BARS_RGB) // max(pixels, 1)]
+                row = colors.reshape(-1)
+            else:
+                channel = 0 if format == "GRAY8" else index
+                columns = np.arange(row_bytes) * len(_BARS_YUV) // max(row_bytes, 1)
+                row = _BARS_YUV[columns, channel]
+            plane = np.broadcast_to(row, (rows, row_bytes)).copy()
+        planes.append(plane)
+    return planes
+
+
+class Resolution:
+    def __init__(self, width, height, fps_n=30, fps_d=1):
+        self.width = width
+        self.height = height
+        self.fps_n = fps_n
+        self.fps_d = fps_d
+
+    @classmethod
+    def parse(cls, text):
+        # "640x480", "640x480@15" or "640x480@30000/1001"
+        size, _, rate = text.partition("@")
+        width, height = (int(v) for v in size.lower().split("x"))
+        fps_n, fps_d = 30, 1
+        if rate:
+            num, _, den = rate.partition("/")
+            fps_n, fps_d = int(num), int(den or 1)
+        return cls(width, height, fps_n, fps_d)
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def __eq__(self, other):
+        return isinstance(other, Resolution) and (self.size, self.fps_n, self.fps_d) == (
+            other.size,
+            other.fps_n,
+            other.fps_d,
+        )
+
+    def __hash__(self):
+        return hash((self.width, self.height, self.fps_n, self.fps_d))
+
+    def __repr__(self):
+        return f"{self.width}x{self.height}@{self.fps_n}/{self.fps_d}"
+
+
+class CapsSchedule:
+    # Cycles through resolutions, switching every `every` frames
+    def __init__(self, resolutions, every=100):
+        if not resolutions:
+            raise ValueError("At least one resolution is needed")
+        if every <= 0:
+            raise ValueError("every must be positive")
+        self.resolutions = list(resolutions)
+        self.every = every
+
+    @classmethod
+    def parse(cls, text, every=100):
+        return cls([Resolution.parse(item) for item in text.split(",") if item.strip()], every)
+
+    def resolution_for(self, frame):
+        return self.resolutions[(frame // self.every) % len(self.resolutions)]
+
+
+class VideoGenerator:
+    def __init__(self, appsrc, schedule, format="I420", pattern="gradient", frames=None, feed_mode="thread", speed=2):
+        if format not in VIDEO_FORMATS:
+            raise ValueError(f"Unsupported format {format!r}, expected one of {VIDEO_FORMATS}")
+        self.appsrc = appsrc
+        self.schedule = schedule
+        self.format = format
+        self.pattern = pattern
+        self.frames = frames  # None = endless
+        self.speed = speed  # pattern movement per frame
+        self.frame = 0
+        self.switches = 0
+        self.fill_time = 0.0
+        self.switch_frames = []  # (frame, pts, resolution) of every caps change
+        self.done = False
+        self._pools = {}  # (width, height) -> ProducerPool
+        self._bases = {}  # (width, height) -> base pattern planes
+        self._caps = {}  # Resolution -> (caps, pool caps, frame size)
+        self._current = None
+        self.clock = None
+
+        appsrc.set_property("format", Gst.Format.TIME)
+        self.feeder = make_feeder(feed_mode, appsrc, self.produce)
+
+    def _caps_for(self, resolution):
+        cached = self._caps.get(resolution)
+        if cached is None:
+            raw = f"video/x-raw,format={self.format},width={resolution.width},height={resolution.height}"
+            caps = Gst.Caps.from_string(f"{raw},framerate={resolution.fps_n}/{resolution.fps_d},colorimetry=bt601")
+            # The pools are per frame size: without the framerate in their caps, a
+            # framerate-only switch keeps using the same pool as it is
+            pool_caps = Gst.Caps.from_string(raw)
+            info = GstVideo.VideoInfo.new_from_caps(caps)
+            layout = plane_layout(self.format, resolution.width, resolution.height)
+            offset, stride, rows, _ = layout[-1]
+            if info is not None and info.size != offset + stride * rows:
+                raise RuntimeError(f"Unexpected frame layout for {resolution}: {info.size} bytes")
+            cached = self._caps[resolution] = (caps, pool_caps, offset + stride * rows)
+        return cached
+
+    def _switch(self, resolution):
+        caps, pool_caps, size = self._caps_for(resolution)
+        previous, self._current = self._current, resolution
+        if previous is None or (previous.fps_n, previous.fps_d) != (resolution.fps_n, resolution.fps_d):
+            # Continue at the position reached, with the new frame duration
+            base_time = self.clock.position if self.clock else 0
+            self.clock = StreamClock(resolution.fps_n, resolution.fps_d, base_time=base_time)
+        pool = self._pools.get(resolution.size)
+        if pool is None:
+            pool = self._pools[resolution.size] = ProducerPool()
+            self._bases[resolution.size] = base_pattern(self.pattern, self.format, *resolution.size)
+        pool.set_caps(pool_caps, size=size)
+        # appsrc queues the caps and sends them downstream right before the next
+        # buffer, so nothing has to wait for the queue to drain
+        self.appsrc.set_property("caps", caps)
+        if previous is not None:
+            self.switches += 1
+        self.switch_frames.append((self.frame, self.clock.position, repr(resolution)))
+        logger.debug(f"Frame {self.frame}: caps now {caps.to_string()}")
+
+    def produce(self):
+        # Next frame as a Gst.Buffer, or None once done (after sending EOS)
+        if self.done:
+            return None
+        if self.frames is not None and self.frame >= self.frames:
+            self.done = True
+            self.appsrc.emit("end-of-stream")
+            return None
+        resolution = self.schedule.resolution_for(self.frame)
+        if resolution != self._current:
+            self._switch(resolution)
+
+        start = time.perf_counter()
+        buffer = self._pools[resolution.size].acquire()
+        self.clock.stamp(buffer, units=1)
+        shift = np.uint8((self.frame * self.speed) & 0xFF)
+        try:
+            with map_array(buffer, np.uint8) as data:
+                views = plane_views(data, self.format, *resolution.size)
+                for view, base in zip(views, self._bases[resolution.size]):
+                    np.add(base, shift, out=view)
+        except MapError as err:
+            logger.error(f"Could not fill frame {self.frame}: {err}")
+            return None
+        self.fill_time += time.perf_counter() - start
+        self.frame += 1
+        return buffer
+
+    def stop(self):
+        self.feeder.stop()
+        for pool in self._pools.values():
+            pool.release()
+
+    def stats(self):
+        return {
+            "frames": self.frame,
+            "switches": self.switches,
+            "fill_us_per_frame": 1e6 * self.fill_time / self.frame if self.frame else 0.0,
+            "feeder": self.feeder.stats(),
+            "pools": {f"{w}x{h}": pool.stats() for (w, h), pool in self._pools.items()},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw video appsrc generator with resolution changes")
+    parser.add_argument("--format", choices=VIDEO_FORMATS, default="I420")
+    parser.add_argument("--pattern", choices=PATTERNS, default="gradient")
+    parser.add_argument("--schedule", default="1024x768@30,640x480@30", help="comma separated WxH[@fps]")
+    parser.add_argument("--every", type=int, default=100, help="frames between caps changes")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--feed-mode", choices=FEED_MODES, default="thread")
+    parser.add_argument(
+        "--sink",
+        default="videoconvert ! fakesink sync=false",
+        help="gst-launch style description of what follows the appsrc",
+    )
+    args = parser.parse_args()
+
+    Gst.init(None)
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] [%(levelname)8s] - %(message)s")
+    pipeline = Gst.parse_launch(f"appsrc name=video_source ! {args.sink}")
+    generator = VideoGenerator(
+        pipeline.get_by_name("video_source"),
+        CapsSchedule.parse(args.schedule, args.every),
+        format=args.format,
+        pattern=args.pattern,
+        frames=args.frames,
+        feed_mode=args.feed_mode,
+    )
+
+    main_loop = GLib.MainLoop(None)
+    failed = []
+
+    def on_message(bus, msg):
+        if msg.type == Gst.MessageType.ERROR:
+            err, debug_info = msg.parse_error()
+            logger.error(f"Error received from element {msg.src.get_name()}: {err.message}")
+            failed.append(err.message)
+            main_loop.quit()
+        elif msg.type == Gst.MessageType.EOS:
+            logger.info("End-Of-Stream reached.")
+            main_loop.quit()
+        return True
+
+    bus = pipeline.get_bus()
+    bus.add_watch(GLib.PRIORITY_DEFAULT, on_message)
+    start = time.perf_counter()
+    pipeline.set_state(Gst.State.PLAYING)
+    main_loop.run()
+    elapsed = time.perf_counter() - start
+
+    generator.stop()
+    bus.remove_watch()
+    pipeline.set_state(Gst.State.NULL)
+    stats = generator.stats()
+    logger.info(f"{stats['frames']} frames in {elapsed:.2f}s ({stats['frames'] / elapsed:.0f} fps)")
+    logger.info(f"Generator: {stats}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
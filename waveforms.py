@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Vectorized waveform generation for appsrc feeders (see basic-tut-8.py)
+# Every generator computes a whole chunk of S16 samples in one NumPy call and
+# writes it into an array the caller provides, e.g. a view of a mapped Gst.Buffer
+# Run this file directly for a samples-per-second benchmark against the old
+# per-sample struct.pack() loop
+import math
+import struct
+import sys
+import time
+
+import numpy as np
+
+WAVEFORMS = ("sine", "triangle", "psychedelic")
+SAMPLE_DTYPE = np.int16  # matches GstAudio.AudioFormat.S16 in basic-tut-8.py
+
+
+class WaveformGenerator:
+    def __init__(self, waveform="psychedelic", sample_rate=44100, freq=440.0, amplitude=8000):
+        if waveform not in WAVEFORMS:
+            raise ValueError(f"Unknown waveform {waveform!r}, expected one of {WAVEFORMS}")
+        self.waveform = waveform
+        self.sample_rate = sample_rate
+        self.freq = freq
+        self.amplitude = amplitude
+        # Phase (in cycles) carried across chunks for sine and triangle
+        self.phase = 0.0
+        # State of the "psychedelic" recurrence from the C tutorial
+        self.a, self.b, self.c, self.d = 0.0, 1.0, 0.0, 1.0
+
+    def generate(self, num_samples):
+        return self.fill(np.empty(num_samples, dtype=SAMPLE_DTYPE))
+
+    def fill(self, out):
+        # out is any writable int16 array, typically mapped buffer memory
+        if self.waveform == "psychedelic":
+            values = self._psychedelic(len(out))
+        else:
+            values = self._periodic(len(out))
+        np.rint(values, out=values)
+        np.clip(values, -32768, 32767, out=values)
+        out[:] = values
+        return out
+
+    def _phases(self, num_samples):
+        step = self.freq / self.sample_rate
+        phases = self.phase + step * np.arange(num_samples, dtype=np.float64)
+        self.phase = math.fmod(self.phase + step * num_samples, 1.0)
+        return phases
+
+    def _periodic(self, num_samples):
+        phases = self._phases(num_samples)
+        if self.waveform == "sine":
+            return self.amplitude * np.sin(2 * np.pi * phases)
+        # Triangle: rises from -amplitude to +amplitude and back once per cycle
+        frac = np.mod(phases, 1.0)
+        return self.amplitude * (1.0 - 4.0 * np.abs(frac - 0.5))
+
+    def _psychedelic(self, num_samples):
+        # C tutorial loop, once per sample:
+        #   a += b; b -= a / freq; raw[i] = 500 * a
+        # The update is the linear map s -> M s with M = [[1, 1], [-1/f, 1 - 1/f]].
+        # det(M) = 1, so M**n = (sin(n t) M - sin((n - 1) t) I) / sin(t) with
+        # cos(t) = trace(M) / 2, which gives every sample of the chunk at once.
+        self.c += self.d
+        self.d -= self.c / 1000
+        freq = 1100 + 1000 * self.d
+        cos_t = 1.0 - 1.0 / (2.0 * freq)
+        if not -1.0 < cos_t < 1.0:
+            raise ValueError(f"Recurrence is unstable for freq={freq}")
+        theta = math.acos(cos_t)
+        sin_t = math.sin(theta)
+        a0, b0 = self.a, self.b
+        n = np.arange(1, num_samples + 1, dtype=np.float64)
+        sin_n = np.sin(n * theta)
+        sin_n1 = np.sin((n - 1) * theta)
+        a = (sin_n * (a0 + b0) - sin_n1 * a0) / sin_t
+        # Carry the state into the next chunk
+        last_n = num_samples
+        self.a = float(a[-1]) if num_samples else a0
+        self.b = (
+            math.sin(last_n * theta) * (b0 * (1 - 1 / freq) - a0 / freq)
+            - math.sin((last_n - 1) * theta) * b0
+        ) / sin_t
+        return 500 * a
+
+
+def legacy_push_samples(num_samples, amplitude=1000):
+    # The old push_data() body: one struct.pack() and one bytearray per sample
+    raw = list(bytes(num_samples * 2))
+    for i in range(num_samples):
+        raw[i] = bytearray(struct.pack("f", i * (amplitude / num_samples)))
+    for i in range(num_samples):
+        raw[i] = bytearray(struct.pack("f", amplitude - (i * (amplitude / num_samples)) * -1))
+    return raw
+
+
+def benchmark(chunk_samples=512, duration=1.0):
+    results = {}
+
+    def run(name, func):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            func()
+            count += chunk_samples
+        results[name] = count / (time.perf_counter() - start)
+
+    run("legacy", lambda: legacy_push_samples(chunk_samples))
+    out = np.empty(chunk_samples, dtype=SAMPLE_DTYPE)
+    for waveform in WAVEFORMS:
+        generator = WaveformGenerator(waveform)
+        run(waveform, lambda: generator.fill(out))
+    return results
+
+
+def main():
+    chunk_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    results = benchmark(chunk_samples)
+    baseline = results["legacy"]
+    print(f"Chunk of {chunk_samples} samples")
+    for name, rate in results.items():
+        print(f"{name:>12}: {rate:14,.0f} samples/s  ({rate / baseline:8.1f}x)")
+
+
+if __name__ == "__main__":
+    main()